@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# Local stand-in for F95Zone, serves generated thread pages to refresh against without touching the real site
+# Usage: benchmarks/fixture_server.py [--port 8095] [--latency 0.02] [--errors 0.01] [--ddos 0.05] [--backups 0] [--moved 0.1] [--updated 500]
+import argparse
+import time
+import asyncio
+import pathlib
+import random
+import zlib
+import sys
+import io
+
+from aiohttp import web
+from PIL import Image
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from tests import pages
+
+ddos_guard_page = b"<html><head><title>DDOS-GUARD</title></head><body><script>loadScript(\"/.well-known/ddos-guard/check.js\")</script></body></html>"
+backups_page = b"<html><body><p>Automated backups are currently executing. During this time, the site will be unavailable</p></body></html>"
+stats_key = web.AppKey("stats", dict)  # Request counts by kind, also served as GET /_stats
+account_page = b'<html><head><title>Your account | F95zone</title></head><body><form><input type="hidden" name="_xfToken" value="1700000000,0123456789abcdef0123456789abcdef"></form></body></html>'
+
+
+def cover_image():
+    buffer = io.BytesIO()
+    Image.new("RGB", (600, 300), (64, 96, 128)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def make_app(latency=0.0, errors=0.0, ddos=0.0, backups=0.0, moved=0.1, latest: list[tuple[int, int]] = (), latest_broken=False, seed=0):
+    # latency: seconds added to every response, errors: share of connections dropped before answering,
+    # ddos: share of thread requests answered with a DDoS-Guard challenge, backups: share answered with the daily backups page
+    # (the app stops the refresh on those, like the real site),
+    # moved: share of threads whose quick check redirects to a new url, needing a full check,
+    # latest: (thread id, unix time) pairs listed by the latest updates feed, latest_broken: feed answers with a server error
+    rng = random.Random(seed)
+    image = cover_image()
+    latest = sorted(latest, key=lambda item: item[1], reverse=True)
+    stats = dict.fromkeys(("requests", "dropped", "challenges", "backups", "head", "pages", "images", "latest"), 0)
+
+    def thread_id(slug: str):
+        return int(slug.rstrip("/").rsplit(".", 1)[-1])
+
+    def is_moved(id: int):
+        # Stable per thread so repeated runs move the same ones
+        return zlib.crc32(id.to_bytes(4, "little")) / 2**32 < moved
+
+    @web.middleware
+    async def chaos(request: web.Request, handler):
+        stats["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if errors and rng.random() < errors:
+            stats["dropped"] += 1
+            request.transport.close()
+            raise web.HTTPServiceUnavailable()
+        if ddos and "__ddg2" not in request.cookies and request.path.startswith("/threads/") and rng.random() < ddos:
+            # Passed by repeating the request with the cookie, like the first DDoS-Guard challenge
+            stats["challenges"] += 1
+            response = web.Response(status=403, body=ddos_guard_page, content_type="text/html", headers={"Server": "ddos-guard"})
+            response.set_cookie("__ddg2", "benchmark")
+            return response
+        if backups and request.method != "HEAD" and rng.random() < backups:
+            stats["backups"] += 1
+            return web.Response(body=backups_page, content_type="text/html")
+        return await handler(request)
+
+    async def account(_):
+        return web.Response(body=account_page, content_type="text/html")
+
+    async def thread(request: web.Request):
+        slug = request.match_info["slug"]
+        id = thread_id(slug)
+        if request.method == "HEAD":
+            stats["head"] += 1
+            if is_moved(id) and not slug.startswith("moved-"):
+                raise web.HTTPMovedPermanently(f"/threads/moved-{id}.{id}/")
+            return web.Response(content_type="text/html")
+        stats["pages"] += 1
+        page = pages.thread_page(
+            name=f"Game {id}",
+            version=f"v{id % 10}.{id % 7}",
+            developer=f"Developer {id % 97}",
+            image_url=f"http://{request.host}/attachments/{id}.png",
+        )
+        return web.Response(body=page, content_type="text/html")
+
+    async def attachment(_):
+        stats["images"] += 1
+        return web.Response(body=image, content_type="image/png")
+
+    async def notifications(_):
+        return web.json_response({"status": "ok", "visitor": {"alerts_unread": "0", "conversations_unread": "0"}})
+
+    async def latest_data(request: web.Request):
+        stats["latest"] += 1
+        if latest_broken:
+            return web.Response(status=500, body=b"<html><body>Internal server error</body></html>", content_type="text/html")
+        page, rows = int(request.query.get("page", 1)), int(request.query.get("rows", 90))
+        data = [
+            {
+                "thread_id": id,
+                "title": f"Game {id}",
+                "creator": f"Developer {id % 97}",
+                "version": f"v{id % 10}.{id % 7}",
+                "cover": f"http://{request.host}/attachments/{id}.png",
+                "ts": ts,
+            }
+            for id, ts in latest[(page - 1) * rows:page * rows]
+        ]
+        return web.json_response({"status": "ok", "msg": {"data": data, "pagination": {"page": page, "total": -(-len(latest) // rows)}, "count": len(latest)}})
+
+    async def ddos_guard_mark(_):
+        response = web.Response(text="")
+        response.set_cookie("__ddg2", "benchmark")
+        return response
+
+    async def stats_page(_):
+        return web.json_response(stats)
+
+    app = web.Application(middlewares=[chaos])
+    app[stats_key] = stats
+    app.router.add_get("/account/", account)
+    app.router.add_route("*", "/threads/{slug:.+}", thread)
+    app.router.add_get("/attachments/{name}", attachment)
+    app.router.add_get("/conversations/popup", notifications)
+    app.router.add_get("/sam/latest_alpha/latest_data.php", latest_data)
+    app.router.add_post("/.well-known/ddos-guard/mark/", ddos_guard_mark)
+    app.router.add_get("/_stats", stats_page)
+    return app
+
+
+def serve(port: int, **options):
+    web.run_app(make_app(**options), host="127.0.0.1", port=port, print=None)
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser()
+    args.add_argument("--port", type=int, default=8095)
+    args.add_argument("--latency", type=float, default=0.0)
+    args.add_argument("--errors", type=float, default=0.0)
+    args.add_argument("--ddos", type=float, default=0.0)
+    args.add_argument("--backups", type=float, default=0.0)
+    args.add_argument("--moved", type=float, default=0.1)
+    args.add_argument("--updated", type=int, default=0, help="list threads 1 to N in the latest updates feed as bumped just now")
+    args = vars(args.parse_args())
+    now = int(time.time())
+    args["latest"] = [(id, now - id) for id in range(1, args.pop("updated") + 1)]
+    print(f"Serving on http://127.0.0.1:{args['port']}")
+    serve(**args)
@@ -0,0 +1,72 @@
+# Synthetic game libraries for the benchmarks, written straight into the games table
+import random
+import json
+import time
+
+from modules.structs import (
+    Status,
+    Type,
+    Tag,
+)
+from modules import (
+    globals,
+    api,
+    db,
+)
+
+label_count = 8
+columns = (
+    "id", "name", "version", "developer", "type", "status", "url", "added_on", "last_updated", "last_full_refresh",
+    "last_refresh_version", "score", "rating", "played", "installed", "executables", "description", "changelog",
+    "tags", "labels", "notes", "image_url", "downloads",
+)
+statuses = (Status.Normal, Status.Normal, Status.Normal, Status.OnHold, Status.Abandoned)
+words = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod")
+
+
+def game_row(id: int, rng: random.Random, threads_page: str):
+    text = lambda count: " ".join(rng.choice(words) for _ in range(count))
+    now = time.time()
+    version = f"v{rng.randrange(10)}.{rng.randrange(100)}"
+    return (
+        id,
+        text(rng.randrange(1, 5)).title(),
+        version,
+        text(rng.randrange(1, 3)).title(),
+        rng.choice(list(Type)).value,
+        rng.choice(statuses).value,
+        f"{threads_page}game-{id}.{id}/",
+        int(now - rng.randrange(1000 * 86400)),
+        int(now - rng.randrange(1000 * 86400)),
+        int(now - rng.randrange(86400)),  # Checked recently, so quick checks stay quick
+        globals.version,
+        round(rng.uniform(0, 5), 2),
+        rng.randrange(6),
+        rng.random() < 0.3,
+        version if rng.random() < 0.2 else "",
+        json.dumps([f"/games/{id}/Game.exe"] if rng.random() < 0.1 else []),
+        "\n".join(text(rng.randrange(5, 20)) for _ in range(rng.randrange(1, 8))),
+        "\n".join(text(rng.randrange(2, 10)) for _ in range(rng.randrange(0, 40))),
+        json.dumps([tag.value for tag in rng.sample(list(Tag), rng.randrange(0, 15))]),
+        json.dumps(rng.sample(range(1, label_count + 1), rng.randrange(0, 3))),
+        text(rng.randrange(0, 10)),
+        "-",
+        json.dumps([[text(1), [[text(1), f"https://example.com/{id}/{i}"] for i in range(rng.randrange(1, 4))]] for _ in range(rng.randrange(0, 4))]),
+    )
+
+
+async def populate(count: int, seed=0, threads_page: str = None):
+    # Call with db.connection open, replaces whatever games were there
+    rng = random.Random(seed)
+    threads_page = threads_page or api.threads_page
+    await db.connection.execute("DELETE FROM games")
+    await db.connection.execute("DELETE FROM labels")
+    await db.connection.executemany(
+        "INSERT INTO labels (id, name, color) VALUES (?, ?, ?)",
+        [(id, f"Label {id}", "#696969") for id in range(1, label_count + 1)]
+    )
+    await db.connection.executemany(
+        f"INSERT INTO games ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        (game_row(id, rng, threads_page) for id in range(1, count + 1))
+    )
+    await db.connection.commit()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# Time to decode a synthetic library into Game objects, compiled row decoders against per-value type inspection
+# Usage: benchmarks/load_games.py [games]  (default 50000), uses a temporary data folder
+import tempfile
+import pathlib
+import types
+import json
+import time
+import sys
+import os
+
+# Before the app modules, they pick the data folder from the home folder on import
+home = tempfile.TemporaryDirectory(prefix="f95checker-bench-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = home.name
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from modules.structs import (
+    Label,
+    Game,
+)
+from modules import (
+    globals,
+    async_thread,
+    sync_thread,
+    colors,
+    db,
+)
+from benchmarks import library
+
+
+def generic_sql_to_py(value, data_type):
+    # How every value was converted before row_decoder, inspecting its type each time
+    match getattr(data_type, "__name__", None):
+        case "list":
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                value = [value] if value else []
+            if data_type_args := getattr(data_type, "__args__", None):
+                content_type = data_type_args[0]
+                value = [x for x in (content_type(x) for x in value) if x is not None]
+        case "tuple":
+            if isinstance(value, str) and getattr(data_type, "__args__", [None])[0] is float:
+                value = colors.hex_to_rgba_0_1(value)
+            else:
+                value = json.loads(value)
+                if data_type_args := getattr(data_type, "__args__", None):
+                    content_type = data_type_args[0]
+                    value = [x for x in (content_type(x) for x in value) if x is not None]
+                value = tuple(value)
+        case _:
+            if isinstance(data_type, types.UnionType):
+                if not (getattr(data_type, "__args__", [None])[-1] is types.NoneType and value is None):
+                    value = data_type.__args__[0](value)
+                else:
+                    value = None
+            else:
+                value = data_type(value)
+    return value
+
+
+def scan_label(id: int):
+    # Label lookup before Label.ids, a scan over every label
+    for label in Label.instances:
+        if label.id == id:
+            return label
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    ret = func(*args)
+    return ret, time.perf_counter() - start
+
+
+def main(count: int):
+    async_thread.setup()
+    sync_thread.setup()
+    wait = lambda coro: async_thread.run(coro).result()
+    wait(db.connect())
+    wait(library.populate(count))
+    wait(db.load())  # Settings and labels, and one warm up load of the games
+
+    async def fetch():
+        # Same query as db.load_games()
+        cursor = await db.connection.execute("PRAGMA table_info(games)")
+        columns = [column[1] for column in await cursor.fetchall() if column[1] not in db.lazy_game_columns]
+        cursor = await db.connection.execute(f"SELECT {', '.join(columns)} FROM games")
+        return await cursor.fetchall(), tuple(column[0] for column in cursor.description)
+    (rows, keys), fetch_time = timed(wait, fetch())
+
+    annotations = dict(Game.__annotations__)
+    annotations["labels"] = list[scan_label]
+    # Values only, then with the Game objects built from them as loading does
+    generic_values = lambda row: {key: generic_sql_to_py(value, annotations[key]) for key, value in dict(row).items() if key in annotations}
+    _, generic_convert_time = timed(lambda: [generic_values(row) for row in rows])
+    _, generic_time = timed(lambda: [Game(**generic_values(row)) for row in rows])
+    fields = tuple((index, key, db.sql_converter(Game.__annotations__[key])) for index, key in enumerate(keys))
+    compiled_values = lambda row: {key: convert(row[index]) for index, key, convert in fields}
+    _, compiled_convert_time = timed(lambda: [compiled_values(row) for row in rows])
+    decode = db.row_decoder(Game, keys)
+    _, compiled_time = timed(lambda: [decode(row) for row in rows])
+    globals.games.clear()
+    _, load_time = timed(wait, db.load_games())
+
+    per_game = lambda seconds: f"{seconds * 1000:8.1f}ms  {seconds / len(rows) * 1e6:6.1f}us/game"
+    print(f"{len(rows)} games, {len(keys)} columns, {len(Label.instances)} labels")
+    print(f"Fetch rows:              {per_game(fetch_time)}")
+    print(f"Generic convert:         {per_game(generic_convert_time)}")
+    print(f"Compiled convert:        {per_game(compiled_convert_time)}  ({generic_convert_time / compiled_convert_time:.2f}x)")
+    print(f"Generic decode + Game:   {per_game(generic_time)}")
+    print(f"Compiled decode + Game:  {per_game(compiled_time)}  ({generic_time / compiled_time:.2f}x)")
+    print(f"db.load_games():         {per_game(load_time)}")
+    wait(db.close())
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
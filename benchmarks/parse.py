@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# Thread parser speed, allocations and engine parity over a directory of saved thread pages
+# Usage: benchmarks/parse.py [pages dir or files...] [--save] [--check]
+#   --save   store the results as the baseline in benchmarks/parse_baseline.json
+#   --check  exit with 1 if the results regressed past the threshold from the baseline, including per page p50/p99 times
+import tracemalloc
+import statistics
+import gc
+import pathlib
+import json
+import time
+import re
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+from modules import parser
+
+baseline_path = pathlib.Path(__file__).parent / "parse_baseline.json"
+default_corpus = pathlib.Path(__file__).parent.parent / "tests/corpus"
+threshold = 1.25  # Allowed growth in allocations, per page times and loss of lxml speedup before --check fails
+repeats = 100  # Per page, enough that p99 is not just the slowest run
+confirm_runs = 2  # Times a page over the threshold is measured again, it only fails if every run is over
+save_runs = 3  # Page times are saved as the slowest of this many runs, the baseline is then the noise ceiling and not a lucky run
+
+
+def load_pages(paths: list[str]):
+    files = []
+    for path in map(pathlib.Path, paths or [default_corpus]):
+        files.extend(sorted(path.glob("*.html")) if path.is_dir() else [path])
+    return {file.stem: file.read_bytes() for file in files}
+
+
+def percentile(times: list[float], p: float):
+    times = sorted(times)
+    return times[min(int(len(times) * p), len(times) - 1)]
+
+
+def calibrate(count=20):
+    # Fixed string and regex work like the parser's, page times are compared relative to it so machine and load drift cancel out
+    text = " ".join(f"word{i} Version: v{i}.0" for i in range(300))
+    runs = []
+    for _ in range(count):
+        start = time.perf_counter()
+        for _ in range(20):
+            re.sub(r"\s+", " ", text).split("Version:")
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs) * 1000
+
+
+def time_page(engine, res: bytes):
+    # Calibrated around each page, a busy machine changes speed during a run
+    calibration = calibrate()
+    gc.disable()  # Collections would land on whichever run triggers them
+    try:
+        parser.parse_thread(1, res, engine)  # Warm up
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            parser.parse_thread(1, res, engine)
+            runs.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return {
+        "p50_ms": round(statistics.median(runs) * 1000, 3),
+        "p99_ms": round(percentile(runs, 0.99) * 1000, 3),
+        "calibration_ms": round((calibration + calibrate()) / 2, 3),
+    }
+
+
+def relative(stats: dict):
+    return {key: stats[key] / stats["calibration_ms"] for key in ("p50_ms", "p99_ms")}
+
+
+def slowest(runs: list[dict]):
+    # Per key the highest multiple of calibration time over the runs, in the first run's calibration
+    calibration = runs[0]["calibration_ms"]
+    return {
+        **{key: round(max(relative(stats)[key] for stats in runs) * calibration, 3) for key in ("p50_ms", "p99_ms")},
+        "calibration_ms": calibration,
+    }
+
+
+def measure(engine, pages: dict[str, bytes]):
+    per_page = {name: time_page(engine, res) for name, res in pages.items()}
+    times = [stats["p50_ms"] / 1000 for stats in per_page.values()]
+    # Python heap only, libxml2 allocates outside of tracemalloc
+    peaks = []
+    for res in pages.values():
+        tracemalloc.start()
+        parser.parse_thread(1, res, engine)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        "total_ms": round(sum(times) * 1000, 2),
+        "p50_ms": round(statistics.median(times) * 1000, 2),
+        "p99_ms": round(percentile(times, 0.99) * 1000, 2),
+        "max_ms": round(max(times) * 1000, 2),
+        "peak_kib": round(max(peaks) / 1024, 1),
+        "mean_peak_kib": round(statistics.mean(peaks) / 1024, 1),
+        "pages": per_page,
+    }
+
+
+def parity(pages: dict[str, bytes]):
+    mismatches = []
+    for name, res in pages.items():
+        results = [parser.parse_thread(1, res, engine) for engine in parser.engines]
+        if any(isinstance(ret, parser.ParserException) for ret in results) or any(ret != results[0] for ret in results):
+            mismatches.append(name)
+    return mismatches
+
+
+def main(args: list[str]):
+    pages = load_pages([arg for arg in args if not arg.startswith("--")])
+    if not pages:
+        print("No pages found", file=sys.stderr)
+        return 1
+    results = {engine.__name__: measure(engine, pages) for engine in parser.engines}
+    results["speedup"] = round(results["Bs4Engine"]["total_ms"] / results["LxmlEngine"]["total_ms"], 2)
+    mismatches = parity(pages)
+
+    print(f"{len(pages)} pages, median of {repeats} runs each")
+    for engine in parser.engines:
+        stats = results[engine.__name__]
+        print(
+            f"{engine.__name__:>10}: {stats['total_ms']:8.1f}ms total, p50 {stats['p50_ms']:6.2f}ms, p99 {stats['p99_ms']:6.2f}ms, max {stats['max_ms']:6.2f}ms, "
+            f"peak {stats['peak_kib']:7.0f} KiB, mean peak {stats['mean_peak_kib']:7.0f} KiB"
+        )
+    print(f"lxml speedup: {results['speedup']:.2f}x")
+    print(f"Engines disagree on: {', '.join(mismatches)}" if mismatches else "Engines agree on every page")
+
+    if "--save" in args:
+        for engine in parser.engines:
+            runs = {name: [stats] for name, stats in results[engine.__name__]["pages"].items()}
+            for _ in range(save_runs - 1):
+                for name, res in pages.items():
+                    runs[name].append(time_page(engine, res))
+            results[engine.__name__]["pages"] = {name: slowest(page_runs) for name, page_runs in runs.items()}
+        baseline_path.write_text(json.dumps(results, indent=4) + "\n")
+        print(f"Saved baseline to {baseline_path}")
+    failed = bool(mismatches)
+    if "--check" in args:
+        baseline = json.loads(baseline_path.read_text())
+        # Allocations and the lxml speedup carry over across machines, per page times catch slowdowns in both engines
+        for engine in parser.engines:
+            name = engine.__name__
+            if results[name]["peak_kib"] > baseline[name]["peak_kib"] * threshold:
+                print(f"Regression: {name} peak {results[name]['peak_kib']:.0f} KiB, baseline {baseline[name]['peak_kib']:.0f} KiB")
+                failed = True
+            for page, stats in results[name]["pages"].items():
+                if (base := baseline[name].get("pages", {}).get(page)) is None:
+                    continue  # Not in the baseline yet
+                # Compared as multiples of the calibration time, so the baseline carries over to other machines
+                limit = {key: value * threshold for key, value in relative(base).items()}
+                over = lambda: [key for key, value in relative(stats).items() if value > limit[key]]
+                for _ in range(confirm_runs):
+                    if not over():
+                        break
+                    # A busy machine slows single runs, a real regression shows up every time
+                    again = time_page(engine, pages[page])
+                    stats = min(stats, again, key=lambda stats: relative(stats)["p50_ms"] + relative(stats)["p99_ms"])
+                for key in over():
+                    scaled = limit[key] / threshold * stats["calibration_ms"]
+                    print(f"Regression: {name} {page} {key[:3]} {stats[key]:.2f}ms, baseline {scaled:.2f}ms scaled to this run")
+                    failed = True
+        if results["speedup"] < baseline["speedup"] / threshold:
+            print(f"Regression: lxml speedup {results['speedup']:.2f}x, baseline {baseline['speedup']:.2f}x")
+            failed = True
+    return int(failed)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
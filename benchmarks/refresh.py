@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# Full refresh of synthetic libraries against the local fixture server, throughput, memory and the frame time cost of refreshing
+# Usage: benchmarks/refresh.py [sizes...] [--latency 0.02] [--errors 0.01] [--ddos 0.05] [--moved 0.1] [--workers 20]
+#   sizes default to 1000 10000 50000, each runs in its own process with a temporary data folder
+import statistics
+import subprocess
+import threading
+import argparse
+import tempfile
+import urllib.parse
+import pathlib
+import socket
+import time
+import json
+import sys
+import os
+
+# Before the app modules, they pick the data folder from the home folder on import
+home = tempfile.TemporaryDirectory(prefix="f95checker-bench-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = home.name
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from modules.structs import (
+    RefreshProgress,
+)
+from modules import (
+    globals,
+    async_thread,
+    sync_thread,
+    loopmonitor,
+    api,
+    db,
+)
+from benchmarks import library
+
+frame_interval = 1 / 60
+visible_rows = 200  # Games touched per simulated frame, about a screen of the list view
+
+
+def peak_rss_mib():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def repoint(url: str):
+    # Sends every F95Zone url the refresh uses to the fixture server
+    host = api.host
+    for name, value in list(vars(api).items()):
+        if isinstance(value, str) and value.startswith(host):
+            setattr(api, name, url + value.removeprefix(host))
+    api.domain = urllib.parse.urlsplit(url).netloc
+
+
+class FrameSampler(threading.Thread):
+    # Stand-in for the main loop, does a fixed amount of Python work per frame and times it, slowdowns are GIL contention
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.games = list(globals.games.values())[:visible_rows]
+        self.times: list[float] = []
+        self.running = True
+
+    def run(self):
+        while self.running:
+            start = time.perf_counter()
+            for game in self.games:
+                f"{game.name} {game.version} {game.developer} {game.status.name} {game.last_updated.display}"
+            self.times.append(time.perf_counter() - start)
+            time.sleep(max(frame_interval - (time.perf_counter() - start), 0))
+
+    def take(self):
+        times, self.times = self.times, []
+        return times
+
+
+def percentiles(times: list[float]):
+    times = sorted(times)
+    return {
+        "p50_ms": round(statistics.median(times) * 1000, 3),
+        "p99_ms": round(times[min(int(len(times) * 0.99), len(times) - 1)] * 1000, 3),
+        "max_ms": round(times[-1] * 1000, 3),
+    }
+
+
+def child(count: int, url: str, workers: int):
+    async_thread.setup()
+    sync_thread.setup()
+    wait = lambda coro: async_thread.run(coro).result()
+    wait(db.connect())
+    wait(library.populate(count, threads_page=url + "/threads/"))
+    wait(db.load())
+    repoint(url)
+    globals.settings.refresh_workers = workers
+    globals.settings.request_timeout = 30
+    globals.settings.max_retries = 2
+    globals.settings.refresh_probe_feed = False
+    globals.settings.refresh_completed_games = True
+    globals.settings.check_notifs = True
+    globals.settings.use_parser_processes = False  # Parse time shows up in the frame times instead of hiding in other processes
+
+    with api.setup():
+        frames = FrameSampler()
+        frames.start()
+        time.sleep(2)
+        idle = frames.take()
+        loopmonitor.start()
+        loopmonitor.lags.clear()
+        start_requests, start_bytes, start_failed = api.sent_requests, api.received_bytes, api.failed_requests
+        start = time.perf_counter()
+        globals.refresh_progress = RefreshProgress()
+        globals.refresh_task = async_thread.run(api.refresh())
+        result = globals.refresh_task.result()
+        elapsed = time.perf_counter() - start
+        refreshing = frames.take()
+        frames.running = False
+        lags = list(loopmonitor.lags)
+        loopmonitor.stop()
+        full_checks = globals.refresh_progress.done["full"]
+    wait(db.close())
+
+    return {
+        "games": count,
+        "logged_in": result,
+        "seconds": round(elapsed, 2),
+        "games_per_s": round(count / elapsed, 1),
+        "full_checks": full_checks,
+        "requests": api.sent_requests - start_requests,
+        "failed_requests": api.failed_requests - start_failed,
+        "received_mib": round((api.received_bytes - start_bytes) / 1024 / 1024, 2),
+        "peak_rss_mib": round(rss, 1) if (rss := peak_rss_mib()) is not None else None,
+        "loop_lag_p99_ms": percentiles(lags)["p99_ms"] if lags else None,
+        "loop_lag_max_ms": percentiles(lags)["max_ms"] if lags else None,
+        "frame_idle": percentiles(idle),
+        "frame_refreshing": percentiles(refreshing),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port: int, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError("Fixture server did not start")
+
+
+def main(args: list[str]):
+    options = argparse.ArgumentParser()
+    options.add_argument("sizes", type=int, nargs="*", default=[1000, 10000, 50000])
+    options.add_argument("--latency", type=float, default=0.0)
+    options.add_argument("--errors", type=float, default=0.0)
+    options.add_argument("--ddos", type=float, default=0.0)
+    options.add_argument("--moved", type=float, default=0.1)
+    options.add_argument("--workers", type=int, default=20)
+    options.add_argument("--child", type=str, default=None, help=argparse.SUPPRESS)
+    options = options.parse_args(args)
+
+    if options.child:
+        print(json.dumps(child(options.sizes[0], options.child, options.workers)), flush=True)
+        return 0
+
+    port = free_port()
+    server = subprocess.Popen([
+        sys.executable, str(pathlib.Path(__file__).parent / "fixture_server.py"), "--port", str(port),
+        "--latency", str(options.latency), "--errors", str(options.errors), "--ddos", str(options.ddos), "--moved", str(options.moved),
+    ])
+    try:
+        wait_for_server(port)
+        for size in options.sizes:
+            # Own process each, so peak RSS is for that library size alone
+            out = subprocess.run(
+                [sys.executable, __file__, str(size), "--child", f"http://127.0.0.1:{port}", "--workers", str(options.workers)],
+                capture_output=True, text=True,
+            )
+            if out.returncode != 0:
+                print(out.stdout + out.stderr, file=sys.stderr)
+                return 1
+            results = json.loads(out.stdout.strip().splitlines()[-1])
+            frame = lambda stats: f"p50 {stats['p50_ms']:.2f}ms p99 {stats['p99_ms']:.2f}ms max {stats['max_ms']:.2f}ms"
+            print(
+                f"{results['games']:>6} games: {results['seconds']:7.1f}s, {results['games_per_s']:7.1f} games/s, "
+                f"{results['full_checks']} full checks, {results['requests']} requests ({results['failed_requests']} failed), "
+                f"{results['received_mib']:.1f} MiB, peak RSS {results['peak_rss_mib']} MiB"
+            )
+            print(f"        loop lag p99 {results['loop_lag_p99_ms']}ms max {results['loop_lag_max_ms']}ms")
+            print(f"        frame idle {frame(results['frame_idle'])}, refreshing {frame(results['frame_refreshing'])}")
+    finally:
+        server.terminate()
+        server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# Frame time of text measuring and wrapping with the text caches against calling imgui every frame
+# Usage: benchmarks/text_cache.py [frames]  (default 600), runs a headless imgui context, no window needed
+import tempfile
+import pathlib
+import random
+import types
+import time
+import sys
+import os
+
+# Before the app modules, they pick the data folder from the home folder on import
+home = tempfile.TemporaryDirectory(prefix="f95checker-bench-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = home.name
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import imgui
+
+from modules.structs import (
+    Tag,
+)
+from modules import (
+    globals,
+    utils,
+)
+
+rows = 300  # Visible rows in the list view, each measures its tags and labels
+tags_per_row = 6
+words = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod", "tempor")
+
+
+def setup_imgui():
+    imgui.create_context()
+    io = imgui.get_io()
+    io.display_size = (1600, 900)
+    io.ini_file_name = None  # Don't leave an imgui.ini behind
+    karla = str(next(globals.self_path.glob("resources/fonts/Karla-Regular.*.ttf")))
+    imgui.fonts = types.SimpleNamespace(
+        default=io.fonts.add_font_from_file_ttf(karla, 18),
+        big=io.fonts.add_font_from_file_ttf(karla, 28),
+    )
+    io.fonts.get_tex_data_as_rgba32()
+
+
+def make_content(rng: random.Random):
+    text = lambda count: " ".join(rng.choice(words) for _ in range(count))
+    tag_names = [tag.name for tag in Tag]
+    row_tags = [rng.sample(tag_names, tags_per_row) for _ in range(rows)]
+    description = "\n".join(text(rng.randrange(10, 40)) for _ in range(12))
+    changelog = "\n".join(text(rng.randrange(2, 15)) for _ in range(60))
+    return row_tags, description, changelog
+
+
+def frame(row_tags, description, changelog, width, measure, wrap):
+    imgui.new_frame()
+    imgui.begin("bench")
+    for tags in row_tags:
+        for tag in tags:
+            measure(tag)
+    utils.push_font(imgui.fonts.big)
+    measure("Game name that is shown in the info popup")
+    utils.pop_font()
+    wrap(description, width, 80)
+    wrap(changelog, width, 0)
+    imgui.end()
+    imgui.end_frame()
+
+
+def uncached_measure(text: str):
+    return imgui.calc_text_size(text).x
+
+
+def uncached_wrap(text: str, width: float, offset: int):
+    for line in utils._wrap_text(text, width, offset):
+        if line is None:
+            imgui.dummy(0, 0)
+        else:
+            imgui.text_unformatted(line)
+
+
+def run(frames: int, content, resizing: bool, measure, wrap):
+    utils.clear_text_caches()
+    times = []
+    for i in range(frames):
+        # Dragging the popup edge moves it by fractions of a pixel per frame
+        width = 600.0 + (i * 0.37 if resizing else 0)
+        start = time.perf_counter()
+        frame(*content, width, measure, wrap)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return sum(times) / len(times), times[int(len(times) * 0.99)]
+
+
+def main(frames: int):
+    setup_imgui()
+    content = make_content(random.Random(0))
+    print(f"{frames} frames, {rows} rows of {tags_per_row} tags, wrapped description and changelog")
+    for resizing in (False, True):
+        uncached = run(frames, content, resizing, uncached_measure, uncached_wrap)
+        cached = run(frames, content, resizing, utils.text_width, utils.wrap_text)
+        ms = lambda pair: f"mean {pair[0] * 1000:6.3f}ms p99 {pair[1] * 1000:6.3f}ms"
+        print(f"{'Resizing' if resizing else 'Steady':>8} uncached: {ms(uncached)}")
+        print(f"{'':>8}   cached: {ms(cached)}  ({uncached[0] / cached[0]:.1f}x)")
+        print(f"{'':>8}   cache: {len(utils.text_widths)} widths, {len(utils.wrapped_texts)} wrapped texts")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 600)
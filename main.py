@@ -34,6 +34,11 @@ def main():
     from modules import db, api
     with db.setup(), api.setup():
 
+        if "--headless" in sys.argv:
+            # No window, tray or RPC server, for servers and scheduled refreshes
+            from modules import headless
+            return headless.main(sys.argv[sys.argv.index("--headless") + 1:])
+
         from modules import gui
         globals.gui = gui.MainGUI()
 
@@ -44,7 +49,7 @@ def main():
 
 
 @contextlib.contextmanager
-def lock_singleton():
+def lock_singleton(show_running=True):
     from modules import singleton
     try:
         singleton.lock("F95Checker")
@@ -56,7 +61,7 @@ def lock_singleton():
     finally:
         if locked:
             singleton.release("F95Checker")
-        else:
+        elif show_running:
             try:
                 from urllib import request
                 request.urlopen(request.Request(f"http://localhost:{rpc_port}/window/show", method="POST"))
@@ -78,6 +83,15 @@ if __name__ == "__main__":
                 main()
                 sys.exit(0)
 
+            if "--headless" in sys.argv:
+                # Runs in this process so the summary and exit code reach the caller
+                with lock_singleton(show_running=False) as locked:
+                    if not locked:
+                        from modules import headless
+                        headless.print_summary("already_running")
+                        sys.exit(headless.exit_already_running)
+                    sys.exit(main())
+
             with lock_singleton() as locked:
                 if not locked:
                     sys.exit(0)
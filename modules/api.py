@@ -1,4 +1,3 @@
-from PyQt6.QtWidgets import QSystemTrayIcon
 import multiprocessing
 import datetime as dt
 from PIL import Image
@@ -6,8 +5,10 @@ import async_timeout
 import http.cookies
 import configparser
 import contextlib
+import contextvars
 import subprocess
 import tempfile
+import urllib.parse
 import aiofiles
 import aiohttp
 import pathlib
@@ -27,8 +28,14 @@ import re
 from modules.structs import (
     CounterContext,
     ContextLimiter,
+    CheckOutcome,
+    CheckRequest,
+    RefreshCheck,
     SearchResult,
+    CheckStats,
+    RefreshRun,
     ProcessPipe,
+    Category,
     OldGame,
     MsgBox,
     Status,
@@ -39,7 +46,7 @@ from modules import (
     globals,
     async_thread,
     callbacks,
-    webview,
+    metrics,
     msgbox,
     parser,
     utils,
@@ -59,21 +66,34 @@ threads_page      = host + "/threads/"
 bookmarks_page    = host + "/account/bookmarks?difference={offset}"
 watched_page      = host + "/watched/threads?unread=0&page={page}"
 qsearch_endpoint  = host + "/quicksearch"
+latest_endpoint   = host + "/sam/latest_alpha/latest_data.php?cmd=list&cat={cat}&page={page}&sort=date&rows=90"
 update_endpoint   = "https://api.github.com/repos/Willy-JL/F95Checker/releases/latest"
 
 updating = False
 session: aiohttp.ClientSession = None
 full_interval = int(dt.timedelta(days=7).total_seconds())
+latest_margin = int(dt.timedelta(hours=1).total_seconds())
+latest_max_pages = 20
 webpage_prefix = "F95Checker-Temp-"
 images = ContextLimiter()
 fulls = CounterContext()
+checks: dict[int, CheckRequest] = {}
+sent_requests = 0
+received_bytes = 0
+failed_requests = 0
+check_stats: contextvars.ContextVar[CheckStats] = contextvars.ContextVar("check_stats")  # Set by refresh workers, carried into the check tasks
+parse_times: list[float] = []
 xf_token = ""
 
 
 @contextlib.contextmanager
 def setup():
     global session
-    session = aiohttp.ClientSession(loop=async_thread.loop, cookie_jar=aiohttp.DummyCookieJar())
+    trace_config = aiohttp.TraceConfig()
+    async def on_request_chunk_sent(_, __, params: aiohttp.TraceRequestChunkSentParams):
+        metrics.sent_bytes.inc(len(params.chunk), host=params.url.host)
+    trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+    session = aiohttp.ClientSession(loop=async_thread.loop, cookie_jar=aiohttp.DummyCookieJar(loop=async_thread.loop), trace_configs=[trace_config])
     session.headers["User-Agent"] = f"F95Checker/{globals.version} Python/{sys.version.split(' ')[0]} aiohttp/{aiohttp.__version__}"
     # Setup multiprocessing for parsing threads
     method = "spawn"  # Using fork defeats the purpose, with spawn the main ui does not hang
@@ -93,6 +113,7 @@ def cookiedict(cookies: http.cookies.SimpleCookie):
 
 @contextlib.asynccontextmanager
 async def request(method: str, url: str, read=True, until: list[bytes] = None, **kwargs):
+    global sent_requests, received_bytes, failed_requests
     timeout = kwargs.pop("timeout", None)
     if not timeout:
         timeout = globals.settings.request_timeout
@@ -105,6 +126,7 @@ async def request(method: str, url: str, read=True, until: list[bytes] = None, *
     )
     ddos_guard_cookies = {}
     ddos_guard_first_challenge = False
+    url_host = urllib.parse.urlsplit(url).hostname
     while retries:
         try:
             async with session.request(
@@ -188,9 +210,19 @@ async def request(method: str, url: str, read=True, until: list[bytes] = None, *
                                 break
                     else:
                         res += await req.read()
+                sent_requests += 1
+                received_bytes += len(res)
+                metrics.requests.inc(host=url_host, status=req.status)
+                metrics.received_bytes.inc(len(res), host=url_host)
+                if (stats := check_stats.get(None)) is not None:
+                    stats.bytes += len(res)
                 yield res, req
             break
         except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            metrics.requests.inc(host=url_host, status="timeout" if isinstance(exc, asyncio.TimeoutError) else "error")
+            failed_requests += 1
+            if (stats := check_stats.get(None)) is not None:
+                stats.errors += 1
             if globals.settings.ignore_semaphore_timeouts and isinstance(exc, OSError) and exc.errno == 121:
                 continue
             retries -= 1
@@ -286,6 +318,8 @@ async def is_logged_in():
 
 
 async def login():
+    # Imported here so headless mode never loads the browser
+    from modules import webview
     try:
         pipe = ProcessPipe()
         proc = multiprocessing.Process(target=webview.cookies, args=(login_page, pipe), kwargs=webview.kwargs() | dict(
@@ -319,12 +353,28 @@ async def login():
 
 async def assert_login():
     if not await is_logged_in():
+        if not globals.gui:
+            return False  # Headless, no window to login with
         await login()
         if not await is_logged_in():
             return False
     return True
 
 
+async def login_step():
+    globals.refresh_progress.track("login", added=1)
+    if not await assert_login():
+        return False
+    globals.refresh_progress.track("login", done=1)
+    return True
+
+
+def track_progress(stage: str, added=0, done=0):
+    # Only checks from refresh workers or a single recheck count, not those jumping ahead of a refresh
+    if check_stats.get(None) is not None:
+        globals.refresh_progress.track(stage, added, done)
+
+
 async def download_webpage(url: str):
     if not await assert_login():
         return
@@ -368,6 +418,7 @@ async def quick_search(query: str, login=False):
         if not title:
             continue
         results.append(SearchResult(title=title, url=url, id=id))
+        await db.update_catalog(id, overwrite=False, title=title)
     return results
 
 
@@ -407,16 +458,14 @@ async def import_browser_bookmarks(file: str | pathlib.Path):
 
 
 async def import_f95_bookmarks():
-    globals.refresh_total = 2
-    if not await assert_login():
+    if not await login_step():
         return
-    globals.refresh_progress = 1
     offset = 0
     threads = []
     while True:
-        globals.refresh_total += 1
-        globals.refresh_progress += 1
+        globals.refresh_progress.track("pages", added=1)
         res = await fetch("GET", bookmarks_page.format(offset=offset))
+        globals.refresh_progress.track("pages", done=1)
         raise_f95zone_error(res)
         html = parser.html(res)
         bookmarks = html.find(parser.is_class("p-body-pageContent")).find(parser.is_class("listPlain"))
@@ -436,16 +485,14 @@ async def import_f95_bookmarks():
 
 
 async def import_f95_watched_threads():
-    globals.refresh_total = 2
-    if not await assert_login():
+    if not await login_step():
         return
-    globals.refresh_progress = 1
     page = 1
     threads = []
     while True:
-        globals.refresh_total += 1
-        globals.refresh_progress += 1
+        globals.refresh_progress.track("pages", added=1)
         res = await fetch("GET", watched_page.format(page=page))
+        globals.refresh_progress.track("pages", done=1)
         raise_f95zone_error(res)
         html = parser.html(res)
         watched = html.find(parser.is_class("p-body-pageContent")).find(parser.is_class("structItemContainer"))
@@ -466,11 +513,34 @@ async def import_f95_watched_threads():
 
 async def check(game: Game, full=False, login=False):
     if login:
-        globals.refresh_total = 2
-        if not await assert_login():
+        if not await login_step():
             return
-        globals.refresh_progress = 1
+        # Single recheck, reports the same stages as refresh workers
+        stats = CheckStats(full=full)
+        check_stats.set(stats)
+        globals.refresh_progress.track("games", added=1)
+        globals.refresh_progress.expect_full(known=int(full), guessed=0)
+        result = await check(game, full=full)
+        globals.refresh_progress.checked(guessed=False, full=stats.full)
+        return result
+
+    # Merge with an in-flight check for the same game, all waiters get the same result
+    while (in_flight := checks.get(game.id)) is not None:
+        await in_flight.wait()
+        if in_flight.full or not full:
+            return in_flight.task.result()
+        # Was only a quick check, still need to run the requested full check
 
+    in_flight = CheckRequest(asyncio.ensure_future(_check(game, full=full)), full=full)
+    checks[game.id] = in_flight
+    def forget(_):
+        if checks.get(game.id) is in_flight:
+            del checks[game.id]
+    in_flight.task.add_done_callback(forget)
+    return await in_flight.wait()
+
+
+async def _check(game: Game, full=False):
     def last_refresh_before(breaking: str):
         checked = (game.last_refresh_version or "0").split(".")
         breaking = breaking.split(".")
@@ -506,6 +576,10 @@ async def check(game: Game, full=False, login=False):
                     )
     if not full:
         return
+    if (stats := check_stats.get(None)) is not None and not stats.full:
+        # Not known when queued, counts now
+        stats.full = True
+        globals.refresh_progress.track("full", added=1)
 
     with fulls:
 
@@ -538,7 +612,17 @@ async def check(game: Game, full=False, login=False):
         old_version = game.version
         old_status = game.status
 
+        # Unchanged first post with the same parser, stored fields are already what parsing would give
+        thread_hash = parser.thread_hash(res)
+        if thread_hash and thread_hash == game.thread_hash and url == game.url and not (game.image.missing and game.image_url != "-"):
+            game.last_full_refresh = int(time.time())
+            game.last_refresh_version = globals.version
+            await db.update_game(game, "last_full_refresh", "last_refresh_version")
+            return
+
         args = (game.id, res)
+        track_progress("parse", added=1)
+        parse_start = time.perf_counter()
         if globals.settings.use_parser_processes:
             # Using multiprocessing can help with interface stutters
             pipe = ProcessPipe()
@@ -555,9 +639,17 @@ async def check(game: Game, full=False, login=False):
                     )
         else:
             ret = parser.thread(*args)
+        parse_time = time.perf_counter() - parse_start
+        metrics.parse_seconds.observe(parse_time)
+        if globals.debug and check_stats.get(None) is not None:
+            parse_times.append(parse_time)  # Only for the summary printed after a refresh, cleared when one starts
+        track_progress("parse", done=1)
         if isinstance(ret, parser.ParserException):
             raise msgbox.Exc(*ret.args, **ret.kwargs)
-        (name, version, developer, type, status, last_updated, score, description, changelog, tags, image_url, downloads) = ret
+        (name, version, developer, type, status, last_updated, score, description, changelog, tags, image_url, downloads, cut_short) = ret
+        if cut_short:
+            print(f"Parsing thread {game.id} took over {parser.parse_budget:.0f}s of CPU time, long fields were cut short")
+            thread_hash = ""  # Don't let an unchanged post keep the partial fields, parse it again next time
 
         last_full_refresh = int(time.time())
         last_refresh_version = globals.version
@@ -583,7 +675,10 @@ async def check(game: Game, full=False, login=False):
         if not globals.settings.update_keep_image and not breaking_keep_old_image:
             fetch_image = fetch_image or (image_url != game.image_url)
 
+        if image_url and image_url != "-":
+            metrics.image_cache.inc(result="miss" if fetch_image else "hit")
         if fetch_image and image_url and image_url != "-":
+            track_progress("image", added=1)
             async with images:
                 try:
                     res = await fetch("GET", image_url, timeout=globals.settings.request_timeout * 4)
@@ -622,17 +717,19 @@ async def check(game: Game, full=False, login=False):
                     game.image.loaded = False
                     game.image.resolve()
                 await asyncio.shield(replace_image())
+            track_progress("image", done=1)
 
         async def update_game():
             game.name = name
-            game.version = version
-            game.developer = developer
+            game.version = sys.intern(version)
+            game.developer = sys.intern(developer)
             game.type = type
             game.status = status
             game.url = url
             game.last_updated.update(last_updated)
             game.last_full_refresh = last_full_refresh
             game.last_refresh_version = last_refresh_version
+            game.thread_hash = thread_hash
             game.score = score
             game.played = played
             game.installed = installed
@@ -653,6 +750,7 @@ async def check(game: Game, full=False, login=False):
                 "last_updated",
                 "last_full_refresh",
                 "last_refresh_version",
+                "thread_hash",
                 "score",
                 "played",
                 "installed",
@@ -663,6 +761,17 @@ async def check(game: Game, full=False, login=False):
                 "image_url",
                 "downloads"
             )
+            db.cache_lazy_game_columns(game)
+            await db.update_catalog(
+                game.id,
+                title=name,
+                version=version,
+                developer=developer,
+                type=type,
+                status=status,
+                tags=tags,
+                image_url=image_url
+            )
 
             if old_status is not Status.Unchecked and (
                 name != old_name or
@@ -676,15 +785,16 @@ async def check(game: Game, full=False, login=False):
                     status=old_status,
                 )
                 globals.updated_games[game.id] = old_game
+        track_progress("save", added=1)
         await asyncio.shield(update_game())
+        track_progress("save", done=1)
 
 
 async def check_notifs(login=False):
     if login:
-        globals.refresh_total = 2
-        if not await assert_login():
+        if not await login_step():
             return
-        globals.refresh_progress = 1
+        globals.refresh_progress.track("notifs", added=1)
 
     try:
         res = await fetch("GET", notif_endpoint.format(xf_token=xf_token))
@@ -708,6 +818,7 @@ async def check_notifs(login=False):
             MsgBox.error,
             more=error.traceback()
         )
+    globals.refresh_progress.track("notifs", done=1)
     if alerts != 0 and inbox != 0:
         msg = (
             f"You have {alerts + inbox} unread notifications.\n"
@@ -739,6 +850,7 @@ async def check_notifs(login=False):
         MsgBox.info, buttons
     )
     if globals.gui.hidden or not globals.gui.focused:
+        from PyQt6.QtWidgets import QSystemTrayIcon
         globals.gui.tray.push_msg(
             title="Notifications",
             msg=msg +
@@ -968,6 +1080,7 @@ async def check_updates():
         bottom=True
     )
     if globals.gui.hidden or not globals.gui.focused:
+        from PyQt6.QtWidgets import QSystemTrayIcon
         globals.gui.tray.push_msg(
             title="F95Checker update",
             msg="F95Checker has received an update.\n"
@@ -976,41 +1089,184 @@ async def check_updates():
         )
 
 
+class LatestUpdatesFeed:
+    # Newest first listing of bumped threads, swap api.latest_feed to probe a different source
+    categories = {Category.Games: "games"}
+    endpoint = latest_endpoint
+
+    async def page(self, category: Category, page: int):
+        res = await fetch("GET", self.endpoint.format(cat=self.categories[category], page=page))
+        raise_f95zone_error(res)  # Login and DDoS-Guard pages are html, check before they fail as bad json
+        res = json.loads(res)
+        raise_f95zone_error(res)
+        items = []
+        for item in res["msg"]["data"]:
+            thread_id = int(item["thread_id"])
+            await db.update_catalog(
+                thread_id,
+                title=item.get("title", ""),
+                version=item.get("version", ""),
+                developer=item.get("creator", ""),
+                image_url=item.get("cover", "")
+            )
+            items.append((thread_id, int(item["ts"])))
+        return items
+
+latest_feed = LatestUpdatesFeed()
+
+
+async def probe_latest_updates(since: int):
+    # Ids of tracked games bumped since last refresh, None if the feed can't tell
+    since -= latest_margin
+    updated = set()
+    try:
+        for category in latest_feed.categories:
+            for page in range(1, latest_max_pages + 1):
+                items = await latest_feed.page(category, page)
+                updated.update(thread_id for thread_id, ts in items if ts >= since)
+                if not items or items[-1][1] < since:
+                    break
+            else:
+                return None  # Too far behind, checking one by one is cheaper
+    except msgbox.Exc:
+        raise
+    except Exception:
+        return None
+    return {game_id for game_id in updated if game_id in globals.games}
+
+
 async def refresh(full=False, notifs=True):
-    if not await assert_login():
-        return
+    # Returns False if not logged in
+    progress = globals.refresh_progress
+    progress.learn(await db.load_refresh_runs(), globals.settings.refresh_workers)
+    if not await login_step():
+        return False
+
+    run = RefreshRun(
+        id=None,
+        started=time.time(),
+        ended=0.0,
+        full=full,
+        workers=globals.settings.refresh_workers,
+        timeout=globals.settings.request_timeout,
+        retries=globals.settings.max_retries,
+        queued=0,
+        checked=0,
+        full_checks=0,
+        unchanged=0,
+        skipped=0,
+        requests=0,
+        bytes=0,
+        errors=0,
+        result="",
+    )
+    run_checks: list[RefreshCheck] = []
+    failed = 0  # Failed requests of this run's checks, other requests can fail at the same time
 
     game_queue = asyncio.Queue()
     async def worker():
         while not game_queue.empty() and utils.is_refreshing():
+            game, game_full = game_queue.get_nowait()
+            stats = CheckStats(full=full or game_full)  # Known full checks were counted when queued
+            check_stats.set(stats)
+            check_start = time.perf_counter()
+            def record(outcome: CheckOutcome):
+                nonlocal failed
+                failed += stats.errors
+                run_checks.append(RefreshCheck(game.id, outcome, int((time.perf_counter() - check_start) * 1000), stats.bytes))
             try:
-                await check(game_queue.get_nowait(), full=full)
-            except Exception:
+                await check(game, full=full or game_full)
+            except Exception as exc:
+                record(CheckOutcome.Error)
+                run.result = exc.title if isinstance(exc, msgbox.Exc) else error.text(exc)
                 game_refresh_task.cancel()
                 raise
-            globals.refresh_progress += 1
+            record(CheckOutcome.Full if stats.full else CheckOutcome.Unchanged)
+            progress.checked(guessed=not (full or game_full), full=stats.full)
+            utils.request_redraw()
 
+    updated = None
+    if not full and globals.settings.refresh_probe_feed and globals.settings.last_successful_refresh.value:
+        progress.track("probe", added=1)
+        updated = await probe_latest_updates(globals.settings.last_successful_refresh.value)
+        progress.track("probe", done=1)
+    def probed(game: Game):
+        # The feed lists this game and nothing else would force a full check
+        return (
+            updated is not None and
+            game.type.category in latest_feed.categories and
+            game.last_refresh_version == globals.version and
+            game.last_full_refresh >= time.time() - full_interval and
+            not (game.image.missing and game.image_url != "-")
+        )
+
+    known_full = 0
     for game in globals.games.values():
         if game.status is Status.Completed and not globals.settings.refresh_completed_games:
+            run.skipped += 1
+            continue
+        if probed(game):
+            if game.id in updated:
+                game_queue.put_nowait((game, True))
+                known_full += 1
+            else:
+                run.skipped += 1
             continue
-        game_queue.put_nowait(game)
+        game_queue.put_nowait((game, False))
 
-    globals.refresh_progress += 1
-    globals.refresh_total += game_queue.qsize() + int(globals.settings.check_notifs)
+    progress.track("games", added=game_queue.qsize())
+    if full:
+        progress.expect_full(known=game_queue.qsize(), guessed=0)
+    else:
+        progress.expect_full(known=known_full, guessed=game_queue.qsize() - known_full)
+    progress.track("notifs", added=int(notifs and globals.settings.check_notifs))
     images.avail = int(max(1, globals.settings.refresh_workers / 10))
+    queued = game_queue.qsize()
+    start_time = time.perf_counter()
+    start_requests = sent_requests
+    start_bytes = received_bytes
+    parse_times.clear()
+    run.queued = queued
 
     game_refresh_task = asyncio.gather(*[worker() for _ in range(globals.settings.refresh_workers)])
     def reset_counts(_):
         images.count = 0
         fulls.count = 0
     game_refresh_task.add_done_callback(reset_counts)
-    await game_refresh_task
+    try:
+        await game_refresh_task
+    except asyncio.CancelledError:
+        run.result = run.result or "Cancelled"
+        raise
+    finally:
+        # Kept for the refresh history, also when the run did not finish
+        run.ended = time.time()
+        run.checked = len(run_checks)
+        run.full_checks = sum(check.outcome is CheckOutcome.Full for check in run_checks)
+        run.unchanged = sum(check.outcome is CheckOutcome.Unchanged for check in run_checks)
+        run.requests = sent_requests - start_requests
+        run.bytes = received_bytes - start_bytes
+        run.errors = failed + sum(check.outcome is CheckOutcome.Error for check in run_checks)
+        await asyncio.shield(db.add_refresh_run(run, run_checks))
+    elapsed = time.perf_counter() - start_time
+    metrics.refresh_seconds.observe(elapsed)
+    metrics.refresh_rate.set(queued / max(elapsed, 0.001))
+    if globals.debug:
+        print(
+            f"Refreshed {queued} games in {elapsed:.1f}s ({queued / max(elapsed, 0.001):.1f} games/s), "
+            f"{sent_requests - start_requests} requests, {(received_bytes - start_bytes) / 1024 / 1024:.2f} MiB received"
+        )
+        if parse_times:
+            times = sorted(parse_times)
+            percentile = lambda p: times[min(int(len(times) * p), len(times) - 1)] * 1000
+            print(f"Parsed {len(times)} threads, p50 {percentile(0.5):.1f}ms, p99 {percentile(0.99):.1f}ms, max {times[-1] * 1000:.1f}ms")
 
     if notifs and globals.settings.check_notifs:
         await check_notifs()
 
     globals.settings.last_successful_refresh.update(time.time())
     await db.update_settings("last_successful_refresh")
+    return True
 
 
 ddos_guard_bypass_fake_mark = {
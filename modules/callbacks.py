@@ -7,7 +7,6 @@ import asyncio
 import typing
 import shlex
 import imgui
-import glfw
 import time
 import stat
 import re
@@ -25,8 +24,7 @@ from modules.structs import (
 from modules import (
     globals,
     async_thread,
-    filepicker,
-    webview,
+    sortindex,
     msgbox,
     utils,
     icons,
@@ -80,6 +78,8 @@ def update_start_with_system(toggle: bool):
 
 
 def add_game_exe(game: Game, callback: typing.Callable = None):
+    # Window and browser modules are imported where used so headless mode never loads them
+    from modules import filepicker
     def select_callback(selected):
         if selected:
             game.add_executable(selected)
@@ -315,6 +315,7 @@ def open_webpage(url: str):
     async def _open_webpage(url: str):
         try:
             if set.browser.integrated:
+                from modules import webview
                 proc = multiprocessing.Process(target=webview.open, args=(url,), kwargs=webview.kwargs() | dict(cookies=globals.cookies, size=(1269, 969)))
                 proc.start()
                 DaemonProcess(proc)
@@ -344,14 +345,17 @@ def open_webpage(url: str):
 
 
 def clipboard_copy(text: str):
+    import glfw
     glfw.set_clipboard_string(globals.gui.window, text)
 
 
 def clipboard_paste():
+    import glfw
     return str(glfw.get_clipboard_string(globals.gui.window) or b"", encoding="utf-8")
 
 
 def copy_masked_link(masked_url: str):
+    from modules import webview
     host = (re.search(r"/masked/(.*?)/", masked_url) or ("", ""))[1]
     pipe = ProcessPipe()
     proc = multiprocessing.Process(target=webview.redirect, args=(masked_url, pipe, "a.host_link"), kwargs=webview.kwargs() | dict(
@@ -373,7 +377,7 @@ def remove_game(game: Game, bypass_confirm=False):
     def remove_callback():
         id = game.id
         del globals.games[id]
-        globals.gui.require_sort = True
+        sortindex.invalidate(id)
         async_thread.run(db.remove_game(id))
         for img in globals.images_path.glob(f"{id}.*"):
             try:
@@ -436,7 +440,6 @@ async def add_games(*threads: list[ThreadMatch | SearchResult]):
                      ("\n\n" if dupe_count > 0 and added_count > 0 else "") +
                      (("Duplicates:\n - " + "\n - ".join(dupes)) if dupe_count > 0 else "")
             )
-        globals.gui.require_sort = True
     count = len(threads)
     if globals.settings.select_executable_after_add and count > 1:
         buttons = {
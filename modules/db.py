@@ -1,5 +1,7 @@
 import configparser
+import collections
 import contextlib
+import functools
 import aiosqlite
 import sqlite3
 import asyncio
@@ -12,10 +14,14 @@ import time
 import re
 
 from modules.structs import (
+    CatalogThread,
+    RefreshCheck,
+    CheckOutcome,
     SearchResult,
     DefaultStyle,
     ThreadMatch,
     DisplayMode,
+    RefreshRun,
     Timestamp,
     Settings,
     Browser,
@@ -28,6 +34,8 @@ from modules.structs import (
 from modules import (
     globals,
     async_thread,
+    sortindex,
+    metrics,
     colors,
     msgbox,
     utils,
@@ -36,6 +44,19 @@ from modules import (
 )
 
 connection: aiosqlite.Connection = None
+pending_writes = 0  # Game updates since the last commit
+# Only shown in the info popup, so they are not kept in memory for every game
+lazy_game_columns = ("description", "changelog", "downloads")
+lazy_games: collections.OrderedDict[int, Game] = collections.OrderedDict()  # Least recently used first
+lazy_games_loading: set[int] = set()
+lazy_games_max = 20
+# Full text search over these game columns, kept up to date by triggers
+fts_columns = ("name", "developer", "version", "notes", "description", "changelog")
+fts_weights = (10.0, 5.0, 1.0, 3.0, 1.0, 0.5)
+fts_available = False
+# Refresh history, per-game timings are much larger so they are kept for fewer runs
+refresh_runs_max = 200
+refresh_checks_runs_max = 10
 
 
 @contextlib.contextmanager
@@ -136,6 +157,7 @@ async def connect():
             "datestamp_format":            f'TEXT    DEFAULT "%d/%m/%Y"',
             "default_exe_dir":             f'TEXT    DEFAULT ""',
             "display_mode":                f'INTEGER DEFAULT {DisplayMode.list}',
+            "filter_views":                f'TEXT    DEFAULT "{{}}"',
             "fit_images":                  f'INTEGER DEFAULT {int(False)}',
             "grid_columns":                f'INTEGER DEFAULT 3',
             "ignore_semaphore_timeouts":   f'INTEGER DEFAULT {int(False)}',
@@ -146,6 +168,7 @@ async def connect():
             "max_retries":                 f'INTEGER DEFAULT 2',
             "quick_filters":               f'INTEGER DEFAULT {int(True)}',
             "refresh_completed_games":     f'INTEGER DEFAULT {int(True)}',
+            "refresh_probe_feed":          f'INTEGER DEFAULT {int(True)}',
             "refresh_workers":             f'INTEGER DEFAULT 20',
             "render_when_unfocused":       f'INTEGER DEFAULT {int(True)}',
             "request_timeout":             f'INTEGER DEFAULT 30',
@@ -205,6 +228,7 @@ async def connect():
             "last_updated":                f'INTEGER DEFAULT 0',
             "last_full_refresh":           f'INTEGER DEFAULT 0',
             "last_refresh_version":        f'TEXT    DEFAULT ""',
+            "thread_hash":                 f'TEXT    DEFAULT ""',
             "last_played":                 f'INTEGER DEFAULT 0',
             "score":                       f'REAL    DEFAULT 0',
             "rating":                      f'INTEGER DEFAULT 0',
@@ -224,6 +248,71 @@ async def connect():
             ("executable", "executables")
         ]
     )
+    await create_games_fts()
+
+    await create_table(
+        table_name="catalog",
+        columns={
+            "id":                          f'INTEGER PRIMARY KEY',
+            "title":                       f'TEXT    DEFAULT ""',
+            "version":                     f'TEXT    DEFAULT ""',
+            "developer":                   f'TEXT    DEFAULT ""',
+            "type":                        f'INTEGER DEFAULT {Type.Unchecked}',
+            "status":                      f'INTEGER DEFAULT {Status.Unchecked}',
+            "tags":                        f'TEXT    DEFAULT "[]"',
+            "image_url":                   f'TEXT    DEFAULT ""',
+            "last_seen":                   f'INTEGER DEFAULT 0'
+        }
+    )
+    await connection.execute("""
+        CREATE INDEX IF NOT EXISTS catalog_title
+        ON catalog (title COLLATE NOCASE)
+    """)
+    # Games already in the library are known threads too
+    await connection.execute(f"""
+        INSERT INTO catalog
+        (id, title, version, developer, type, status, tags, image_url, last_seen)
+        SELECT id, name, version, developer, type, status, tags, image_url, last_full_refresh
+        FROM games
+        WHERE last_full_refresh > 0
+        ON CONFLICT DO NOTHING
+    """)
+
+    await create_table(
+        table_name="refresh_runs",
+        columns={
+            "id":                          f'INTEGER PRIMARY KEY AUTOINCREMENT',
+            "started":                     f'REAL    DEFAULT 0',
+            "ended":                       f'REAL    DEFAULT 0',
+            "full":                        f'INTEGER DEFAULT {int(False)}',
+            "workers":                     f'INTEGER DEFAULT 0',
+            "timeout":                     f'INTEGER DEFAULT 0',
+            "retries":                     f'INTEGER DEFAULT 0',
+            "queued":                      f'INTEGER DEFAULT 0',
+            "checked":                     f'INTEGER DEFAULT 0',
+            "full_checks":                 f'INTEGER DEFAULT 0',
+            "unchanged":                   f'INTEGER DEFAULT 0',
+            "skipped":                     f'INTEGER DEFAULT 0',
+            "requests":                    f'INTEGER DEFAULT 0',
+            "bytes":                       f'INTEGER DEFAULT 0',
+            "errors":                      f'INTEGER DEFAULT 0',
+            "result":                      f'TEXT    DEFAULT ""'
+        }
+    )
+    await create_table(
+        table_name="refresh_checks",
+        columns={
+            "run":                         f'INTEGER DEFAULT 0',
+            "game":                        f'INTEGER DEFAULT 0',
+            "outcome":                     f'INTEGER DEFAULT {CheckOutcome.Unchanged}',
+            "ms":                          f'INTEGER DEFAULT 0',
+            "bytes":                       f'INTEGER DEFAULT 0'
+        }
+    )
+    await connection.execute("""
+        CREATE INDEX IF NOT EXISTS refresh_checks_run
+        ON refresh_checks (run)
+    """)
 
     await create_table(
         table_name="cookies",
@@ -245,7 +334,59 @@ async def connect():
         await migrate_legacy(path)
 
 
+async def create_games_fts():
+    global fts_available
+    columns = ", ".join(fts_columns)
+    old_columns = ", ".join(f"old.{column}" for column in fts_columns)
+    new_columns = ", ".join(f"new.{column}" for column in fts_columns)
+    try:
+        # Index is stale if the table or any trigger was missing
+        cursor = await connection.execute("""
+            SELECT COUNT(*)
+            FROM sqlite_master
+            WHERE name IN ('games_fts', 'games_fts_insert', 'games_fts_delete', 'games_fts_update')
+        """)
+        rebuild = (await cursor.fetchone())[0] < 4
+        await connection.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS games_fts
+            USING fts5({columns}, content='games', content_rowid='id', tokenize='unicode61 remove_diacritics 2')
+        """)
+        await connection.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS games_fts_insert AFTER INSERT ON games BEGIN
+                INSERT INTO games_fts (rowid, {columns}) VALUES (new.id, {new_columns});
+            END
+        """)
+        await connection.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS games_fts_delete AFTER DELETE ON games BEGIN
+                INSERT INTO games_fts (games_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+            END
+        """)
+        await connection.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS games_fts_update AFTER UPDATE OF {columns} ON games BEGIN
+                INSERT INTO games_fts (games_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns});
+                INSERT INTO games_fts (rowid, {columns}) VALUES (new.id, {new_columns});
+            END
+        """)
+        if rebuild:
+            await connection.execute("""
+                INSERT INTO games_fts (games_fts)
+                VALUES ('rebuild')
+            """)
+        fts_available = True
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5, triggers would break every write to games
+        for trigger in ("insert", "delete", "update"):
+            await connection.execute(f"""
+                DROP TRIGGER IF EXISTS games_fts_{trigger}
+            """)
+        fts_available = False
+
+
 async def save():
+    global pending_writes
+    if pending_writes:
+        metrics.db_commit_batch.observe(pending_writes)
+        pending_writes = 0
     await connection.commit()
 
 
@@ -261,44 +402,71 @@ async def close():
 
 
 def sql_to_py(value: str | int | float, data_type: typing.Type):
+    return sql_converter(data_type)(value)
+
+
+@functools.cache
+def sql_converter(data_type: typing.Type):
+    # Resolves the conversion for a type once, instead of inspecting the type for every value
+    data_type_args = getattr(data_type, "__args__", None)
+    content_type = data_type_args[0] if data_type_args else None
     match getattr(data_type, "__name__", None):
         case "list":
-            try:
-                value = json.loads(value)
-            except json.JSONDecodeError:
-                value = [value] if value else []
-            if data_type_args := getattr(data_type, "__args__", None):
-                content_type = data_type_args[0]
-                value = [x for x in (content_type(x) for x in value) if x is not None]
+            def convert(value):
+                try:
+                    value = json.loads(value)
+                except json.JSONDecodeError:
+                    value = [value] if value else []
+                if content_type:
+                    value = [x for x in map(content_type, value) if x is not None]
+                return value
+        case "dict":
+            def convert(value):
+                try:
+                    return json.loads(value)
+                except json.JSONDecodeError:
+                    return {}
         case "tuple":
-            if isinstance(value, str) and getattr(data_type, "__args__", [None])[0] is float:
-                value = colors.hex_to_rgba_0_1(value)
-            else:
+            def convert(value):
+                if isinstance(value, str) and content_type is float:
+                    return colors.hex_to_rgba_0_1(value)
                 value = json.loads(value)
-                if data_type_args := getattr(data_type, "__args__", None):
-                    content_type = data_type_args[0]
-                    value = [x for x in (content_type(x) for x in value) if x is not None]
-                value = tuple(value)
+                if content_type:
+                    value = [x for x in map(content_type, value) if x is not None]
+                return tuple(value)
         case _:
             if isinstance(data_type, types.UnionType):
-                if not (getattr(data_type, "__args__", [None])[-1] is types.NoneType and value is None):
-                    value = data_type.__args__[0](value)
-                else:
-                    value = None
+                nullable = data_type_args[-1] is types.NoneType
+                def convert(value):
+                    if nullable and value is None:
+                        return None
+                    return content_type(value)
             else:
-                value = data_type(value)
-    return value
+                convert = data_type
+    return convert
 
 
-def row_to_cls(row: sqlite3.Row, cls: typing.Type):
+@functools.cache
+def row_decoder(cls: typing.Type, keys: tuple[str]):
+    # Column index to field converter, only for columns the class has
     types = cls.__annotations__
-    data = {key: sql_to_py(value, types[key]) for key, value in dict(row).items() if key in types}
-    return cls(**data)
+    fields = tuple((index, key, sql_converter(types[key])) for index, key in enumerate(keys) if key in types)
+    def decode(row: sqlite3.Row):
+        return cls(**{key: convert(row[index]) for index, key, convert in fields})
+    return decode
+
+
+def row_to_cls(row: sqlite3.Row, cls: typing.Type):
+    return row_decoder(cls, tuple(row.keys()))(row)
 
 
 async def load_games(id: int = None):
-    query = """
-        SELECT *
+    cursor = await connection.execute("""
+        PRAGMA table_info(games)
+    """)
+    columns = [column[1] for column in await cursor.fetchall() if column[1] not in lazy_game_columns]
+    query = f"""
+        SELECT {", ".join(columns)}
         FROM games
     """
     if id is not None:
@@ -306,8 +474,53 @@ async def load_games(id: int = None):
             WHERE id={id}
         """
     cursor = await connection.execute(query)
+    decode = row_decoder(Game, tuple(column[0] for column in cursor.description))
     for game in await cursor.fetchall():
-        globals.games[game["id"]] = row_to_cls(game, Game)
+        globals.games[game["id"]] = decode(game)
+        sortindex.invalidate(game["id"])
+
+
+def load_lazy_game_columns(game: Game):
+    # Called every frame while the info popup is open, only queries once
+    # The cache itself is only changed on the async thread
+    if game.id not in lazy_games and game.id not in lazy_games_loading:
+        lazy_games_loading.add(game.id)
+        async_thread.run(_load_lazy_game_columns(game))
+
+
+async def _load_lazy_game_columns(game: Game):
+    try:
+        cursor = await connection.execute(f"""
+            SELECT {", ".join(lazy_game_columns)}
+            FROM games
+            WHERE id={game.id}
+        """)
+        if row := await cursor.fetchone():
+            types = Game.__annotations__
+            for key in lazy_game_columns:
+                if getattr(game, key) is None:  # Refresh might have set it meanwhile
+                    setattr(game, key, sql_to_py(row[key], types[key]))
+            cache_lazy_game_columns(game)
+    finally:
+        lazy_games_loading.discard(game.id)
+
+
+def cache_lazy_game_columns(game: Game):
+    # Async thread only, games with their info popup open count as most recently used and are never dropped
+    lazy_games[game.id] = game
+    lazy_games.move_to_end(game.id)
+    if len(lazy_games) <= lazy_games_max:
+        return
+    info_popup = getattr(globals.gui, "draw_game_info_popup", None)
+    shown = {popup.args[0].id for popup in tuple(globals.popup_stack) if popup.func == info_popup}
+    for id in shown & lazy_games.keys():
+        lazy_games.move_to_end(id)
+    while len(lazy_games) > lazy_games_max:
+        if next(iter(lazy_games)) in shown:
+            break  # All that is left is on screen
+        _, old_game = lazy_games.popitem(last=False)
+        for key in lazy_game_columns:
+            setattr(old_game, key, None)
 
 
 async def load():
@@ -334,7 +547,7 @@ async def load():
     globals.cookies = {cookie["key"]: cookie["value"] for cookie in await cursor.fetchall()}
 
 
-def py_to_sql(value: enum.Enum | Timestamp | bool | list | tuple | typing.Any):
+def py_to_sql(value: enum.Enum | Timestamp | bool | list | dict | tuple | typing.Any):
     if hasattr(value, "value"):
         value = value.value
     elif hasattr(value, "hash"):
@@ -345,24 +558,36 @@ def py_to_sql(value: enum.Enum | Timestamp | bool | list | tuple | typing.Any):
         value = value.copy()
         value = [getattr(item, "value", getattr(item, "id", item)) for item in value]
         value = json.dumps(value)
+    elif isinstance(value, dict):
+        value = json.dumps(value)
     elif isinstance(value, tuple) and 3 <= len(value) <= 4:
         value = colors.rgba_0_1_to_hex(value)
     return value
 
 
-async def update_game(game: Game, *keys: list[str]):
+def update_game(game: Game, *keys: list[str]):
+    # Called right after changing the game, the query itself runs whenever the coroutine is awaited
+    sortindex.invalidate(game.id)
+    return _update_game(game, *keys)
+
+
+async def _update_game(game: Game, *keys: list[str]):
     values = []
 
     for key in keys:
         value = py_to_sql(getattr(game, key))
         values.append(value)
 
+    global pending_writes
+    write_start = time.perf_counter()
     await connection.execute(f"""
         UPDATE games
         SET
             {", ".join(f"{key} = ?" for key in keys)}
         WHERE id={game.id}
     """, tuple(values))
+    metrics.db_write_seconds.observe(time.perf_counter() - write_start)
+    pending_writes += 1
 
 
 async def update_settings(*keys: list[str]):
@@ -381,6 +606,7 @@ async def update_settings(*keys: list[str]):
 
 
 async def remove_game(id: int):
+    lazy_games.pop(id, None)
     await connection.execute(f"""
         DELETE FROM games
         WHERE id={id}
@@ -388,6 +614,25 @@ async def remove_game(id: int):
 
 
 async def add_game(thread: ThreadMatch | SearchResult):
+    if cached := await get_catalog(thread.id):
+        # Seen this thread before, fill in what we know until it gets checked
+        await connection.execute(f"""
+            INSERT INTO games
+            (id, name, version, developer, type, tags, image_url, url, added_on)
+            VALUES
+            (?,  ?,    ?,       ?,         ?,    ?,    ?,         ?,   ?       )
+        """, (
+            thread.id,
+            cached.title or thread.title or f"Unknown ({thread.id})",
+            cached.version or "Unchecked",
+            cached.developer,
+            py_to_sql(cached.type),
+            py_to_sql(cached.tags),
+            cached.image_url,
+            f"{api.threads_page}{thread.id}",
+            time.time()
+        ))
+        return
     await connection.execute(f"""
         INSERT INTO games
         (id, name, url, added_on)
@@ -396,6 +641,139 @@ async def add_game(thread: ThreadMatch | SearchResult):
     """, (thread.id, thread.title or f"Unknown ({thread.id})", f"{api.threads_page}{thread.id}", time.time()))
 
 
+async def get_catalog(id: int):
+    cursor = await connection.execute(f"""
+        SELECT *
+        FROM catalog
+        WHERE id={id}
+    """)
+    if row := await cursor.fetchone():
+        return row_to_cls(row, CatalogThread)
+
+
+async def update_catalog(id: int, overwrite=True, **values):
+    # Empty values never replace known ones, overwrite=False only fills in threads not seen yet
+    keys = list(values.keys())
+    values = [py_to_sql(value) for value in values.values()]
+    if overwrite:
+        conflict = ", ".join(
+            f"{key} = CASE WHEN excluded.{key} IN ('', '[]') THEN {key} ELSE excluded.{key} END"
+            for key in keys
+        )
+        conflict = f"DO UPDATE SET {conflict}, last_seen = excluded.last_seen"
+    else:
+        conflict = "DO NOTHING"
+    await connection.execute(f"""
+        INSERT INTO catalog
+        (id, {", ".join(keys)}, last_seen)
+        VALUES
+        (?, {", ".join("?" for _ in keys)}, ?)
+        ON CONFLICT (id) {conflict}
+    """, (id, *values, int(time.time())))
+
+
+async def search_catalog(query: str, limit=25):
+    query = re.sub(r"([\\%_])", r"\\\1", query.strip())
+    # Prefix matches can use the title index, only scan for substrings if those are not enough
+    cursor = await connection.execute(f"""
+        SELECT *
+        FROM catalog
+        WHERE title LIKE ? ESCAPE '\\'
+        ORDER BY last_seen DESC
+        LIMIT {limit}
+    """, (f"{query}%",))
+    results = [row_to_cls(row, CatalogThread) for row in await cursor.fetchall()]
+    if len(results) < limit:
+        cursor = await connection.execute(f"""
+            SELECT *
+            FROM catalog
+            WHERE title LIKE ? ESCAPE '\\' AND title NOT LIKE ? ESCAPE '\\'
+            ORDER BY last_seen DESC
+            LIMIT {limit - len(results)}
+        """, (f"%{query}%", f"{query}%"))
+        results += [row_to_cls(row, CatalogThread) for row in await cursor.fetchall()]
+    return results
+
+
+async def add_refresh_run(run: RefreshRun, checks: list[RefreshCheck]):
+    keys = [key for key in RefreshRun.__annotations__ if key != "id"]
+    cursor = await connection.execute(f"""
+        INSERT INTO refresh_runs
+        ({", ".join(keys)})
+        VALUES
+        ({", ".join("?" for _ in keys)})
+    """, tuple(py_to_sql(getattr(run, key)) for key in keys))
+    run.id = cursor.lastrowid
+    await connection.executemany("""
+        INSERT INTO refresh_checks
+        (run, game, outcome, ms, bytes)
+        VALUES
+        (?, ?, ?, ?, ?)
+    """, [(run.id, check.game, int(check.outcome), check.ms, check.bytes) for check in checks])
+    # Older runs fall off the history, a NULL cutoff means there are not that many yet
+    await connection.execute(f"""
+        DELETE FROM refresh_runs
+        WHERE id <= (SELECT id FROM refresh_runs ORDER BY id DESC LIMIT 1 OFFSET {refresh_runs_max})
+    """)
+    await connection.execute(f"""
+        DELETE FROM refresh_checks
+        WHERE run <= (SELECT id FROM refresh_runs ORDER BY id DESC LIMIT 1 OFFSET {refresh_checks_runs_max})
+    """)
+
+
+async def load_refresh_runs():
+    # Oldest first
+    cursor = await connection.execute("""
+        SELECT *
+        FROM refresh_runs
+        ORDER BY id
+    """)
+    return [row_to_cls(row, RefreshRun) for row in await cursor.fetchall()]
+
+
+async def load_refresh_checks(run: int, limit=25):
+    # Slowest first
+    cursor = await connection.execute(f"""
+        SELECT game, outcome, ms, bytes
+        FROM refresh_checks
+        WHERE run={run}
+        ORDER BY ms DESC
+        LIMIT {limit}
+    """)
+    return [row_to_cls(row, RefreshCheck) for row in await cursor.fetchall()]
+
+
+def fts_query(query: str):
+    # Every word as a quoted prefix, so user input can not form FTS syntax
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+
+async def search_games(query: str):
+    # Game ids matching all words, best matches first
+    if not fts_available or not (match := fts_query(query)):
+        return []
+    cursor = await connection.execute(f"""
+        SELECT rowid
+        FROM games_fts
+        WHERE games_fts MATCH ?
+        ORDER BY bm25(games_fts, {', '.join(map(str, fts_weights))})
+    """, (match,))
+    return [row[0] for row in await cursor.fetchall()]
+
+
+async def search_snippet(query: str, id: int):
+    # Best matching part of the game's text, matches wrapped in \x02 and \x03
+    if not fts_available or not (match := fts_query(query)):
+        return ""
+    cursor = await connection.execute("""
+        SELECT snippet(games_fts, -1, char(2), char(3), '...', 12)
+        FROM games_fts
+        WHERE games_fts MATCH ? AND rowid = ?
+    """, (match, id))
+    row = await cursor.fetchone()
+    return row[0] if row else ""
+
+
 async def update_label(label: Label, *keys: list[str]):
     values = []
 
@@ -0,0 +1,154 @@
+import dataclasses
+import operator
+import typing
+import re
+
+from modules.structs import (
+    ExeState,
+    Status,
+    Label,
+    Type,
+    Tag,
+)
+from modules import (
+    globals,
+    sortindex,
+)
+
+# Terms like tag:harem -tag:ntr score>=4 label:"To play", bare words search the text like the bottom bar
+term_regex = re.compile(r'(-?)(?:([a-z_]+)(>=|<=|!=|:|=|>|<))?((?:"[^"]*"|[^\s"]+)*)', re.IGNORECASE)
+comparisons = {
+    ":":  operator.eq,
+    "=":  operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">":  operator.gt,
+    "<":  operator.lt,
+}
+booleans = {
+    "yes": True, "true": True, "1": True,
+    "no": False, "false": False, "0": False,
+}
+
+
+class QueryError(Exception):
+    pass
+
+
+@dataclasses.dataclass(slots=True)
+class Term:
+    column: str
+    test: typing.Callable[[typing.Any], bool]
+    count: typing.Callable[[], int] | None  # Games expected to match, None if unknown
+    invert: bool = False
+
+    def estimate(self):
+        # Most selective terms run first, unknown ones last
+        if self.count is None:
+            return len(globals.games)
+        count = self.count()
+        return len(globals.games) - count if self.invert else count
+
+
+def normalize(name: str):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def find_member(enum: typing.Type, kind: str, value: str):
+    for member in enum:
+        if normalize(member.name) == normalize(value):
+            return member
+    raise QueryError(f"Unknown {kind} '{value}'")
+
+
+def parse_number(key: str, value: str):
+    try:
+        return float(value)
+    except ValueError:
+        raise QueryError(f"{key.capitalize()} needs a number, not '{value}'")
+
+
+def parse_boolean(key: str, value: str):
+    if (boolean := booleans.get(value.lower())) is None:
+        raise QueryError(f"{key.capitalize()} needs yes or no, not '{value}'")
+    return boolean
+
+
+def count_matching(column: str, test: typing.Callable[[typing.Any], bool]):
+    return lambda: sum(count for value, count in sortindex.counts(column).items() if test(value))
+
+
+def parse(query: str):
+    if query.count('"') % 2:
+        raise QueryError("Unclosed quote")
+    terms: list[Term] = []
+    tags_required = []
+    tags_excluded = []
+    for term in term_regex.finditer(query.strip()):
+        invert, key, op, value = term.groups()
+        if not (key or value):
+            continue
+        invert = bool(invert)
+        value = value.replace('"', "")
+        key = (key or "").lower()
+        if op == "!=":
+            invert, op = not invert, ":"
+        if key not in ("score", "rating") and op not in (None, ":", "="):
+            raise QueryError(f"'{op}' only works with score and rating")
+        match key:
+            case "":
+                search = value.lower()
+                terms.append(Term("search_text", lambda text, search=search: search in text, None, invert))
+            case "tag":
+                tag = find_member(Tag, "tag", value)
+                (tags_excluded if invert else tags_required).append(tag)
+            case "label":
+                for label in Label.instances:
+                    if normalize(label.name) == normalize(value):
+                        break
+                else:
+                    raise QueryError(f"Unknown label '{value}'")
+                terms.append(Term("labels", lambda ids, id=label.id: id in ids, lambda id=label.id: sortindex.counts("labels")[id], invert))
+            case "status" | "type" | "exe":
+                column, enum = {
+                    "status": ("status_value", Status),
+                    "type": ("type_value", Type),
+                    "exe": ("exe_state", ExeState),
+                }[key]
+                member = find_member(enum, key, value)
+                terms.append(Term(column, lambda value, member=member: value is member, lambda column=column, member=member: sortindex.counts(column)[member], invert))
+            case "score" | "rating":
+                column = f"{key}_value"
+                test = lambda value, compare=comparisons[op], number=parse_number(key, value): compare(value, number)
+                terms.append(Term(column, test, count_matching(column, test), invert))
+            case "played" | "updated":
+                boolean = parse_boolean(key, value)
+                terms.append(Term(key, lambda value, boolean=boolean: value is boolean, lambda key=key, boolean=boolean: sortindex.counts(key)[boolean], invert))
+            case "installed":
+                # Yes for any version, latest for the current one only
+                column = "installed_latest" if value.lower() in ("latest", "updated") else "installed_any"
+                boolean = True if column == "installed_latest" else parse_boolean(key, value)
+                terms.append(Term(column, lambda value, boolean=boolean: value is boolean, lambda column=column, boolean=boolean: sortindex.counts(column)[boolean], invert))
+            case _:
+                raise QueryError(f"Unknown filter '{key}'")
+    if tags_required or tags_excluded:
+        # All tag terms are checked at once against the tag bits
+        required = sortindex.tag_bits(tags_required)
+        excluded = sortindex.tag_bits(tags_excluded)
+        def count():
+            counts = sortindex.counts("tags")
+            if tags_required:
+                return min(counts[tag] for tag in tags_required)
+            return len(globals.games) - max(counts[tag] for tag in tags_excluded)
+        terms.append(Term("tag_bits", lambda bits: bits & required == required and not bits & excluded, count))
+    return terms
+
+
+def run(terms: list[Term], games_ids: list[int]):
+    # Counts are kept up to date by the index, so the order follows the library as it changes
+    for term in sorted(terms, key=Term.estimate):
+        values = sortindex.column(term.column)
+        test, invert = term.test, term.invert
+        games_ids = [id for id in games_ids if invert != test(values[id])]
+    return games_ids
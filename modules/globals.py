@@ -3,6 +3,7 @@ from functools import partial
 import os as _os
 import pathlib
 import shutil
+import typing
 import shlex
 import sys
 import re
@@ -39,8 +40,10 @@ def _():
         logging.basicConfig()
 _()
 
-from modules.structs import Browser, Game, OldGame, Os, Settings
-from modules.gui import MainGUI
+from modules.structs import Browser, Game, OldGame, Os, RefreshProgress, Settings
+if typing.TYPE_CHECKING:
+    # Only for annotations, headless mode never loads the interface
+    from modules.gui import MainGUI
 
 os = None
 data_path = None
@@ -183,9 +186,7 @@ def _():
 _()
 
 # Variables
-refresh_total = 0
-gui: MainGUI = None
-refresh_progress = 0
+gui: "MainGUI" = None
 last_update_check = 0.0
 settings: Settings = None
 refresh_task: Future = None
@@ -193,3 +194,4 @@ games: dict[int, Game] = None
 cookies: dict[str, str] = None
 popup_stack: list[partial] = []
 updated_games: dict[int, OldGame] = {}
+refresh_progress: RefreshProgress = None
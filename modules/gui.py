@@ -16,14 +16,19 @@ import aiohttp
 import OpenGL
 import string
 import imgui
+import array
 import time
 import glfw
 import sys
+import re
 
 from modules.structs import (
+    RefreshCheck,
+    SearchResult,
     DefaultStyle,
     DisplayMode,
     FilterMode,
+    RefreshRun,
     Datestamp,
     Timestamp,
     ExeState,
@@ -44,9 +49,13 @@ from modules import (
     async_thread,
     ratingwidget,
     imagehelper,
+    filterquery,
     rpc_thread,
+    loopmonitor,
     filepicker,
     callbacks,
+    profiler,
+    sortindex,
     webview,
     msgbox,
     colors,
@@ -230,6 +239,17 @@ class Columns:
 cols = Columns()
 
 
+class GameWidgetIds(dict):
+    # Widget id strings for each game, formatted once instead of every frame
+    def __init__(self, suffix: str):
+        super().__init__()
+        self.suffix = suffix
+
+    def __missing__(self, id: int):
+        value = self[id] = f"###{id}_{self.suffix}"
+        return value
+
+
 @functools.cache
 def _scaled(mult: float, size: int | float):
     return size * mult
@@ -239,6 +259,7 @@ class MainGUI():
     def __init__(self):
         # Constants
         self.sidebar_size = 230
+        self.search_debounce = 0.15  # Seconds without typing before filtering again
         self.window_flags: int = (
             imgui.WINDOW_NO_MOVE |
             imgui.WINDOW_NO_RESIZE |
@@ -291,14 +312,34 @@ class MainGUI():
         self.screen_pos = (0, 0)
         self.require_sort = True
         self.repeat_chars = False
+        self.redraw_requested = False
         self.scroll_percent = 0.0
         self.prev_manual_sort = 0
+        self.sort_order: dict[int, int] = {}
+        self.sort_columns: list[tuple[dict, bool]] = []
         self.add_box_valid = False
+        self.search_due = 0.0
+        self.search_query = ""
+        self.search_cache: tuple[str, set[int]] = (None, set())
+        self.search_ranks: dict[int, int] = {}
+        self.search_snippets: dict[int, str] = {}
         self.bg_mode_paused = False
         self.game_hitbox_click = False
         self.hovered_game: Game = None
+        self.hitbox_ids = GameWidgetIds("hitbox")
+        self.context_ids = GameWidgetIds("context")
+        self.played_ids = GameWidgetIds("played")
+        self.installed_ids = GameWidgetIds("installed")
+        self.notes_inline_ids = GameWidgetIds("notes_inline")
+        self.notes_inline_context_ids = GameWidgetIds("notes_inline_context")
         self.filters: list[Filter] = []
+        self.filter_query = ""
+        self.filter_terms: list[filterquery.Term] = []
+        self.filter_query_error = ""
+        self.filter_view_name = ""
         self.refresh_ratio_smooth = 0.0
+        self.refresh_history: list[RefreshRun] = None
+        self.refresh_history_checks: tuple[int, list[RefreshCheck]] = (None, [])
         self.bg_mode_timer: float = None
         self.input_chars: list[int] = []
         self.switched_display_mode = False
@@ -651,6 +692,7 @@ class MainGUI():
             return self.refresh_fonts()
         self.impl.refresh_font_texture()
         self.type_label_width = None
+        utils.clear_text_caches()
 
     def close(self, *_, **__):
         glfw.set_window_should_close(self.window, True)
@@ -739,15 +781,24 @@ class MainGUI():
                 prev_hidden = self.hidden
                 self.prev_size = size
                 prev_cursor = cursor
+                profiler.start("qt_events")
                 self.tray.tick_msgs()
+                self.tray.update_tooltip()
                 self.qt_app.processEvents(QtCore.QEventLoop.ProcessEventsFlag.AllEvents)
+                profiler.stop("qt_events")
                 glfw.make_context_current(self.window)
                 if self.repeat_chars:
                     for char in self.input_chars:
                         imgui.io.add_input_character(char)
                     self.repeat_chars = False
                 self.input_chars.clear()
-                glfw.poll_events()
+                if draw_next > 0.0 and not self.hidden and not self.minimized and (self.focused or globals.settings.render_when_unfocused):
+                    profiler.start("poll_events")
+                    glfw.poll_events()
+                    profiler.stop("poll_events")
+                else:
+                    # Nothing to animate, sleep until input or utils.request_redraw() from another thread
+                    glfw.wait_events_timeout(self.get_idle_timeout())
                 self.impl.process_inputs()
                 # Window state handling
                 size = imgui.io.display_size
@@ -776,6 +827,8 @@ class MainGUI():
                     draw = False
                     draw = draw or api.updating
                     draw = draw or self.require_sort
+                    draw = draw or self.redraw_requested
+                    draw = draw or bool(self.search_due)
                     draw = draw or imagehelper.redraw
                     draw = draw or size != self.prev_size
                     draw = draw or prev_hidden != self.hidden
@@ -807,9 +860,11 @@ class MainGUI():
                             utils.push_popup(self.draw_updates_popup, updated_games, sorted_ids)
 
                         # Start drawing
+                        profiler.begin_frame()
                         prev_scaling = globals.settings.interface_scaling
                         imgui.new_frame()
                         imagehelper.redraw = False
+                        self.redraw_requested = False
 
                         # Imgui window is top left of display window, and has same size
                         imgui.set_next_window_position(0, 0, imgui.ONCE)
@@ -825,7 +880,10 @@ class MainGUI():
                         # Main pane
                         imgui.begin_child("###main_frame", width=-sidebar_size)
                         self.hovered_game = None
+                        if imgui.is_key_pressed(glfw.KEY_F12):
+                            profiler.toggle()
                         # Games container
+                        profiler.start("games")
                         match globals.settings.display_mode.value:
                             case DisplayMode.list.value:
                                 self.draw_games_list()
@@ -833,6 +891,7 @@ class MainGUI():
                                 self.draw_games_grid()
                             case DisplayMode.kanban.value:
                                 self.draw_games_kanban()
+                        profiler.stop("games")
                         # Bottombar
                         self.draw_bottombar()
                         imgui.end_child()
@@ -855,7 +914,9 @@ class MainGUI():
                         # Sidebar
                         imgui.same_line(spacing=1)
                         imgui.begin_child("###sidebar_frame", width=sidebar_size - 1, height=-text_size.y)
+                        profiler.start("sidebar")
                         self.draw_sidebar()
+                        profiler.stop("sidebar")
                         imgui.end_child()
 
                         # Status / watermark text
@@ -866,6 +927,7 @@ class MainGUI():
                         imgui.text(text)
 
                         # Popups
+                        profiler.start("popups")
                         open_popup_count = 0
                         for popup in globals.popup_stack:
                             opened, closed =  popup()
@@ -875,22 +937,33 @@ class MainGUI():
                         # Popups are closed all at the end to allow stacking
                         for _ in range(open_popup_count):
                             imgui.end_popup()
+                        profiler.stop("popups")
 
                         # Close main window (technically popups are inside the window, and inside one another - this gives proper stacking order)
                         imgui.end()
 
+                        if profiler.enabled:
+                            self.draw_profiler_overlay()
+                        # Only measure the loop while something shows it, idle should cost nothing
+                        if globals.debug or profiler.enabled or any(popup.func == self.draw_loop_monitor_popup for popup in globals.popup_stack):
+                            loopmonitor.start()
+                        else:
+                            loopmonitor.stop()
+
                         # Render interface
+                        profiler.start("render")
                         imgui.render()
                         self.impl.render(imgui.get_draw_data())
+                        profiler.stop("render")
                         # Rescale fonts
                         if prev_scaling != globals.settings.interface_scaling:
                             self.refresh_fonts()
                             self.refresh_styles()
                             async_thread.run(db.update_settings("interface_scaling"))
-                    # Wait idle time
+                        profiler.start("swap_buffers")
                         glfw.swap_buffers(self.window)
-                    else:
-                        time.sleep(1 / 15)
+                        profiler.stop("swap_buffers")
+                        profiler.end_frame()
                 else:
                     # Tray bg mode and not paused
                     if self.hidden and not self.bg_mode_paused:
@@ -911,11 +984,6 @@ class MainGUI():
                                 # Run scheduled notif check
                                 self.bg_mode_notifs_timer = None
                                 utils.start_refresh_task(api.check_notifs(login=True), reset_bg_timers=False)
-                    # Wait idle time
-                    if self.tray.menu_open:
-                        time.sleep(1 / 60)
-                    else:
-                        time.sleep(1 / 3)
         finally:
             # Main loop over, cleanup and close
             imgui.save_ini_settings_to_disk(imgui.io.ini_file_name)
@@ -937,6 +1005,87 @@ class MainGUI():
             self.impl.shutdown()
             glfw.terminate()
 
+    def draw_profiler_overlay(self):
+        imgui.set_next_window_position(self.scaled(20), self.scaled(20), imgui.FIRST_USE_EVER)
+        expanded, opened = imgui.begin("Frame profiler (F12)###frame_profiler", closable=True, flags=imgui.WINDOW_ALWAYS_AUTO_RESIZE)
+        if not opened:
+            profiler.toggle()
+        if expanded:
+            p50, p95, p99 = profiler.percentiles(profiler.frame_times)
+            imgui.text(f"Frame: {p50:.2f} / {p95:.2f} / {p99:.2f} ms (p50 / p95 / p99, last {len(profiler.frame_times)} frames)")
+            if imgui.begin_table("###frame_profiler_stages", column=4, flags=imgui.TABLE_BORDERS_INNER_HORIZONTAL):
+                for header in ("Stage", "p50", "p95", "p99"):
+                    imgui.table_setup_column(header)
+                imgui.table_headers_row()
+                for name, times in profiler.stage_times.items():
+                    imgui.table_next_row()
+                    imgui.table_next_column()
+                    imgui.text(name)
+                    for value in profiler.percentiles(times):
+                        imgui.table_next_column()
+                        imgui.text(f"{value:.2f}")
+                imgui.end_table()
+            imgui.spacing()
+            imgui.text_disabled(f"Spikes over {profiler.spike_ms:.0f} ms:")
+            if not profiler.spikes:
+                imgui.text("None yet")
+            for timestamp, total, slowest in reversed(profiler.spikes):
+                imgui.text(f"{dt.datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')}  {total:.1f} ms, mostly {slowest or 'unknown'}")
+            imgui.spacing()
+            if imgui.button(f"{icons.delete_outline} Clear"):
+                profiler.clear()
+            imgui.same_line()
+            if imgui.button(f"{icons.file_export_outline} Export Chrome trace"):
+                path = globals.data_path / f"frame_trace_{dt.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+                try:
+                    profiler.export_trace(path)
+                    utils.push_popup(
+                        msgbox.msgbox, "Trace exported",
+                        f"Saved {len(profiler.trace)} events to:\n{path}\n"
+                        "\n"
+                        "Open it in chrome://tracing or ui.perfetto.dev.",
+                        MsgBox.info
+                    )
+                except Exception:
+                    utils.push_popup(
+                        msgbox.msgbox, "Export error",
+                        f"Something went wrong saving the trace:\n{error.text()}",
+                        MsgBox.error,
+                        more=error.traceback()
+                    )
+        imgui.end()
+
+    def get_idle_timeout(self):
+        # Longest wait for events, tray and background timers are still checked on this interval
+        if self.tray.menu_open:
+            return 1 / 60
+        timeout = 1 / 3
+        if self.search_due:
+            timeout = min(timeout, max(self.search_due - time.perf_counter(), 0.0))
+        return timeout
+
+    def draw_search_snippet(self, game: Game):
+        snippets = self.search_snippets
+        if (snippet := snippets.get(game.id)) is None:
+            snippets[game.id] = ""  # Loading
+            query = self.search_query
+            async def _load_snippet():
+                snippets[game.id] = await db.search_snippet(query, game.id)
+            async_thread.run(_load_snippet())
+            return
+        if not snippet:
+            return
+        imgui.begin_tooltip()
+        # Matched words are wrapped in \x02 and \x03
+        for i, part in enumerate(re.split("[\x02\x03]", " ".join(snippet.split()))):
+            if i > 0:
+                imgui.same_line(spacing=0)
+            if i % 2:
+                imgui.text_colored(part, *globals.settings.style_accent)
+            else:
+                imgui.text(part)
+        imgui.end_tooltip()
+
     def draw_hover_text(self, hover_text: str, text="(?)", force=False):
         if text:
             imgui.text_disabled(text)
@@ -974,7 +1123,7 @@ class MainGUI():
             if self.type_label_width is None:
                 self.type_label_width = 0
                 for name in Type._member_names_:
-                    self.type_label_width = max(self.type_label_width, imgui.calc_text_size(name).x)
+                    self.type_label_width = max(self.type_label_width, utils.text_width(name))
                 self.type_label_width += 2 * x_padding
             if align:
                 imgui.push_y(backup_y_padding)
@@ -1013,9 +1162,9 @@ class MainGUI():
             self.require_sort = True
         if short and imgui.is_item_hovered():
             imgui.begin_tooltip()
-            imgui.push_font(imgui.fonts.default)
+            utils.push_font(imgui.fonts.default)
             self.draw_label_widget(label, short=False)
-            imgui.pop_font()
+            utils.pop_font()
             imgui.end_tooltip()
         self.end_framed_text(interaction=quick_filter)
 
@@ -1108,17 +1257,16 @@ class MainGUI():
             return game.version
 
     def draw_game_played_checkbox(self, game: Game, label=""):
-        changed, game.played = imgui.checkbox(f"{label}###{game.id}_played", game.played)
+        changed, game.played = imgui.checkbox(label + self.played_ids[game.id], game.played)
         if changed:
             async_thread.run(db.update_game(game, "played"))
-            self.require_sort = True
 
     def draw_game_installed_checkbox(self, game: Game, label=""):
         if game.installed and game.installed == game.version:
             checkbox = imgui.checkbox
         else:
             checkbox = imgui._checkbox
-        changed, _ = checkbox(f"{label}###{game.id}_installed", bool(game.installed))
+        changed, _ = checkbox(label + self.installed_ids[game.id], bool(game.installed))
         if changed:
             if game.installed == game.version:
                 game.installed = ""  # Latest installed -> Not installed
@@ -1126,14 +1274,12 @@ class MainGUI():
                 game.installed = game.version  # Not installed -> Latest installed, Outdated installed -> Latest installed
                 game.updated = False
             async_thread.run(db.update_game(game, "installed", "updated"))
-            self.require_sort = True
 
     def draw_game_rating_widget(self, game: Game):
         changed, value = ratingwidget.ratingwidget("", game.rating)
         if changed:
             game.rating = value
             async_thread.run(db.update_game(game, "rating"))
-            self.require_sort = True
 
     def draw_game_open_thread_button(self, game: Game, label="", selectable=False):
         if selectable:
@@ -1200,7 +1346,7 @@ class MainGUI():
         else:
             clicked = imgui.button(label)
         if clicked:
-            utils.start_refresh_task(api.check(game, full=True, login=True))
+            utils.start_recheck_task(game)
 
     def draw_game_labels_select_widget(self, game: Game):
         if Label.instances:
@@ -1211,7 +1357,6 @@ class MainGUI():
                         game.labels.append(label)
                     else:
                         game.labels.remove(label)
-                    self.require_sort = True
                     async_thread.run(db.update_game(game, "labels"))
                 imgui.same_line()
                 self.draw_label_widget(label)
@@ -1248,7 +1393,7 @@ class MainGUI():
                 width=width or imgui.get_content_region_available_width(),
                 height=self.scaled(450)
             )
-            setter_extra = lambda _=None: [setattr(self, "require_sort", True), async_thread.run(db.update_game(game, "notes"))]
+            setter_extra = lambda _=None: async_thread.run(db.update_game(game, "notes"))
             if changed:
                 setter_extra()
             if imgui.begin_popup_context_item(f"###{game.id}_notes_context"):
@@ -1262,7 +1407,7 @@ class MainGUI():
             else:
                 first_line = game.notes
             changed, first_line = imgui.input_text(
-                f"###{game.id}_notes_inline",
+                self.notes_inline_ids[game.id],
                 value=first_line
             )
             def setter_extra(value: str):
@@ -1270,11 +1415,10 @@ class MainGUI():
                 if (offset := game.notes.find("\n")) != -1:
                     value += game.notes[offset:]
                 game.notes = value
-                self.require_sort = True
                 async_thread.run(db.update_game(game, "notes"))
             if changed:
                 setter_extra(first_line)
-            if imgui.begin_popup_context_item(f"###{game.id}_notes_inline_context"):
+            if imgui.begin_popup_context_item(self.notes_inline_context_ids[game.id]):
                 utils.text_context(type("_", (), dict(_=first_line))(), "_", setter_extra)
                 imgui.end_popup()
 
@@ -1283,7 +1427,7 @@ class MainGUI():
         self.begin_framed_text((0.3, 0.3, 0.3, 1.0), interaction=quick_filter)
         _20 = self.scaled(20)
         for tag in game.tags:
-            if imgui.get_content_region_available_width() < imgui.calc_text_size(tag.name).x + _20:
+            if imgui.get_content_region_available_width() < utils.text_width(tag.name) + _20:
                 imgui.dummy(0, 0)
             self.draw_tag_widget(tag, setup=False)
             imgui.same_line()
@@ -1293,12 +1437,12 @@ class MainGUI():
     def draw_game_labels_widget(self, game: Game, wrap=True, small=False, align=False):
         _20 = self.scaled(20)
         if small:
-            imgui.push_font(imgui.fonts.small)
+            utils.push_font(imgui.fonts.small)
             if align:
                 imgui.push_y(self.scaled(2.5))
                 popped_y = False
         for label in game.labels:
-            if wrap and imgui.get_content_region_available_width() < imgui.calc_text_size(label.short_name if small else label.name).x + _20:
+            if wrap and imgui.get_content_region_available_width() < utils.text_width(label.short_name if small else label.name) + _20:
                 if small and align and not popped_y:
                     imgui.pop_y()
                     popped_y = True
@@ -1310,7 +1454,7 @@ class MainGUI():
         elif wrap:
             imgui.dummy(0, 0)
         if small:
-            imgui.pop_font()
+            utils.pop_font()
 
     def draw_updates_popup(self, updated_games, sorted_ids, popup_uuid: str = ""):
         def popup_content():
@@ -1334,7 +1478,7 @@ class MainGUI():
                 game = globals.games[id]
                 if category is not game.type.category:
                     category = game.type.category
-                    imgui.push_font(imgui.fonts.big)
+                    utils.push_font(imgui.fonts.big)
                     imgui.set_cursor_pos_x(img_pos_x - self.scaled(8))
                     category_open = imgui.tree_node(
                         category.name,
@@ -1344,15 +1488,15 @@ class MainGUI():
                             imgui.TREE_NODE_DEFAULT_OPEN
                         )
                     )
-                    imgui.pop_font()
+                    utils.pop_font()
                 if not category_open:
                     continue
                 img_pos_y = imgui.get_cursor_pos_y()
                 imgui.begin_group()
 
-                imgui.push_font(imgui.fonts.big)
+                utils.push_font(imgui.fonts.big)
                 imgui.text(old_game.name)
-                imgui.pop_font()
+                utils.pop_font()
 
                 imgui.spacing()
                 imgui.text_disabled("Update date: ")
@@ -1422,12 +1566,13 @@ class MainGUI():
         zoom_popup = False
         def popup_content():
             nonlocal popup_pos, popup_size, zoom_popup
+            db.load_lazy_game_columns(game)
             # Image
             image = game.image
             avail = imgui.get_content_region_available()
             if image.missing:
                 text = "Image missing!"
-                width = imgui.calc_text_size(text).x
+                width = utils.text_width(text)
                 imgui.set_cursor_pos_x((avail.x - width + imgui.style.scrollbar_size) / 2)
                 self.draw_hover_text(
                     text=text,
@@ -1435,7 +1580,7 @@ class MainGUI():
                 )
             elif image.invalid:
                 text = "Invalid image!"
-                width = imgui.calc_text_size(text).x
+                width = utils.text_width(text)
                 imgui.set_cursor_pos_x((avail.x - width + imgui.style.scrollbar_size) / 2)
                 self.draw_hover_text(
                     text=text,
@@ -1496,9 +1641,9 @@ class MainGUI():
                 imgui.end_child()
             imgui.push_text_wrap_pos()
 
-            imgui.push_font(imgui.fonts.big)
+            utils.push_font(imgui.fonts.big)
             self.draw_game_name_text(game)
-            imgui.pop_font()
+            utils.pop_font()
 
             self.draw_game_play_button(game, f"{icons.play} Play")
             imgui.same_line()
@@ -1530,12 +1675,12 @@ class MainGUI():
             if game.updated:
                 self.draw_game_update_icon(game)
                 imgui.same_line()
-            offset = imgui.calc_text_size("Version:").x + imgui.style.item_spacing.x
+            offset = utils.text_width("Version:") + imgui.style.item_spacing.x
             utils.wrap_text(self.get_game_version_text(game), width=offset + imgui.get_content_region_available_width(), offset=offset)
 
             imgui.text_disabled("Developer:")
             imgui.same_line()
-            offset = imgui.calc_text_size("Developer:").x + imgui.style.item_spacing.x
+            offset = utils.text_width("Developer:") + imgui.style.item_spacing.x
             utils.wrap_text(game.developer or "Unknown", width=offset + imgui.get_content_region_available_width(), offset=offset)
 
             imgui.text_disabled("Personal Rating:")
@@ -1579,7 +1724,7 @@ class MainGUI():
                 imgui.text_disabled("Executable:")
                 imgui.same_line()
                 if game.executables:
-                    offset = imgui.calc_text_size("Executable:").x + imgui.style.item_spacing.x
+                    offset = utils.text_width("Executable:") + imgui.style.item_spacing.x
                     utils.wrap_text(game.executables[0], width=offset + imgui.get_content_region_available_width(), offset=offset)
                 else:
                     imgui.text("Not set")
@@ -1615,6 +1760,8 @@ class MainGUI():
                     imgui.spacing()
                     if game.changelog:
                         imgui.text_unformatted(game.changelog)
+                    elif game.changelog is None:
+                        imgui.text_disabled("Loading...")
                     else:
                         imgui.text_disabled("Either this game doesn't have a changelog, or the thread is not formatted properly!")
                     imgui.end_tab_item()
@@ -1626,6 +1773,8 @@ class MainGUI():
                     imgui.spacing()
                     if game.description:
                         imgui.text_unformatted(game.description)
+                    elif game.description is None:
+                        imgui.text_disabled("Loading...")
                     else:
                         imgui.text_disabled("Either this game doesn't have a description, or the thread is not formatted properly!")
                     imgui.end_tab_item()
@@ -1739,7 +1888,7 @@ class MainGUI():
                                 imgui.text_unformatted(name + ":")
                                 for mirror, link in mirrors:
                                     imgui.same_line()
-                                    if imgui.get_content_region_available_width() < imgui.calc_text_size(icons.link + mirror).x + _20:
+                                    if imgui.get_content_region_available_width() < utils.text_width(icons.link + mirror) + _20:
                                         imgui.dummy(0, 0)
                                     if f"{api.domain}/masked/" in link:
                                         clicked = imgui.small_button(icons.domino_mask + mirror)
@@ -1762,6 +1911,8 @@ class MainGUI():
                                 imgui.spacing()
                                 imgui.spacing()
                                 can_add_spacing = False
+                    elif game.downloads is None:
+                        imgui.text_disabled("Loading...")
                     else:
                         imgui.text_disabled("Either this game doesn't have regular downloads, or the thread is not formatted properly!")
                     imgui.end_tab_item()
@@ -1815,7 +1966,7 @@ class MainGUI():
             pos = popup_pos
             size = popup_size
             if size and pos:
-                imgui.push_font(imgui.fonts.big)
+                utils.push_font(imgui.fonts.big)
                 text_size = imgui.calc_text_size(icons.arrow_left_drop_circle)
                 offset = self.scaled(10)
                 mouse_pos = imgui.get_mouse_pos()
@@ -1831,7 +1982,7 @@ class MainGUI():
                 y_ok = y <= mouse_pos.y <= y + text_size.y
                 clicked_left = mouse_clicked and x1 <= mouse_pos.x <= x1 + text_size.x and y_ok
                 clicked_right = mouse_clicked and x2 <= mouse_pos.x <= x2 + text_size.x and y_ok
-                imgui.pop_font()
+                utils.pop_font()
                 change_id = None
                 idx = carousel_ids.index(game.id)
                 if imgui.is_key_pressed(glfw.KEY_LEFT, repeat=True) or clicked_left:
@@ -1859,9 +2010,9 @@ class MainGUI():
             self.icon_texture.render(_230, _230, rounding=globals.settings.style_corner_radius)
             imgui.same_line()
             imgui.begin_group()
-            imgui.push_font(imgui.fonts.big)
+            utils.push_font(imgui.fonts.big)
             imgui.text("F95Checker")
-            imgui.pop_font()
+            utils.pop_font()
             imgui.text(f"Version {globals.version_name}")
             imgui.text("Made with <3 by WillyJL")
             imgui.text("")
@@ -1891,6 +2042,12 @@ class MainGUI():
             imgui.same_line()
             if imgui.button(f"{icons.link_variant} Donate + Links", width=btn_width):
                 callbacks.open_webpage(developer_page)
+            btn_width = (width - imgui.style.item_spacing.x) / 2
+            if imgui.button(f"{icons.chart_timeline_variant} Frame profiler (F12)", width=btn_width):
+                profiler.toggle()
+            imgui.same_line()
+            if imgui.button(f"{icons.speedometer} Async loop monitor", width=btn_width):
+                utils.push_popup(self.draw_loop_monitor_popup)
             imgui.spacing()
             imgui.spacing()
             imgui.push_text_wrap_pos(width)
@@ -1912,11 +2069,11 @@ class MainGUI():
             imgui.spacing()
             imgui.spacing()
             imgui.text("")
-            imgui.push_font(imgui.fonts.big)
+            utils.push_font(imgui.fonts.big)
             size = imgui.calc_text_size("Cool people")
             imgui.set_cursor_pos_x((width - size.x + imgui.style.scrollbar_size) / 2)
             imgui.text("Cool people")
-            imgui.pop_font()
+            utils.pop_font()
             imgui.spacing()
             imgui.spacing()
             imgui.text("Supporters:")
@@ -1970,16 +2127,136 @@ class MainGUI():
             imgui.pop_text_wrap_pos()
         return utils.popup("About F95Checker", popup_content, closable=True, outside=True, popup_uuid=popup_uuid)
 
+    def load_refresh_history(self, run: int = None):
+        async def _load_refresh_history():
+            if run is None:
+                self.refresh_history = await db.load_refresh_runs()
+            else:
+                self.refresh_history_checks = (run, await db.load_refresh_checks(run))
+            utils.request_redraw()
+        if run is None:
+            self.refresh_history = None
+            self.refresh_history_checks = (None, [])
+        else:
+            self.refresh_history_checks = (run, None)
+        async_thread.run(_load_refresh_history())
+
+    def draw_refresh_history_popup(self, popup_uuid: str = ""):
+        def popup_content():
+            runs = self.refresh_history
+            if runs is None:
+                imgui.text("Loading...")
+                return
+            if not runs:
+                imgui.text("No refreshes recorded yet, they show up here once one finishes or is cancelled.")
+                return
+            # Trends, oldest to newest
+            width = self.scaled(720)
+            height = self.scaled(60)
+            durations = array.array("f", (max(run.ended - run.started, 0.001) for run in runs))
+            rates = array.array("f", (run.checked / duration for run, duration in zip(runs, durations)))
+            imgui.plot_lines("###refresh_history_rates", rates, overlay_text=f"Games/s (last {rates[-1]:.1f})", scale_min=0.0, graph_size=(width, height))
+            imgui.plot_lines("###refresh_history_durations", durations, overlay_text=f"Duration (last {durations[-1]:.0f}s)", scale_min=0.0, graph_size=(width, height))
+            imgui.spacing()
+            headers = ("Started", "Duration", "Games/s", "Full", "Quick", "Skipped", "Requests", "Received", "Errors", "Workers", "Timeout", "Retries", "Result")
+            selected, checks = self.refresh_history_checks
+            if imgui.begin_table(
+                "###refresh_history",
+                column=len(headers),
+                flags=imgui.TABLE_SCROLL_Y | imgui.TABLE_ROW_BACKGROUND | imgui.TABLE_BORDERS_INNER_HORIZONTAL | imgui.TABLE_SIZING_FIXED_FIT,
+                outer_size_width=width,
+                outer_size_height=self.scaled(220)
+            ):
+                imgui.table_setup_scroll_freeze(0, 1)
+                for header in headers:
+                    imgui.table_setup_column(header)
+                imgui.table_headers_row()
+                for run, duration, rate in zip(reversed(runs), reversed(durations), reversed(rates)):
+                    imgui.table_next_row()
+                    imgui.table_next_column()
+                    started = dt.datetime.fromtimestamp(run.started).strftime(globals.settings.timestamp_format)
+                    if imgui.selectable(f"{started}###refresh_run_{run.id}", run.id == selected, flags=imgui.SELECTABLE_SPAN_ALL_COLUMNS)[0]:
+                        self.load_refresh_history(run.id)
+                    for value in (
+                        f"{duration:.0f}s",
+                        f"{rate:.1f}",
+                        run.full_checks,
+                        run.unchanged,
+                        run.skipped,
+                        run.requests,
+                        f"{run.bytes / 1024 / 1024:.1f} MiB",
+                        run.errors,
+                        run.workers,
+                        f"{run.timeout}s",
+                        run.retries,
+                        run.result or ("Full refresh" if run.full else "Done"),
+                    ):
+                        imgui.table_next_column()
+                        imgui.text(str(value))
+                imgui.end_table()
+            if selected is None:
+                imgui.text_disabled("Click a run to see its slowest games.")
+                return
+            imgui.spacing()
+            if checks is None:
+                imgui.text("Loading...")
+                return
+            if not checks:
+                imgui.text_disabled(f"Per-game timings are only kept for the last {db.refresh_checks_runs_max} refreshes.")
+                return
+            imgui.text_disabled("Slowest games in this run:")
+            for check in checks:
+                name = game.name if (game := globals.games.get(check.game)) else f"Thread {check.game}"
+                imgui.text(f"{getattr(icons, check.outcome.icon)} {check.ms / 1000:.2f}s  {check.bytes / 1024:.0f} KiB  {name}")
+        return utils.popup("Refresh history", popup_content, buttons=True, closable=True, outside=True, popup_uuid=popup_uuid)
+
+    def draw_loop_monitor_popup(self, popup_uuid: str = ""):
+        def popup_content():
+            if lags := sorted(loopmonitor.lags):
+                p95 = lags[min(len(lags) - 1, int(0.95 * len(lags)))]
+                imgui.text(f"Loop lag: {loopmonitor.lags[-1] * 1000:.1f} ms now, {p95 * 1000:.1f} ms p95, {lags[-1] * 1000:.1f} ms max")
+            else:
+                imgui.text("Loop lag: measuring...")
+            imgui.spacing()
+            imgui.text_disabled(f"Callbacks blocking the loop for over {loopmonitor.slow_threshold * 1000:.0f} ms:")
+            if not loopmonitor.stalls:
+                imgui.text("None yet")
+            for stall in reversed(loopmonitor.stalls):
+                when = dt.datetime.fromtimestamp(stall.timestamp).strftime("%H:%M:%S")
+                if imgui.tree_node(f"{when}  blocked for {stall.duration:.2f}s###stall_{id(stall)}"):
+                    utils.push_font(imgui.fonts.mono)
+                    imgui.text_unformatted(stall.stack or "Stack unavailable")
+                    utils.pop_font()
+                    imgui.tree_pop()
+            imgui.spacing()
+            tasks = loopmonitor.tasks()
+            imgui.text_disabled(f"Live tasks: {sum(sum(names.values()) for names in tasks.values())}")
+            for origin, names in tasks.items():
+                if imgui.tree_node(f"{origin}: {sum(names.values())}###tasks_{origin}"):
+                    for name, count in names.most_common():
+                        imgui.bullet_text(f"{name} x{count}" if count > 1 else name)
+                    imgui.tree_pop()
+        return utils.popup("Async loop monitor", popup_content, buttons=True, closable=True, outside=True, popup_uuid=popup_uuid)
+
     def sort_games(self, sort_specs: imgui.core._ImGuiTableSortSpecs):
+        profiler.start("sort_games")
         manual_sort = cols.manual_sort.enabled
         if manual_sort != self.prev_manual_sort:
             self.prev_manual_sort = manual_sort
             self.require_sort = True
+        if self.search_due and time.perf_counter() >= self.search_due:
+            self.search_due = 0.0
+            self.start_search(self.add_box_text)
+            self.require_sort = True
         if sort_specs.specs_count > 0:
             self.sort_specs = []
             for sort_spec in sort_specs.specs:
                 self.sort_specs.insert(0, SortSpec(index=sort_spec.column_index, reverse=bool(sort_spec.sort_direction - 1)))
+        ranks = self.current_search_ranks()
+        if sortindex.changed and (manual_sort or ranks):
+            self.require_sort = True  # Manual order lives in settings, and search ranks in the db, always rebuilt
         if sort_specs.specs_dirty or self.require_sort:
+            sortindex.changed.clear()
             if manual_sort:
                 changed = False
                 to_remove = []
@@ -1999,86 +2276,173 @@ class MainGUI():
                 self.sorted_games_ids = globals.settings.manual_sort_list
             else:
                 ids = list(globals.games)
+                self.sort_order = {id: i for i, id in enumerate(ids)}
+                self.sort_columns = []
                 for sort_spec in self.sort_specs:
                     match sort_spec.index:
                         case cols.type.index:
-                            key = lambda id: globals.games[id].type.name
+                            key = "type"
                         case cols.developer.index:
-                            key = lambda id: globals.games[id].developer.lower()
+                            key = "developer"
                         case cols.last_updated.index:
-                            key = lambda id: - globals.games[id].last_updated.value
+                            key = "last_updated"
                         case cols.last_played.index:
-                            key = lambda id: - globals.games[id].last_played.value
+                            key = "last_played"
                         case cols.added_on.index:
-                            key = lambda id: - globals.games[id].added_on.value
+                            key = "added_on"
                         case cols.played.index:
-                            key = lambda id: not globals.games[id].played
+                            key = "not_played"
                         case cols.installed.index:
-                            key = lambda id: 2 if not globals.games[id].installed else 1 if globals.games[id].installed == globals.games[id].version else 0
+                            key = "installed"
                         case cols.rating.index:
-                            key = lambda id: - globals.games[id].rating
+                            key = "rating"
                         case cols.notes.index:
-                            key = lambda id: globals.games[id].notes.lower() or "z"
+                            key = "notes"
                         case cols.status_standalone.index:
-                            key = lambda id: globals.games[id].status.value
+                            key = "status"
                         case cols.score.index:
-                            key = lambda id: - globals.games[id].score
+                            key = "score"
                         case _:  # Name and all others
-                            key = lambda id: globals.games[id].name.lower()
-                    ids.sort(key=key, reverse=sort_spec.reverse)
+                            key = "name"
+                    values = sortindex.column(key)
+                    self.sort_columns.insert(0, (values, sort_spec.reverse))  # Last sort pass decides first
+                    ids.sort(key=values.__getitem__, reverse=sort_spec.reverse)
                 self.sorted_games_ids = ids
-            self.sorted_games_ids.sort(key=lambda id: globals.games[id].status is not Status.Unchecked)
-            for flt in self.filters:
-                match flt.mode.value:
-                    case FilterMode.Exe_State.value:
-                        key = lambda id: flt.invert != (
-                            (not globals.games[id].executables) if flt.match is ExeState.Unset else
-                            (bool(globals.games[id].executables) and (globals.games[id].executables_valid != (flt.match is ExeState.Invalid)))
-                        )
-                    case FilterMode.Installed.value:
-                        key = lambda id: flt.invert != (
-                            (globals.games[id].installed != "") if flt.match else
-                            (globals.games[id].installed == globals.games[id].version)
-                        )
-                    case FilterMode.Label.value:
-                        key = lambda id: flt.invert != (flt.match in globals.games[id].labels)
-                    case FilterMode.Played.value:
-                        key = lambda id: flt.invert != (globals.games[id].played is True)
-                    case FilterMode.Rating.value:
-                        key = lambda id: flt.invert != (globals.games[id].rating == flt.match)
-                    case FilterMode.Score.value:
-                        key = lambda id: flt.invert != (globals.games[id].score >= flt.match)
-                    case FilterMode.Status.value:
-                        key = lambda id: flt.invert != (globals.games[id].status is flt.match)
-                    case FilterMode.Tag.value:
-                        key = lambda id: flt.invert != (flt.match in globals.games[id].tags)
-                    case FilterMode.Type.value:
-                        key = lambda id: flt.invert != (globals.games[id].type is flt.match)
-                    case FilterMode.Updated.value:
-                        key = lambda id: flt.invert != (globals.games[id].updated is True)
-                    case _:
-                        key = None
-                if key is not None:
-                    self.sorted_games_ids = list(filter(key, self.sorted_games_ids))
-            if self.add_box_text:
-                if self.add_box_valid:
-                    matches = [match.id for match in utils.extract_thread_matches(self.add_box_text)]
-                    self.sorted_games_ids = list(filter(lambda id: id in matches, self.sorted_games_ids))
-                else:
-                    search = self.add_box_text.lower()
-                    def key(id):
-                        game = globals.games[id]
-                        return search in game.version.lower() or search in game.developer.lower() or search in game.name.lower() or search in game.notes.lower()
-                    self.sorted_games_ids = list(filter(key, self.sorted_games_ids))
+            self.sorted_games_ids.sort(key=sortindex.column("checked").__getitem__)
+            self.sorted_games_ids = self.filter_games(self.sorted_games_ids)
+            if ranks:
+                # Best text matches first, the others keep the sort order
+                unranked = len(ranks)
+                self.sorted_games_ids.sort(key=lambda id: ranks.get(id, unranked))
             sort_specs.specs_dirty = False
             self.require_sort = False
+        elif sortindex.changed:
+            self.resort_changed_games()
+        profiler.stop("sort_games")
+
+    def resort_changed_games(self):
+        # Same order the sort passes above give, as a single key for binary insertion
+        checked = sortindex.column("checked")
+        def key(id: int):
+            return (
+                checked[id],
+                *(sortindex.Reversed(values[id]) if reverse else values[id] for values, reverse in self.sort_columns),
+                self.sort_order[id]
+            )
+        def keep(id: int):
+            if id not in globals.games or not self.filter_games([id]):
+                return False
+            self.sort_order.setdefault(id, len(self.sort_order))  # New games go last among equals
+            return True
+        sortindex.reposition(self.sorted_games_ids, sortindex.changed, key, keep)
+
+    def start_search(self, query: str):
+        async def _search():
+            ranks = {id: i for i, id in enumerate(await db.search_games(query))}
+            if query != self.add_box_text:
+                return  # Text changed again meanwhile
+            self.search_ranks = ranks
+            self.search_snippets = {}
+            self.search_query = query
+            self.require_sort = True
+        async_thread.run(_search())
+
+    def search_matches(self, search: str):
+        # Games whose version, developer, name or notes contain the text
+        recheck = set()
+        while sortindex.search_changed:
+            recheck.add(sortindex.search_changed.pop())
+        text = sortindex.column("search_text")
+        cached, matches = self.search_cache
+        if cached is None or cached not in search:
+            matches = {id for id, value in text.items() if search in value}
+        else:
+            # Longer text only ever matches fewer games, narrow down the last results
+            for id in recheck:
+                if id in globals.games and cached in text[id]:
+                    matches.add(id)
+                else:
+                    matches.discard(id)
+            if cached != search:
+                matches = {id for id in matches if search in text[id]}
+        self.search_cache = (search, matches)
+        return matches
+
+    def current_search_ranks(self):
+        if self.add_box_text and not self.add_box_valid and self.search_query == self.add_box_text:
+            return self.search_ranks
+        return {}
+
+    def set_filter_query(self, query: str):
+        self.filter_query = query
+        try:
+            self.filter_terms = filterquery.parse(query)
+            self.filter_query_error = ""
+        except filterquery.QueryError as exc:
+            self.filter_query_error = str(exc)  # Keep filtering with the last valid query meanwhile
+        self.require_sort = True
+
+    def filter_games(self, games_ids: list[int]):
+        if self.filter_terms:
+            games_ids = filterquery.run(self.filter_terms, games_ids)
+        tags_required = 0
+        tags_excluded = 0
+        for flt in self.filters:
+            match flt.mode.value:
+                case FilterMode.Exe_State.value:
+                    values = sortindex.column("exe_state")
+                    games_ids = [id for id in games_ids if flt.invert != (values[id] is flt.match)]
+                case FilterMode.Installed.value:
+                    values = sortindex.column("installed_any" if flt.match else "installed_latest")
+                    games_ids = [id for id in games_ids if flt.invert != values[id]]
+                case FilterMode.Label.value:
+                    values = sortindex.column("labels")
+                    games_ids = [id for id in games_ids if flt.invert != (flt.match.id in values[id])]
+                case FilterMode.Played.value:
+                    values = sortindex.column("played")
+                    games_ids = [id for id in games_ids if flt.invert != values[id]]
+                case FilterMode.Rating.value:
+                    values = sortindex.column("rating_value")
+                    games_ids = [id for id in games_ids if flt.invert != (values[id] == flt.match)]
+                case FilterMode.Score.value:
+                    values = sortindex.column("score_value")
+                    games_ids = [id for id in games_ids if flt.invert != (values[id] >= flt.match)]
+                case FilterMode.Status.value:
+                    values = sortindex.column("status_value")
+                    games_ids = [id for id in games_ids if flt.invert != (values[id] is flt.match)]
+                case FilterMode.Tag.value:
+                    # All tag filters are checked together below
+                    if flt.invert:
+                        tags_excluded |= 1 << flt.match.value
+                    else:
+                        tags_required |= 1 << flt.match.value
+                case FilterMode.Type.value:
+                    values = sortindex.column("type_value")
+                    games_ids = [id for id in games_ids if flt.invert != (values[id] is flt.match)]
+                case FilterMode.Updated.value:
+                    values = sortindex.column("updated")
+                    games_ids = [id for id in games_ids if flt.invert != values[id]]
+        if tags_required or tags_excluded:
+            values = sortindex.column("tag_bits")
+            games_ids = [id for id in games_ids if values[id] & tags_required == tags_required and not values[id] & tags_excluded]
+        if self.add_box_text:
+            if self.add_box_valid:
+                matches = [match.id for match in utils.extract_thread_matches(self.add_box_text)]
+                games_ids = list(filter(lambda id: id in matches, games_ids))
+            else:
+                matches = self.search_matches(self.add_box_text.lower())
+                ranks = self.current_search_ranks()  # Full text matches, also cover description and changelog
+                games_ids = [id for id in games_ids if id in matches or id in ranks]
+        return games_ids
 
     def handle_game_hitbox_events(self, game: Game, game_i: int = None):
         manual_sort = cols.manual_sort.enabled
-        not_filtering = len(self.filters) == 0 and not self.add_box_text
+        not_filtering = len(self.filters) == 0 and not self.add_box_text and not self.filter_terms
         if imgui.is_item_hovered(imgui.HOVERED_ALLOW_WHEN_BLOCKED_BY_ACTIVE_ITEM):
             # Hover = image on refresh button
             self.hovered_game = game
+            if game.id in self.current_search_ranks():
+                self.draw_search_snippet(game)
             if imgui.is_item_clicked():
                 self.game_hitbox_click = True
             if self.game_hitbox_click and not imgui.is_mouse_down():
@@ -2101,7 +2465,7 @@ class MainGUI():
                     lst[game_i], lst[payload] = lst[payload], lst[game_i]
                     async_thread.run(db.update_settings("manual_sort_list"))
                 imgui.end_drag_drop_target()
-        context_id = f"###{game.id}_context"
+        context_id = self.context_ids[game.id]
         if (imgui.is_topmost() or imgui.is_popup_open(context_id)) and imgui.begin_popup_context_item(context_id):
             # Right click = context menu
             self.draw_game_context_menu(game)
@@ -2225,7 +2589,7 @@ class MainGUI():
                 imgui.same_line()
                 imgui.set_cursor_pos_y(imgui.get_cursor_pos_y() - imgui.style.frame_padding.y)
                 imgui.push_alpha(0.25)
-                imgui.selectable(f"###{game.id}_hitbox", False, flags=imgui.SELECTABLE_SPAN_ALL_COLUMNS, height=frame_height)
+                imgui.selectable(self.hitbox_ids[game.id], False, flags=imgui.SELECTABLE_SPAN_ALL_COLUMNS, height=frame_height)
                 imgui.pop_alpha()
                 self.handle_game_hitbox_events(game, game_i)
 
@@ -2275,18 +2639,18 @@ class MainGUI():
                 imgui.style.frame_padding.x * 2 * buttons +      # Button padding * 2 sides * 4 buttons
                 imgui.style.item_inner_spacing.x * checkboxes +  # Checkbox to label spacing * 2 checkboxes
                 imgui.get_frame_height() * checkboxes +          # (Checkbox height = width) * 2 checkboxes
-                imgui.calc_text_size(                            # Text
+                utils.text_width(                                # Text
                     f"{icons.play} Play" * cols.play_button.enabled +
                     f"{icons.folder_open_outline} Folder" * cols.open_folder.enabled +
                     f"{icons.open_in_new} Thread" * cols.open_thread.enabled +
                     f"{icons.content_copy} Link" * cols.copy_link.enabled +
                     icons.flag_checkered * cols.played.enabled +
                     icons.cloud_download * cols.installed.enabled
-                ).x
+                )
             ),
             (
                 imgui.style.item_spacing.x * 2 +  # Between text * 2
-                imgui.calc_text_size("Last Updated:00/00/0000").x  # Text
+                utils.text_width("Last Updated:00/00/0000")  # Text
             ))
         )
 
@@ -2294,7 +2658,7 @@ class MainGUI():
         line_height = imgui.get_text_line_height()
         data_height = data_rows * line_height
         badge_wrap = side_indent + line_height
-        dev_wrap = imgui.calc_text_size("Developer:").x + imgui.style.item_spacing.x * 2
+        dev_wrap = utils.text_width("Developer:") + imgui.style.item_spacing.x * 2
 
         config = (side_indent, action_items, data_rows, bg_col, frame_height, data_height, badge_wrap, dev_wrap)
         return min_width, config
@@ -2308,10 +2672,10 @@ class MainGUI():
         # Image
         if game.image.missing:
             text = "Image missing!"
-            text_size = imgui.calc_text_size(text)
+            text_width = utils.text_width(text)
             showed_img = imgui.is_rect_visible(cell_width, img_height)
-            if text_size.x < cell_width:
-                imgui.set_cursor_pos((pos.x + (cell_width - text_size.x) / 2, pos.y + img_height / 2))
+            if text_width < cell_width:
+                imgui.set_cursor_pos((pos.x + (cell_width - text_width) / 2, pos.y + img_height / 2))
                 self.draw_hover_text(
                     text=text,
                     hover_text="This thread does not seem to have an image!" if game.image_url == "-" else "Run a full refresh to try downloading it again!"
@@ -2320,10 +2684,10 @@ class MainGUI():
             imgui.dummy(cell_width, img_height)
         elif game.image.invalid:
             text = "Invalid image!"
-            text_size = imgui.calc_text_size(text)
+            text_width = utils.text_width(text)
             showed_img = imgui.is_rect_visible(cell_width, img_height)
-            if text_size.x < cell_width:
-                imgui.set_cursor_pos((pos.x + (cell_width - text_size.x) / 2, pos.y + img_height / 2))
+            if text_width < cell_width:
+                imgui.set_cursor_pos((pos.x + (cell_width - text_width) / 2, pos.y + img_height / 2))
                 self.draw_hover_text(
                     text=text,
                     hover_text="This thread's image has an unrecognised format and couldn't be loaded!"
@@ -2459,7 +2823,7 @@ class MainGUI():
         cell_height = imgui.get_item_rect_size().y
         if imgui.is_rect_visible(cell_width, cell_height):
             # Skip if outside view
-            imgui.invisible_button(f"###{game.id}_hitbox", cell_width, cell_height)
+            imgui.invisible_button(self.hitbox_ids[game.id], cell_width, cell_height)
             self.handle_game_hitbox_events(game, game_i)
             pos = imgui.get_item_rect_min()
             pos2 = imgui.get_item_rect_max()
@@ -2583,7 +2947,7 @@ class MainGUI():
             async_thread.run(db.update_settings("display_mode"))
 
         if self.add_box_valid:
-            imgui.set_next_item_width(-(imgui.calc_text_size("Add!").x + 2 * imgui.style.frame_padding.x) - imgui.style.item_spacing.x)
+            imgui.set_next_item_width(-(utils.text_width("Add!") + 2 * imgui.style.frame_padding.x) - imgui.style.item_spacing.x)
         else:
             imgui.set_next_item_width(-imgui.FLOAT_MIN)
         any_active_old = imgui.is_any_item_active()
@@ -2611,7 +2975,12 @@ class MainGUI():
             changed = True
         def setter_extra(_=None):
             self.add_box_valid = len(utils.extract_thread_matches(self.add_box_text)) > 0
-            self.require_sort = True
+            if self.add_box_text and not self.add_box_valid:
+                # Filter again once typing pauses
+                self.search_due = time.perf_counter() + self.search_debounce
+            else:
+                self.search_due = 0.0
+                self.require_sort = True
         if changed:
             setter_extra()
         if imgui.begin_popup_context_item(f"###bottombar_context"):
@@ -2621,9 +2990,11 @@ class MainGUI():
             if imgui.selectable(f"{icons.information_outline} More info", False)[0]:
                 utils.push_popup(
                     msgbox.msgbox, "About the bottom bar",
-                    "This is the filter/add bar. By typing inside it you can search your game list.\n"
-                    "Pressing enter will search F95Zone for a matching thread and ask if you wish to\n"
-                    "add it to your list.\n"
+                    "This is the filter/add bar. By typing inside it you can search your game list,\n"
+                    "including descriptions and changelogs. Best matches are shown first, hover a\n"
+                    "game to see what matched.\n"
+                    "Pressing enter will search threads F95Checker has seen before for a match, or\n"
+                    "F95Zone if there are none, and ask if you wish to add it to your list.\n"
                     "\n"
                     "When you instead paste a link to a F95Zone thread, the 'Add!' button will show\n"
                     "up, allowing you to add that thread to your list. When a link is detected you\n"
@@ -2642,6 +3013,7 @@ class MainGUI():
             async def _search_and_add(query: str):
                 login = None
                 results = None
+                offline = True
                 def popup_content():
                     nonlocal login, results
                     if not results:
@@ -2666,6 +3038,16 @@ class MainGUI():
                             imgui.pop_disabled()
                         if clicked:
                             async_thread.run(callbacks.add_games(result))
+                    if offline:
+                        imgui.spacing()
+                        if imgui.selectable(f"{icons.magnify} Not listed? Search F95Zone", False, flags=imgui.SELECTABLE_DONT_CLOSE_POPUPS)[0]:
+                            async_thread.run(search_online())
+                async def search_online():
+                    nonlocal login, results, offline
+                    offline = False
+                    results = None
+                    if login := await api.assert_login():
+                        results = await api.quick_search(query)
                 utils.push_popup(
                     utils.popup, "Quick search",
                     popup_content,
@@ -2673,8 +3055,13 @@ class MainGUI():
                     closable=True,
                     outside=False
                 )
-                if login := await api.assert_login():
-                    results = await api.quick_search(query)
+                # Threads seen before can be found offline, only go online on a miss
+                results = [
+                    SearchResult(title=cached.title, url=f"{api.threads_page}{cached.id}", id=cached.id)
+                    for cached in await db.search_catalog(query)
+                ]
+                if not results:
+                    await search_online()
             async_thread.run(_search_and_add(self.add_box_text))
             self.add_box_text = ""
             self.add_box_valid = False
@@ -2731,7 +3118,8 @@ class MainGUI():
         height = self.scaled(100)
         if utils.is_refreshing():
             # Refresh progress bar
-            ratio = globals.refresh_progress / globals.refresh_total
+            progress = globals.refresh_progress
+            ratio = progress.ratio
             self.refresh_ratio_smooth += (ratio - self.refresh_ratio_smooth) * imgui.io.delta_time * 8
             imgui.progress_bar(self.refresh_ratio_smooth, (width, height))
             draw_list = imgui.get_window_draw_list()
@@ -2746,7 +3134,9 @@ class MainGUI():
                 text_x = screen_pos.x + (width - text_size.x) / 2
                 text_y = screen_pos.y - text_size.y - 3 * imgui.style.item_spacing.y
                 draw_list.add_text(text_x, text_y, col, text)
-            text = f"{ratio:.0%}"
+                # Hover = stage breakdown
+                imgui.set_tooltip("\n".join(progress.breakdown()) or "Starting...")
+            text = f"{ratio:.0%}, {progress.eta_text()}"
             text_size = imgui.calc_text_size(text)
             text_x = screen_pos.x + (width - text_size.x) / 2
             text_y = screen_pos.y - (height + text_size.y) / 2 - imgui.style.item_spacing.y
@@ -2771,6 +3161,9 @@ class MainGUI():
                     utils.start_refresh_task(api.check_notifs(login=True))
                 if imgui.selectable(f"{icons.reload_alert} Full Refresh", False)[0]:
                     utils.start_refresh_task(api.refresh(full=True))
+                if imgui.selectable(f"{icons.history} Refresh history", False)[0]:
+                    self.load_refresh_history()
+                    utils.push_popup(self.draw_refresh_history_popup)
                 imgui.separator()
                 if imgui.selectable(f"{icons.information_outline} More info", False)[0]:
                     utils.push_popup(
@@ -2798,11 +3191,67 @@ class MainGUI():
             imgui.text("")
             imgui.spacing()
 
-            if len(self.filters) > 0 or self.add_box_text:
+            if len(self.filters) > 0 or self.add_box_text or self.filter_terms:
                 draw_settings_label(f"Filtered games count: {len(self.sorted_games_ids)}")
                 imgui.text("")
                 imgui.spacing()
 
+            draw_settings_label(
+                "Filter query:",
+                "Filter with a line of text, for example: tag:harem -tag:ntr score>=4 status:completed label:\"To play\" updated:yes\n"
+                "\n"
+                "Available filters are tag, label, status, type, exe (unset, selected, invalid), score and rating (also with >, >=, <, <=), "
+                "played, updated and installed (yes, no or latest). Put - in front of a filter to invert it, quote values with spaces, "
+                "and type plain words to search names, developers, versions and notes.\n"
+                "\n"
+                "Save queries you use often as views with the button on the right."
+            )
+            imgui.set_cursor_pos_x(imgui.get_cursor_pos_x() + checkbox_offset)
+            if imgui.button(icons.bookmark_multiple_outline, width=frame_height):
+                imgui.open_popup("###filter_views")
+            if imgui.begin_popup("###filter_views"):
+                views = set.filter_views
+                if not views:
+                    imgui.text_disabled("No saved views yet")
+                for name, query in list(views.items()):
+                    if imgui.button(f"{icons.trash_can_outline}###filter_view_{name}_remove", width=frame_height):
+                        del views[name]
+                        async_thread.run(db.update_settings("filter_views"))
+                    imgui.same_line()
+                    if imgui.selectable(f"{name}###filter_view_{name}", query == self.filter_query)[0]:
+                        self.set_filter_query(query)
+                    if imgui.is_item_hovered():
+                        imgui.set_tooltip(query)
+                imgui.separator()
+                imgui.set_next_item_width(self.scaled(150))
+                _, self.filter_view_name = imgui.input_text_with_hint("###filter_view_name", "View name", self.filter_view_name)
+                imgui.same_line()
+                disabled = not self.filter_view_name or not self.filter_query
+                if disabled:
+                    imgui.push_disabled()
+                if imgui.button("Save view") and not disabled:
+                    views[self.filter_view_name] = self.filter_query
+                    async_thread.run(db.update_settings("filter_views"))
+                    self.filter_view_name = ""
+                if disabled:
+                    imgui.pop_disabled()
+                imgui.end_popup()
+            imgui.table_next_row()
+            imgui.table_next_column()
+            imgui.set_next_item_width(imgui.get_content_region_available_width() + right_width + imgui.style.cell_padding.x)
+            changed, value = imgui.input_text_with_hint("###filter_query", 'tag:harem score>=4 label:"To play"', self.filter_query)
+            setter_extra = lambda _=None: self.set_filter_query(self.filter_query)
+            if changed:
+                self.set_filter_query(value)
+            if imgui.begin_popup_context_item("###filter_query_context"):
+                utils.text_context(self, "filter_query", setter_extra)
+                imgui.end_popup()
+            imgui.table_next_column()
+            if self.filter_query_error:
+                imgui.table_next_row()
+                imgui.table_next_column()
+                imgui.text_colored(self.filter_query_error, *MsgBox.error.color)
+
             draw_settings_label("Add filter:")
             changed, value = imgui.combo("###add_filter", 0, FilterMode._member_names_)
             if changed and value > 0:
@@ -2862,6 +3311,7 @@ class MainGUI():
                                 flt.match = Label.instances[0]
                             draw_settings_label("Label value:")
                             if imgui.begin_combo(f"###filter_{flt.id}_value", flt.match.name):
+                                counts = sortindex.counts("labels")
                                 for label in Label.instances:
                                     selected = label is flt.match
                                     pos = imgui.get_cursor_pos()
@@ -2872,6 +3322,8 @@ class MainGUI():
                                         imgui.set_item_default_focus()
                                     imgui.set_cursor_pos(pos)
                                     self.draw_label_widget(label)
+                                    imgui.same_line()
+                                    imgui.text_disabled(str(counts[label.id]))
                                 imgui.end_combo()
                         else:
                             draw_settings_label("Make some labels first!")
@@ -2893,6 +3345,7 @@ class MainGUI():
                     case FilterMode.Status.value:
                         draw_settings_label("Status value:")
                         if imgui.begin_combo(f"###filter_{flt.id}_value", flt.match.name):
+                            counts = sortindex.counts("status_value")
                             for status in Status:
                                 selected = status is flt.match
                                 pos = imgui.get_cursor_pos()
@@ -2905,10 +3358,13 @@ class MainGUI():
                                 self.draw_status_widget(status)
                                 imgui.same_line()
                                 imgui.text(status.name)
+                                imgui.same_line()
+                                imgui.text_disabled(str(counts[status]))
                             imgui.end_combo()
                     case FilterMode.Tag.value:
                         draw_settings_label("Tag value:")
                         if imgui.begin_combo(f"###filter_{flt.id}_value", flt.match.name):
+                            counts = sortindex.counts("tags")
                             for tag in Tag:
                                 selected = tag is flt.match
                                 pos = imgui.get_cursor_pos()
@@ -2919,10 +3375,13 @@ class MainGUI():
                                     imgui.set_item_default_focus()
                                 imgui.set_cursor_pos(pos)
                                 self.draw_tag_widget(tag)
+                                imgui.same_line()
+                                imgui.text_disabled(str(counts[tag]))
                             imgui.end_combo()
                     case FilterMode.Type.value:
                         draw_settings_label("Type value:")
                         if imgui.begin_combo(f"###filter_{flt.id}_value", flt.match.name):
+                            counts = sortindex.counts("type_value")
                             category = None
                             for type in Type:
                                 if category is not type.category:
@@ -2937,6 +3396,8 @@ class MainGUI():
                                     imgui.set_item_default_focus()
                                 imgui.set_cursor_pos(pos)
                                 self.draw_type_widget(type)
+                                imgui.same_line()
+                                imgui.text_disabled(str(counts[type]))
                             imgui.end_combo()
 
             imgui.end_table()
@@ -3148,8 +3609,7 @@ class MainGUI():
             changed, set.timestamp_format = imgui.input_text("###timestamp_format", set.timestamp_format)
             def setter_extra(_=None):
                 async_thread.run(db.update_settings("timestamp_format"))
-                for timestamp in Timestamp.instances:
-                    timestamp.update()
+                Timestamp.reformat()
             if changed:
                 setter_extra()
             if imgui.begin_popup_context_item(f"###timestamp_format_context"):
@@ -3172,8 +3632,7 @@ class MainGUI():
             changed, set.datestamp_format = imgui.input_text("###datestamp_format", set.datestamp_format)
             def setter_extra(_=None):
                 async_thread.run(db.update_settings("datestamp_format"))
-                for datestamp in Datestamp.instances:
-                    datestamp.update()
+                Datestamp.reformat()
             if changed:
                 setter_extra()
             if imgui.begin_popup_context_item(f"###datestamp_format_context"):
@@ -3445,6 +3904,14 @@ class MainGUI():
             draw_settings_label("Refresh if completed:")
             draw_settings_checkbox("refresh_completed_games")
 
+            draw_settings_label(
+                "Probe latest updates:",
+                "Instead of checking every game thread one by one, F95Checker first goes through the F95Zone latest updates list "
+                "until it reaches the last successful refresh, and only checks the games that show up there. Media, mods, tools and "
+                "other threads not listed there are still checked one by one. Full refreshes always check everything."
+            )
+            draw_settings_checkbox("refresh_probe_feed")
+
             draw_settings_label(
                 "Workers:",
                 "Each game that needs to be checked requires that a connection to F95Zone happens. Each worker can handle 1 "
@@ -3627,7 +4094,9 @@ class TrayIcon(QtWidgets.QSystemTrayIcon):
         self.paused_icon = QtGui.QIcon(str(globals.self_path / 'resources/icons/paused.png'))
         self.refresh_icon = QtGui.QIcon(str(globals.self_path / 'resources/icons/refreshing.png'))
         self.msg_queue: list[TrayMsg] = []
+        self.tooltip = "F95Checker"
         super().__init__(self.idle_icon)
+        self.setToolTip(self.tooltip)
 
         self.watermark = QtGui.QAction(f"F95Checker {globals.version_name}")
         self.watermark.triggered.connect(lambda *_: self.main_gui.show())
@@ -3728,6 +4197,17 @@ class TrayIcon(QtWidgets.QSystemTrayIcon):
         self.update_menu()
         self.update_icon()
 
+    def update_tooltip(self):
+        # Only set when the text changes, it is checked every loop
+        if utils.is_refreshing():
+            progress = globals.refresh_progress
+            tooltip = f"F95Checker: refreshing {progress.ratio:.0%}, {progress.eta_text()}"
+        else:
+            tooltip = "F95Checker"
+        if tooltip != self.tooltip:
+            self.tooltip = tooltip
+            self.setToolTip(tooltip)
+
     def activated_filter(self, reason: QtWidgets.QSystemTrayIcon.ActivationReason):
         if reason in self.show_gui_events:
             self.main_gui.show()
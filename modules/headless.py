@@ -0,0 +1,96 @@
+import concurrent.futures
+import json
+import time
+import sys
+
+from modules.structs import (
+    RefreshProgress,
+)
+from modules import (
+    globals,
+    async_thread,
+    msgbox,
+    error,
+    api,
+)
+
+# Exit codes, the summary on stdout has the details
+exit_ok = 0
+exit_failed = 1
+exit_not_logged_in = 2
+exit_already_running = 3
+exit_usage = 4
+exit_interrupted = 130
+
+usage = "Usage: main.py --headless refresh [--full]"
+
+
+def print_summary(result: str, **extra):
+    print(json.dumps({"result": result, **extra}, indent=2), flush=True)
+
+
+def popups():
+    # Messages that would have shown in the interface, like threads that could not be checked
+    return [
+        {"title": popup.args[0], "message": popup.args[1]}
+        for popup in globals.popup_stack
+        if popup.func is msgbox.msgbox and len(popup.args) > 1
+    ]
+
+
+def updated_games():
+    updated = []
+    for id, old_game in globals.updated_games.items():
+        if not (game := globals.games.get(id)):
+            continue
+        updated.append({
+            "id": id,
+            "url": game.url,
+            "name": game.name,
+            "old_name": old_game.name,
+            "version": game.version,
+            "old_version": old_game.version,
+            "status": game.status.name,
+            "old_status": old_game.status.name,
+        })
+    return updated
+
+
+def refresh(full=False):
+    started = time.time()
+    globals.refresh_progress = RefreshProgress()
+    # Logging in needs the webview window, without a session from the interface this returns False
+    globals.refresh_task = async_thread.run(api.refresh(full=full, notifs=False))
+    result, code, extra = "ok", exit_ok, {}
+    try:
+        if not globals.refresh_task.result():
+            result, code = "not_logged_in", exit_not_logged_in
+    except KeyboardInterrupt:
+        # Let the refresh history record the cancelled run before the database closes
+        globals.refresh_task.cancel()
+        concurrent.futures.wait([globals.refresh_task], timeout=10)
+        result, code = "interrupted", exit_interrupted
+    except concurrent.futures.CancelledError:
+        result, code = "cancelled", exit_failed
+    except Exception as exc:
+        result, code = "failed", exit_failed
+        extra["error"] = exc.title if isinstance(exc, msgbox.Exc) else error.text(exc)
+    print_summary(
+        result,
+        **extra,
+        started=started,
+        ended=time.time(),
+        progress={stage: globals.refresh_progress.done[stage] for stage in ("games", "full", "image")},
+        updated=updated_games(),
+        messages=popups(),
+    )
+    return code
+
+
+def main(args: list[str]):
+    match args:
+        case ["refresh", *flags] if set(flags) <= {"--full"}:
+            return refresh(full="--full" in flags)
+        case _:
+            print(usage, file=sys.stderr)
+            return exit_usage
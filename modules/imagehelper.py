@@ -1,12 +1,13 @@
 # https://gist.github.com/Willy-JL/9c5116e5a11abd559c56f23aa1270de9
 from PIL import Image, ImageSequence, UnidentifiedImageError
-import OpenGL.GL as gl
 import functools
 import pathlib
 import imgui
 
 from modules import (  # added
     sync_thread,       # added
+    profiler,          # added
+    metrics,           # added
 )                      # added
 
 redraw = False  # added
@@ -16,6 +17,7 @@ _dummy_texture_id = None
 def dummy_texture_id():
     global _dummy_texture_id
     if _dummy_texture_id is None:
+        import OpenGL.GL as gl  # added, headless mode never loads OpenGL
         _dummy_texture_id = gl.glGenTextures(1)
         gl.glBindTexture(gl.GL_TEXTURE_2D, _dummy_texture_id)
         gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGBA, 0, 0, 0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, b"\x00\x00\x00\xff")
@@ -56,6 +58,7 @@ def _crop_to_ratio(width, height, ratio: int | float, fit=False):
 
 
 class ImageHelper:
+    __slots__ = ("width", "height", "frame", "glob", "elapsed", "loaded", "loading", "applied", "missing", "invalid", "prev_time", "animated", "frames", "durations", "texture_ids", "resolved_path", "path", "texture_bytes")  # changed
     def __init__(self, path: str | pathlib.Path, glob=""):
         self.width = 1
         self.height = 1
@@ -73,7 +76,8 @@ class ImageHelper:
         self.durations: list[float] = []
         self.texture_ids: list[int] = []
         self.resolved_path: pathlib.Path = None
-        self.path: pathlib.Path = pathlib.Path(path)
+        self.path: pathlib.Path = path if isinstance(path, pathlib.Path) else pathlib.Path(path)
+        self.texture_bytes = 0  # added
         self.resolve()
 
     def resolve(self):
@@ -90,6 +94,7 @@ class ImageHelper:
         self.missing = not self.resolved_path.is_file()
 
     def reload(self):
+        from modules import utils  # added, structs imports this module so utils can't be imported at the top
         self.loaded = False
         self.loading = True
         self.applied = False
@@ -106,6 +111,7 @@ class ImageHelper:
         if self.missing:
             self.loaded = True
             self.loading = False
+            utils.request_redraw()  # added
             return
 
         try:
@@ -114,6 +120,7 @@ class ImageHelper:
             self.invalid = True
             self.loaded = True
             self.loading = False
+            utils.request_redraw()  # added
             return
 
         self.width, self.height = image.size
@@ -128,11 +135,16 @@ class ImageHelper:
         image.close()
         self.loaded = True
         self.loading = False
+        utils.request_redraw()  # added, loaded on the sync thread, show it now instead of at the next idle timeout
 
     def apply(self):
+        import OpenGL.GL as gl  # added
         if self.texture_ids:
             gl.glDeleteTextures([self.texture_ids])
             self.texture_ids.clear()
+        metrics.texture_bytes.dec(self.texture_bytes)  # added
+        self.texture_bytes = self.width * self.height * 4 * len(self.frames)  # added
+        metrics.texture_bytes.inc(self.texture_bytes)  # added
         texture_gen = gl.glGenTextures(len(self.frames))
         self.texture_ids.extend([texture_gen] if len(self.frames) == 1 else texture_gen)
         for frame, texture_id in zip(self.frames, self.texture_ids):
@@ -163,7 +175,9 @@ class ImageHelper:
             return dummy_texture_id()
 
         if not self.applied:
+            profiler.start("textures")  # added
             self.apply()
+            profiler.stop("textures")  # added
 
         if self.animated:
             if self.prev_time != (new_time := imgui.get_time()):
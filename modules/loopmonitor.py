@@ -0,0 +1,113 @@
+import concurrent.futures
+import dataclasses
+import collections
+import threading
+import traceback
+import asyncio
+import pathlib
+import time
+import sys
+
+from modules import (
+    async_thread,
+)
+
+# Runs only while the monitor popup or profiler overlay is open, costs a heartbeat on the loop and a watchdog thread
+interval = 0.1  # Seconds between heartbeats
+slow_threshold = 0.25  # Seconds the loop can be blocked before the stall is logged
+lags: collections.deque[float] = collections.deque(maxlen=600)  # Heartbeat delays in seconds
+started = False
+last_tick: float = None
+_heartbeat_future: concurrent.futures.Future = None
+_stop_watchdog: threading.Event = None
+
+
+@dataclasses.dataclass(slots=True)
+class Stall:
+    timestamp: float
+    duration: float
+    stack: str
+
+
+stalls: collections.deque[Stall] = collections.deque(maxlen=30)
+_stall: Stall = None
+_stall_tick: float = None
+
+# Task origins by the module and name of their coroutine, first match wins
+task_origins = (
+    ("api.refresh.", "Refresh worker"),
+    ("image",        "Image download"),
+    ("db.",          "Database"),
+    ("api.",         "Network"),
+    ("rpc_thread.",  "RPC server"),
+)
+
+
+def start():
+    global started, last_tick, _heartbeat_future, _stop_watchdog
+    if started:
+        return
+    started = True
+    last_tick = time.perf_counter()
+    _heartbeat_future = async_thread.run(_heartbeat())
+    # New event each time so a watchdog still winding down can't miss its stop
+    _stop_watchdog = threading.Event()
+    threading.Thread(target=_watchdog, args=(_stop_watchdog,), daemon=True).start()
+
+
+def stop():
+    global started, _stall
+    if not started:
+        return
+    started = False
+    _heartbeat_future.cancel()
+    _stop_watchdog.set()
+    _stall = None
+
+
+async def _heartbeat():
+    global last_tick, _stall
+    last_tick = time.perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        lags.append(max(now - last_tick - interval, 0.0))
+        last_tick = now
+        if _stall is not None:
+            _stall.duration = lags[-1]
+            _stall = None
+
+
+def _watchdog(stop: threading.Event):
+    global _stall, _stall_tick
+    while not stop.wait(interval / 2):
+        tick = last_tick
+        blocked = time.perf_counter() - tick - interval
+        if blocked < slow_threshold or _stall_tick == tick:
+            if _stall is not None:
+                _stall.duration = max(_stall.duration, blocked)
+            continue
+        # Loop is stuck in a callback, record where it is
+        frame = sys._current_frames().get(async_thread.thread.ident)
+        stack = "".join(traceback.format_stack(frame)) if frame else ""
+        _stall_tick = tick
+        _stall = Stall(timestamp=time.time() - blocked, duration=blocked, stack=stack)
+        stalls.append(_stall)
+        print(f"Async loop blocked for over {blocked:.2f}s in:\n{stack}")
+
+
+def task_name(task: asyncio.Task):
+    coro = task.get_coro()
+    if code := getattr(coro, "cr_code", None):
+        return f"{pathlib.Path(code.co_filename).stem}.{coro.__qualname__}"
+    return repr(coro)
+
+
+def tasks():
+    # Live tasks on the async thread as {origin: {name: count}}
+    origins: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+    for task in asyncio.all_tasks(async_thread.loop):
+        name = task_name(task)
+        origin = next((origin for match, origin in task_origins if match in name), "Other")
+        origins[origin][name] += 1
+    return dict(sorted(origins.items()))
@@ -0,0 +1,125 @@
+import threading
+import bisect
+import typing
+
+# Counters, gauges and histograms served in Prometheus text format on the RPC server at /metrics
+prefix = "f95checker_"
+registry: list["Metric"] = []
+_lock = threading.Lock()  # Updated from the async and main threads, read from the RPC thread
+
+
+def escape(value: str):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(names: tuple[str], values: tuple, extra: str = ""):
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def format_number(value: float):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str] = ()):
+        self.name = prefix + name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, typing.Any] = {}
+        registry.append(self)
+
+    def key(self, labels: dict[str, str]):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name + format_labels(self.labels, key), value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(f"{name} {format_number(value)}" for name, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self.values[self.key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float], labels: tuple[str] = ()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with _lock:
+            if (stats := self.values.get(key)) is None:
+                # [count per bucket..., sum]
+                stats = self.values[key] = [0] * len(self.buckets) + [0.0]
+            stats[bisect.bisect_left(self.buckets, value)] += 1
+            stats[-1] += value
+
+    def samples(self):
+        for key, stats in self.values.items():
+            total = 0
+            for bucket, count in zip(self.buckets, stats):
+                total += count
+                yield self.name + "_bucket" + format_labels(self.labels, key, f'le="{format_number(bucket)}"'), total
+            yield self.name + "_sum" + format_labels(self.labels, key), stats[-1]
+            yield self.name + "_count" + format_labels(self.labels, key), total
+
+
+def render():
+    lines = []
+    with _lock:
+        for metric in registry:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+seconds_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+requests = Counter("requests_total", "HTTP requests made, by host and response status", ("host", "status"))
+received_bytes = Counter("received_bytes_total", "Response bytes read, by host", ("host",))
+sent_bytes = Counter("sent_bytes_total", "Request body bytes sent, by host", ("host",))
+parse_seconds = Histogram("parse_seconds", "Time taken to parse a thread page", seconds_buckets)
+db_write_seconds = Histogram("db_write_seconds", "Time taken by a game update query", seconds_buckets)
+db_commit_batch = Histogram("db_commit_batch_size", "Writes saved by each database commit", (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+refresh_seconds = Histogram("refresh_seconds", "Duration of library refreshes", (10, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+refresh_rate = Gauge("refresh_games_per_second", "Games checked per second in the last refresh")
+image_cache = Counter("image_cache_total", "Thread images kept from disk (hit) or downloaded (miss)", ("result",))
+texture_bytes = Gauge("texture_bytes", "Memory used by image textures uploaded to the GPU")
+games = Gauge("games", "Games in the library")
@@ -24,10 +24,10 @@ def msgbox(title: str, msg: str, level: MsgBox = None, buttons: dict[str, typing
         spacing = 2 * imgui.style.item_spacing.x
         if level:
             icon = getattr(icons, level.icon)
-            imgui.push_font(imgui.fonts.msgbox)
+            utils.push_font(imgui.fonts.msgbox)
             icon_size = imgui.calc_text_size(icon)
             imgui.text_colored(icon, *level.color)
-            imgui.pop_font()
+            utils.pop_font()
             imgui.same_line(spacing=spacing)
         imgui.begin_group()
         msg_size_y = imgui.calc_text_size(msg).y
@@ -40,7 +40,7 @@ def msgbox(title: str, msg: str, level: MsgBox = None, buttons: dict[str, typing
             imgui.text("")
             if imgui.tree_node("More info", flags=imgui.TREE_NODE_SPAN_AVAILABLE_WIDTH):
                 size = imgui.io.display_size
-                imgui.push_font(imgui.fonts.mono)
+                utils.push_font(imgui.fonts.mono)
                 more_size = imgui.calc_text_size(more)
                 _36 = globals.gui.scaled(26) + imgui.style.scrollbar_size
                 width = min(more_size.x + _36, size.x * 0.8 - icon_size.x)
@@ -49,7 +49,7 @@ def msgbox(title: str, msg: str, level: MsgBox = None, buttons: dict[str, typing
                 if imgui.begin_popup_context_item(f"###more_info_context"):
                     utils.text_context(type("_", (), dict(_=more))(), "_", editable=False)
                     imgui.end_popup()
-                imgui.pop_font()
+                utils.pop_font()
                 imgui.tree_pop()
         imgui.end_group()
         imgui.same_line(spacing=spacing)
@@ -1,7 +1,10 @@
 import multiprocessing
 import datetime as dt
 import functools
+import hashlib
+import lxml.etree
 import bs4
+import time
 import re
 import os
 
@@ -19,18 +22,50 @@ html = functools.partial(bs4.BeautifulSoup, features="lxml")
 _html = html
 
 # [^\S\r\n] = whitespace but not newlines
-sanitize_whitespace = lambda text: re.sub(r" *(?:\r\n?|\n)", r"\n", re.sub(r"(?:[^\S\r\n]|\u200b)", " ", text))
-fixed_newlines = lambda text: re.sub(r"(?: *\n){2}(?: *\n)+", r"\n\n", text).strip()
+sanitize_whitespace = lambda text: re.sub(r"(?<! ) *(?:\r\n?|\n)", r"\n", re.sub(r"(?:[^\S\r\n]|\u200b)", " ", text))
+fixed_newlines = lambda text: re.sub(r"(?<! )(?: *\n){2}(?: *\n)+", r"\n\n", text).strip()
 fixed_spaces = lambda text: re.sub(r" +", r" ", text).strip()
 clean_text = lambda text: fixed_spaces(fixed_newlines(sanitize_whitespace(text)))
 
+# Seconds of CPU time a parse can take before long attributes and downloads are cut short
+parse_budget = 10.0
+
+# Bump when parse_thread output changes for the same page, invalidates stored thread hashes
+version = 1
+
+
+def thread_hash(res: bytes):
+    # Only the sections parse_thread reads, the rest of the page changes between requests
+    sections = []
+    pos = 0
+    for start_tag, end_tag in ((b"<title", b"</title>"), (b"p-body-header", b"message-threadStarterPost"), (b"<article", b"</article>")):
+        if (start := res.find(start_tag, pos)) == -1 or (pos := res.find(end_tag, start)) == -1:
+            return ""
+        # Forms in the header carry a per-request xf token
+        sections.append(re.sub(rb"\d{10},[0-9a-f]{32}", rb"", res[start:pos]))
+    digest = hashlib.md5(b"\0".join(sections)).hexdigest()
+    return f"{version}:{digest}"
+
+
+def text_matches(strings: list[str], text: str):
+    # Only reads strings until the start of the sanitized text can't change anymore
+    raw = ""
+    for string in strings:
+        if not raw and string and string[0].lower()[:1] != text[:1]:
+            return False  # Names never start with whitespace, so the first character has to match
+        raw += string
+        val = sanitize_whitespace(re.sub(r"(?<![\s\u200b])[\s\u200b]+$", r"", raw).lower())
+        if len(val) > len(text):
+            return val.startswith(text + ":")
+    val = sanitize_whitespace(raw.lower())
+    return val == text or val.startswith(text + ":")
+
 
 def is_text(text: str):
     def _is_text(elem: bs4.element.Tag):
         if not hasattr(elem, "text"):
             return False
-        val = sanitize_whitespace(elem.text.lower())
-        return val == text or val.startswith(text + ":")
+        return text_matches(elem.strings, text)
     return _is_text
 
 
@@ -40,6 +75,30 @@ def is_class(name: str):
     return _is_class
 
 
+def cut_long_attr(value: str):
+    # Ends the value at 7 blank lines, at the first of 2 more "Label:" lines or at a download header, in linear time
+    ends = []
+    if match := re.search(r"\n(?: *\n){6}", value):
+        end = match.start()
+        while end > 0 and value[end - 1] == " ":
+            end -= 1
+        ends.append(end)
+    if match := re.search(r"\n *(?:DOWNLOAD|Download) *(?:\n|:)", value):
+        ends.append(match.start())
+    labels = [(match.start(), match.end() - 1) for match in re.finditer(r"(?<=\n)[A-Z a-z]+:", value)]
+    if labels and labels[-1][1] + 1 == len(value):
+        labels_after = labels[:-1]  # Last label needs something after it
+    else:
+        labels_after = labels
+    if labels_after:
+        last_label = labels_after[-1][0] - 1
+        for start, colon in labels:
+            if last_label >= colon + 2:
+                ends.append(start - 1)
+                break
+    return value[:min(ends)] if ends else value
+
+
 class ParserException(Exception):
     def __init__(self, *args, **kwargs):
         super().__init__()
@@ -47,42 +106,301 @@ class ParserException(Exception):
         self.kwargs = kwargs
 
 
+class Bs4Engine:
+    def __init__(self, res: bytes):
+        self.root = _html(res)
+
+    def prepare(self, post: bs4.element.Tag):
+        for spoiler in post.find_all(is_class("bbCodeSpoiler-button")):
+            try:
+                next(spoiler.span.span.children).replace_with(self.root.new_string(""))
+            except Exception:
+                pass
+        for div in post.find_all("div"):
+            div.insert_after(self.root.new_string("\n"))
+
+    def free(self):
+        self.root.decompose()
+        self.root = None
+
+    def find(self, elem: bs4.element.Tag, tag: str, **attrs):
+        return elem.find(tag, attrs=attrs)
+
+    def find_class(self, elem: bs4.element.Tag, name: str):
+        return elem.find(is_class(name))
+
+    def find_text(self, elem: bs4.element.Tag, text: str):
+        return elem.find(is_text(text))
+
+    def find_image(self, elem: bs4.element.Tag):
+        return elem.find(lambda elem: elem.name == "img" and "data-src" in elem.attrs)
+
+    def span_strings(self, elem: bs4.element.Tag):
+        return {str(span.string) for span in elem.find_all("span") if span.string is not None}
+
+    def child_tags(self, elem: bs4.element.Tag):
+        return [child for child in elem.children if hasattr(child, "get")]
+
+    def first_child(self, elem: bs4.element.PageElement):
+        return next(iter(getattr(elem, "children", [])), None)
+
+    def next_sibling(self, elem: bs4.element.PageElement):
+        return elem.next_sibling or None
+
+    def parent(self, elem: bs4.element.PageElement):
+        return elem.parent
+
+    def name(self, elem: bs4.element.PageElement):
+        return elem.name
+
+    def is_class(self, elem: bs4.element.PageElement, name: str):
+        return is_class(name)(elem)
+
+    def get(self, elem: bs4.element.PageElement, key: str, default=None):
+        return elem.get(key, default) if hasattr(elem, "get") else default
+
+    def text(self, elem: bs4.element.PageElement):
+        return elem.text
+
+
+class LxmlText:
+    # Text nodes like bs4 has them, lxml keeps text in .text and .tail of elements
+    __slots__ = ("owner", "kind", "value")
+
+    def __init__(self, owner: lxml.etree._Element, kind: str, value: str):
+        self.owner = owner
+        self.kind = kind
+        self.value = value
+
+    def __bool__(self):
+        return bool(self.value)
+
+
+class LxmlEngine:
+    # bs4 leaves the contents of these out of .text
+    containers = ("script", "style", "template", "rt", "rp")
+
+    def __init__(self, res: bytes):
+        # Threads are always utf-8, anything else is left to bs4's encoding detection
+        self.root = lxml.etree.HTML(res.decode("utf-8"))
+        self.emptied = set()  # First child was replaced with an empty string
+        self.newlined = set()  # Has a newline string inserted after it
+        self.tainted = set()  # Has containers inside, text must skip them
+        self.contained = set()  # Inside a container, has no text
+        for container in self.root.iter(*self.containers):
+            self.contained.update(container.iterdescendants())
+            elem = container.getparent()
+            while elem is not None and elem not in self.tainted:
+                self.tainted.add(elem)
+                elem = elem.getparent()
+
+    def prepare(self, post: lxml.etree._Element):
+        # bs4 turns whitespace only strings into a single newline or space, unless in preformatted text
+        preserved = set()
+        for elem in post.iter("pre", "textarea"):
+            preserved.update(elem.iter())
+        for elem in post.iter():
+            if elem.text and elem not in preserved and not elem.text.strip(" \n\t\f\r"):
+                elem.text = "\n" if "\n" in elem.text else " "
+            if elem.tail and elem is not post and elem.getparent() not in preserved and not elem.tail.strip(" \n\t\f\r"):
+                elem.tail = "\n" if "\n" in elem.tail else " "
+        for spoiler in self.find_classes(post, "bbCodeSpoiler-button"):
+            try:
+                span = next(next(spoiler.iterdescendants("span")).iterdescendants("span"))
+                if span in self.emptied:
+                    continue
+                if span.text:
+                    span.text = None
+                else:
+                    child = span[0]
+                    tail = child.tail
+                    span.remove(child)
+                    span.text = tail
+                self.emptied.add(span)
+            except Exception:
+                pass
+        for div in post.iterdescendants("div"):
+            div.tail = "\n" + (div.tail or "")
+            self.newlined.add(div)
+
+    def free(self):
+        self.emptied.clear()
+        self.newlined.clear()
+        self.tainted.clear()
+        self.contained.clear()
+        self.root = None
+
+    @staticmethod
+    @functools.cache
+    def class_xpath(name: str):
+        return lxml.etree.XPath(f"descendant::*[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]")
+
+    def find_classes(self, elem: lxml.etree._Element, name: str):
+        return self.class_xpath(name)(elem)
+
+    def find(self, elem: lxml.etree._Element, tag: str, **attrs):
+        for child in elem.iterdescendants(tag):
+            if all(child.get(key) == value for key, value in attrs.items()):
+                return child
+        return None
+
+    def find_class(self, elem: lxml.etree._Element, name: str):
+        return next(iter(self.find_classes(elem, name)), None)
+
+    def find_text(self, elem: lxml.etree._Element, text: str):
+        for child in elem.iterdescendants():
+            if isinstance(child.tag, str) and child not in self.contained and text_matches(self.strings(child), text):
+                return child
+        return None
+
+    def find_image(self, elem: lxml.etree._Element):
+        for child in elem.iterdescendants("img"):
+            if child.get("data-src") is not None:
+                return child
+        return None
+
+    def span_strings(self, elem: lxml.etree._Element):
+        strings = set()
+        for span in elem.iterdescendants("span"):
+            # Same as bs4's .string, the only string inside, through single children
+            while isinstance(span.tag, str) and len(span) == 1 and not span.text and not span[0].tail:
+                span = span[0]
+            if len(span) == 0 and span.text:
+                strings.add(span.text)
+        return strings
+
+    def child_tags(self, elem: lxml.etree._Element):
+        return [child for child in elem if isinstance(child.tag, str)]
+
+    def tail(self, elem: lxml.etree._Element):
+        tail = elem.tail
+        if tail and elem in self.newlined:
+            tail = tail[1:]
+        return LxmlText(elem, "tail", tail) if tail else None
+
+    def first_child(self, elem: lxml.etree._Element | LxmlText):
+        if isinstance(elem, LxmlText) or not isinstance(elem.tag, str):
+            return None
+        if elem in self.emptied:
+            return LxmlText(elem, "empty", "")
+        if elem.text:
+            return LxmlText(elem, "text", elem.text)
+        if len(elem):
+            return elem[0]
+        return None
+
+    def next_sibling(self, elem: lxml.etree._Element | LxmlText):
+        if isinstance(elem, LxmlText):
+            owner = elem.owner
+            if elem.kind == "empty" and owner.text:
+                sibling = LxmlText(owner, "text", owner.text)
+            elif elem.kind in ("empty", "text"):
+                sibling = owner[0] if len(owner) else None
+            elif elem.kind == "newline":
+                sibling = self.tail(owner) or owner.getnext()
+            else:
+                sibling = owner.getnext()
+        elif elem in self.newlined:
+            sibling = LxmlText(elem, "newline", "\n")
+        else:
+            sibling = self.tail(elem) or elem.getnext()
+        return sibling
+
+    def parent(self, elem: lxml.etree._Element | LxmlText):
+        if isinstance(elem, LxmlText):
+            return elem.owner if elem.kind in ("empty", "text") else elem.owner.getparent()
+        return elem.getparent()
+
+    def name(self, elem: lxml.etree._Element | LxmlText):
+        if elem is None or isinstance(elem, LxmlText) or not isinstance(elem.tag, str):
+            return None
+        return elem.tag
+
+    def is_class(self, elem: lxml.etree._Element | LxmlText, name: str):
+        return self.name(elem) is not None and name in (elem.get("class") or "").split()
+
+    def get(self, elem: lxml.etree._Element | LxmlText, key: str, default=None):
+        return elem.get(key, default) if self.name(elem) is not None else default
+
+    def strings(self, elem: lxml.etree._Element):
+        if elem not in self.tainted:
+            yield from elem.itertext()
+            return
+        if elem.text:
+            yield elem.text
+        for child in elem:
+            if isinstance(child.tag, str) and child.tag not in self.containers:
+                yield from self.strings(child)
+            if child.tail:
+                yield child.tail
+
+    def text(self, elem: lxml.etree._Element | LxmlText):
+        if isinstance(elem, LxmlText):
+            if elem.owner in self.contained or (elem.kind == "text" and elem.owner.tag in self.containers):
+                return ""
+            return elem.value
+        if not isinstance(elem.tag, str) or elem in self.contained:
+            return ""
+        return "".join(self.strings(elem))
+
+
+engines = [LxmlEngine, Bs4Engine]
+
+
 def thread(game_id: int, res: bytes, pipe: multiprocessing.Queue = None):
+    for engine in engines:
+        # Later engines are slower but have been around longer, only used if the faster ones fail
+        ret = parse_thread(game_id, res, engine)
+        if not isinstance(ret, ParserException):
+            break
+    if pipe:
+        pipe.put_nowait(ret)
+    else:
+        return ret
+
+
+def parse_thread(game_id: int, res: bytes, engine: type[LxmlEngine | Bs4Engine]):
+    deadline = time.thread_time() + parse_budget
+    cut_short = False  # Returned last, the caller should not trust these fields to be complete
+    def over_budget():
+        # Pathological posts keep what was parsed so far instead of hanging the refresh
+        nonlocal cut_short
+        if time.thread_time() > deadline:
+            cut_short = True
+        return cut_short
     def game_has_prefixes(*names: list[str]):
         for name in names:
-            if head.find("span", text=f"[{name}]"):
+            if f"[{name}]" in prefixes:
                 return True
         return False
     def get_game_attr(*names: list[str]):
         for name in names:
-            if match := re.search(r"^ *" + name + r" *(?: *\n? *:|: *\n? *) *(.*)", plain, flags=re.RegexFlag.MULTILINE | re.RegexFlag.IGNORECASE):
+            if match := re.search(r"^ *" + name + r" *(?:\n *)?: *(.*)", plain, flags=re.RegexFlag.MULTILINE | re.RegexFlag.IGNORECASE):
                 return fixed_spaces(match.group(1))
         return ""
     def get_long_game_attr(*names: list[str]):
         value_regex = ""
         for name in names:
-            if match := re.search(r"^ *" + name + r" *:? *\n? *:? *((?:.|\n)*)", plain, flags=re.RegexFlag.MULTILINE | re.RegexFlag.IGNORECASE):
-                value_regex = re.sub(
-                    r"(?:(?: *\n){7}|(?:\n *[A-Z a-z]+:(?:.|\n)+?){2}|\n *(?:DOWNLOAD|Download) *(?:\n|:))(?:.|\n)*", r"", match.group(1),
-                    flags=re.RegexFlag.MULTILINE
-                )
-                value_regex = fixed_newlines(value_regex)
+            if match := re.search(r"^ *" + name + r" *:? *\n? *:? *", plain, flags=re.RegexFlag.MULTILINE | re.RegexFlag.IGNORECASE):
+                value_regex = fixed_newlines(cut_long_attr(plain[match.end():]))
         value_html = ""
         for name in names:
-            if elem := post.find(is_text(name)):
+            if (elem := tree.find_text(post, name)) is not None:
                 break
-        if elem:
-            while children := list(getattr(elem, "children", [])):
-                elem = children[0]
-            while not (is_class("bbWrapper")(elem) or elem.parent.name == "article"):
-                if elem.next_sibling:
-                    elem = elem.next_sibling
+        if elem is not None:
+            while (child := tree.first_child(elem)) is not None:
+                elem = child
+            while not (tree.is_class(elem, "bbWrapper") or tree.name(tree.parent(elem)) == "article"):
+                if over_budget():
+                    break
+                if (sibling := tree.next_sibling(elem)) is not None:
+                    elem = sibling
                 else:
-                    elem = elem.parent
+                    elem = tree.parent(elem)
                     continue
-                if elem.name == "b" or (hasattr(elem, "get") and "center" in elem.get("style", "")):
+                if tree.name(elem) == "b" or "center" in tree.get(elem, "style", ""):
                     break
-                text = sanitize_whitespace(elem.text)
+                text = sanitize_whitespace(tree.text(elem))
                 if text.strip() in (":", ""):
                     continue
                 value_html += text
@@ -93,12 +411,12 @@ def thread(game_id: int, res: bytes, pipe: multiprocessing.Queue = None):
             return value_html
     def get_game_downloads(*names: list[str]):
         for name in names:
-            if elem := post.find(is_text(name)):
+            if (elem := tree.find_text(post, name)) is not None:
                 break
-        if not elem:
+        if elem is None:
             return []
-        while not is_class("link")(elem) and (children := list(getattr(elem, "children", []))):
-            elem = children[0]
+        while not tree.is_class(elem, "link") and (child := tree.first_child(elem)) is not None:
+            elem = child
         downloads = []
         download_name = ""
         download_mirrors = []
@@ -114,20 +432,22 @@ def thread(game_id: int, res: bytes, pipe: multiprocessing.Queue = None):
                 downloads.append((download_name, download_mirrors))
                 download_name = ""
                 download_mirrors = []
-        while not (is_class("bbWrapper")(elem) or elem.parent.name == "article"):
-            if elem.next_sibling:
-                elem = elem.next_sibling
+        while not (tree.is_class(elem, "bbWrapper") or tree.name(tree.parent(elem)) == "article"):
+            if over_budget():
+                break
+            if (sibling := tree.next_sibling(elem)) is not None:
+                elem = sibling
             else:
-                elem = elem.parent
+                elem = tree.parent(elem)
                 continue
-            while not (is_link := is_class("link")(elem)) and (children := list(getattr(elem, "children", []))):
-                elem = children[0]
+            while not (is_link := tree.is_class(elem, "link")) and (child := tree.first_child(elem)) is not None:
+                elem = child
             if is_link:
-                download_mirrors.append((clean_text(elem.text), elem.get("href")))
+                download_mirrors.append((clean_text(tree.text(elem)), tree.get(elem, "href")))
             else:
-                if elem.name in ("img", "video"):
+                if tree.name(elem) in ("img", "video"):
                     break
-                text = sanitize_whitespace(elem.text)
+                text = sanitize_whitespace(tree.text(elem))
                 if not text.strip("-,*:/ "):
                     continue
                 if download_mirrors:
@@ -136,15 +456,16 @@ def thread(game_id: int, res: bytes, pipe: multiprocessing.Queue = None):
         add_downloads()
         return downloads
 
+    tree = None
     try:
 
-        html = _html(res)
-        head = html.find(is_class("p-body-header"))
-        post = html.find(is_class("message-threadStarterPost"))
+        tree = engine(res)
+        head = tree.find_class(tree.root, "p-body-header")
+        post = tree.find_class(tree.root, "message-threadStarterPost")
         if head is None or post is None:
             from main import self_path
             (self_path / f"{game_id}_broken.html").write_bytes(res)
-            e = ParserException(
+            return ParserException(
                 "Thread parsing error",
                 "Failed to parse necessary sections in thread response, the html file has\n"
                 f"been saved to:\n{self_path}{os.sep}{game_id}_broken.html\n"
@@ -152,25 +473,16 @@ def thread(game_id: int, res: bytes, pipe: multiprocessing.Queue = None):
                 "Please submit a bug report on F95Zone or GitHub including this file.",
                 MsgBox.error
             )
-            if pipe:
-                pipe.put_nowait(e)
-                return
-            else:
-                return e
-        for spoiler in post.find_all(is_class("bbCodeSpoiler-button")):
-            try:
-                next(spoiler.span.span.children).replace_with(html.new_string(""))
-            except Exception:
-                pass
-        for div in post.find_all("div"):
-            div.insert_after(html.new_string("\n"))
-        plain = sanitize_whitespace(post.find("article").get_text(separator="", strip=False))
+        tree.prepare(post)
+        plain = sanitize_whitespace(tree.text(tree.find(post, "article")))
+        title = tree.text(tree.find(tree.root, "title"))
+        prefixes = tree.span_strings(head)
 
-        name = fixed_spaces(sanitize_whitespace(re.search(r"(?:\[.+?\] - )*([^\[\|]+)", html.title.text).group(1)))
+        name = fixed_spaces(sanitize_whitespace(re.search(r"(?:\[.+?\] - )*([^\[\|]+)", title).group(1)))
 
         version = get_game_attr("version")
         if not version:
-            if match := re.search(r"(?:\[.+?\] - )*.+?\[(.+?)\]", html.title.text):
+            if match := re.search(r"(?:\[.+?\] - )*.+?\[(.+?)\]", title):
                 version = fixed_spaces(sanitize_whitespace(match.group(1)))
         if not version:
             version = "N/A"
@@ -283,57 +595,51 @@ def thread(game_id: int, res: bytes, pipe: multiprocessing.Queue = None):
             pass
         if not last_updated:
             try:
-                if elem := post.find(is_class("message-lastEdit")):
-                    last_updated = int(elem.find("time").get("data-time"))
+                if (elem := tree.find_class(post, "message-lastEdit")) is not None:
+                    last_updated = int(tree.get(tree.find(elem, "time"), "data-time"))
                 else:
-                    last_updated = int(post.find(is_class("message-attribution-main")).find("time").get("data-time"))
+                    last_updated = int(tree.get(tree.find(tree.find_class(post, "message-attribution-main"), "time"), "data-time"))
             except Exception:
                 pass
         last_updated = int(dt.datetime.fromordinal(dt.datetime.fromtimestamp(last_updated).date().toordinal()).timestamp())
 
         score = 0.0
-        if elem := head.find("select", attrs={"name": "rating"}):
-            score = float(elem.get("data-initial-rating"))
-        elif elem := head.find(is_class("bratr-rating")):
-            score = float(re.search(r"(\d(?:\.\d\d?)?)", elem.get("title")).group(1))
+        if (elem := tree.find(head, "select", name="rating")) is not None:
+            score = float(tree.get(elem, "data-initial-rating"))
+        elif (elem := tree.find_class(head, "bratr-rating")) is not None:
+            score = float(re.search(r"(\d(?:\.\d\d?)?)", tree.get(elem, "title")).group(1))
 
         description = get_long_game_attr("overview", "story")
 
         changelog = get_long_game_attr("changelog", "change-log", "change log")
 
         tags = []
-        if (taglist := head.find(is_class("js-tagList"))) is not None:
-            for child in taglist.children:
-                if hasattr(child, "get") and "/tags/" in (tag := child.get("href", "")):
+        if (taglist := tree.find_class(head, "js-tagList")) is not None:
+            for child in tree.child_tags(taglist):
+                if "/tags/" in (tag := tree.get(child, "href", "")):
                     tag = tag.replace("/tags/", "").strip("/")
                     tags.append(Tag[tag])
 
-        elem = post.find(is_class("bbWrapper")).find(lambda elem: elem.name == "img" and "data-src" in elem.attrs)
-        if elem:
-            image_url = elem.get("data-src")
+        elem = tree.find_image(tree.find_class(post, "bbWrapper"))
+        if elem is not None:
+            image_url = tree.get(elem, "data-src")
         else:
             image_url = "-"
 
         downloads = get_game_downloads("downloads", "download")
 
     except Exception:
-        e = ParserException(
+        return ParserException(
             "Thread parsing error",
             f"Something went wrong while parsing thread {game_id}:\n{error.text()}",
             MsgBox.error,
             more=error.traceback()
         )
-        if pipe:
-            pipe.put_nowait(e)
-            return
-        else:
-            return e
+    finally:
+        if tree is not None and tree.root is not None:
+            tree.free()
 
-    ret = (name, version, developer, type, status, last_updated, score, description, changelog, tags, image_url, downloads)
-    if pipe:
-        pipe.put_nowait(ret)
-    else:
-        return ret
+    return (name, version, developer, type, status, last_updated, score, description, changelog, tags, image_url, downloads, cut_short)
 
 
 developer_strip_chars = "-–|｜/':,([{ "
@@ -0,0 +1,98 @@
+import collections
+import json
+import time
+
+# Opt-in timings of the main loop stages, nothing is recorded while disabled
+enabled = False
+history = 600  # Frames kept for percentiles
+spike_ms = 50.0  # Frames slower than this go in the spike log
+trace_max = 200_000  # Events kept for trace export
+
+frame_times: collections.deque[float] = collections.deque(maxlen=history)
+stage_times: dict[str, collections.deque[float]] = {}  # Milliseconds each stage took per frame
+spikes: collections.deque[tuple[float, float, str]] = collections.deque(maxlen=50)  # (time, frame ms, slowest stage)
+trace: collections.deque[dict] = collections.deque(maxlen=trace_max)  # Chrome trace events
+
+_origin = time.perf_counter_ns()
+_frame_start: int = None
+_frame: dict[str, float] = {}
+_starts: dict[str, int] = {}
+
+
+def toggle():
+    global enabled, _frame_start
+    enabled = not enabled
+    _frame_start = None
+    _frame.clear()
+    _starts.clear()
+
+
+def clear():
+    frame_times.clear()
+    stage_times.clear()
+    spikes.clear()
+    trace.clear()
+
+
+def _trace_event(name: str, start: int, end: int):
+    trace.append({
+        "name": name,
+        "ph": "X",
+        "ts": (start - _origin) / 1000,
+        "dur": (end - start) / 1000,
+        "pid": 1,
+        "tid": 1,
+    })
+
+
+def start(name: str):
+    if enabled:
+        _starts[name] = time.perf_counter_ns()
+
+
+def stop(name: str):
+    if enabled and (started := _starts.pop(name, None)) is not None:
+        now = time.perf_counter_ns()
+        # Stages that run more than once per frame add up, like texture uploads
+        _frame[name] = _frame.get(name, 0.0) + (now - started) / 1_000_000
+        _trace_event(name, started, now)
+
+
+def begin_frame():
+    global _frame_start
+    if enabled:
+        _frame_start = time.perf_counter_ns()
+
+
+def end_frame():
+    global _frame_start
+    if not enabled or _frame_start is None:
+        return
+    now = time.perf_counter_ns()
+    total = (now - _frame_start) / 1_000_000
+    _trace_event("frame", _frame_start, now)
+    _frame_start = None
+    frame_times.append(total)
+    for name, ms in _frame.items():
+        if (times := stage_times.get(name)) is None:
+            times = stage_times[name] = collections.deque(maxlen=history)
+        times.append(ms)
+    if total >= spike_ms:
+        slowest = max(_frame, key=_frame.get, default="")
+        spikes.append((time.time(), total, slowest))
+    _frame.clear()
+
+
+def percentiles(times: collections.deque[float]):
+    # (p50, p95, p99)
+    if not times:
+        return (0.0, 0.0, 0.0)
+    ordered = sorted(times)
+    last = len(ordered) - 1
+    return tuple(ordered[min(last, int(p * len(ordered)))] for p in (0.50, 0.95, 0.99))
+
+
+def export_trace(path):
+    # Opens in chrome://tracing or ui.perfetto.dev
+    with open(path, "w") as f:
+        json.dump({"traceEvents": list(trace), "displayTimeUnit": "ms"}, f)
@@ -12,6 +12,7 @@ from modules import (
     globals,
     async_thread,
     callbacks,
+    metrics,
     msgbox,
     utils,
     error,
@@ -41,10 +42,10 @@ def start():
             if not globals.debug:
                 log_message = lambda *_, **__: None
 
-            def send_resp(self, code: int):
+            def send_resp(self, code: int, content_type="application/json"):
                 self.send_response(code)
                 self.send_header("Access-Control-Allow-Origin", "*")
-                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Type", content_type)
                 self.end_headers()
 
             def send_json(self, code: int, data: list | dict):
@@ -57,6 +58,11 @@ def start():
                         case "/games":
                             self.send_json(200, list(globals.games))
                             return
+                        case "/metrics":
+                            metrics.games.set(len(globals.games))
+                            self.send_resp(200, "text/plain; version=0.0.4; charset=utf-8")
+                            self.wfile.write(metrics.render().encode())
+                            return
                         case _:
                             self.send_resp(404)
                             return
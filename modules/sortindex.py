@@ -0,0 +1,140 @@
+import collections
+import bisect
+import typing
+
+from modules.structs import (
+    ExeState,
+    Status,
+    Game,
+    Tag,
+)
+from modules import (
+    globals,
+    utils,
+)
+
+def tag_bits(tags: list[Tag]):
+    bits = 0
+    for tag in tags:
+        bits |= 1 << tag.value
+    return bits
+
+
+# Sort and filter values for each game id, built on first use and updated for changed games only
+keys: dict[str, typing.Callable[[Game], typing.Any]] = {
+    # Sorting
+    "name":             lambda game: game.name.lower(),
+    "type":             lambda game: game.type.name,
+    "developer":        lambda game: game.developer.lower(),
+    "last_updated":     lambda game: - game.last_updated.value,
+    "last_played":      lambda game: - game.last_played.value,
+    "added_on":         lambda game: - game.added_on.value,
+    "not_played":       lambda game: not game.played,
+    "installed":        lambda game: 2 if not game.installed else 1 if game.installed == game.version else 0,
+    "rating":           lambda game: - game.rating,
+    "notes":            lambda game: game.notes.lower() or "z",
+    "status":           lambda game: game.status.value,
+    "score":            lambda game: - game.score,
+    "checked":          lambda game: game.status is not Status.Unchecked,
+    # Filtering
+    "exe_state":        lambda game: ExeState.Unset if not game.executables else ExeState.Selected if game.executables_valid else ExeState.Invalid,
+    "installed_any":    lambda game: game.installed != "",
+    "installed_latest": lambda game: game.installed == game.version,
+    "labels":           lambda game: tuple(label.id for label in game.labels),
+    "played":           lambda game: game.played is True,
+    "rating_value":     lambda game: game.rating,
+    "score_value":      lambda game: game.score,
+    "search_text":      lambda game: "\n".join((game.version, game.developer, game.name, game.notes)).lower(),
+    "status_value":     lambda game: game.status,
+    "tags":             lambda game: tuple(game.tags),
+    "tag_bits":         lambda game: tag_bits(game.tags),
+    "type_value":       lambda game: game.type,
+    "updated":          lambda game: game.updated is True,
+}
+
+
+class Column(dict):
+    def __init__(self, key: typing.Callable[[Game], typing.Any]):
+        super().__init__()
+        self.key = key
+        self.counts: collections.Counter = None  # Games per value, only kept once asked for
+
+    def __missing__(self, id: int):
+        # Game added since the column was last updated
+        self.refresh(id, globals.games[id])
+        return self[id]
+
+    def refresh(self, id: int, game: Game | None):
+        if self.counts is not None and id in self:
+            self.count(self[id], -1)
+        if game is None:
+            self.pop(id, None)
+            return
+        value = self[id] = self.key(game)
+        if self.counts is not None:
+            self.count(value, 1)
+
+    def count(self, value: typing.Any, change: int):
+        # Tuple values count once for each item, like tags and labels
+        for item in value if isinstance(value, tuple) else (value,):
+            self.counts[item] += change
+
+
+class Reversed:
+    # Compares the other way around, for reversed sorts inside a combined key
+    __slots__ = ("value",)
+    def __init__(self, value: typing.Any):
+        self.value = value
+
+    def __eq__(self, other: "Reversed"):
+        return self.value == other.value
+
+    def __lt__(self, other: "Reversed"):
+        return other.value < self.value
+
+
+columns: dict[str, Column] = {}
+dirty: set[int] = set()  # Columns to update
+changed: set[int] = set()  # Games to reposition in the sorted list
+search_changed: set[int] = set()  # Games to recheck against the last search results
+
+
+def invalidate(id: int):
+    dirty.add(id)
+    changed.add(id)
+    search_changed.add(id)
+    utils.request_redraw()
+
+
+def column(name: str):
+    # Changes can come from the async thread, set.pop() keeps this safe while they arrive
+    while dirty:
+        id = dirty.pop()
+        game = globals.games.get(id)
+        for values in columns.values():
+            values.refresh(id, game)
+    if (values := columns.get(name)) is None:
+        key = keys[name]
+        values = columns[name] = Column(key)
+        values.update((id, key(game)) for id, game in globals.games.items())
+    return values
+
+
+def reposition(ids: list[int], changed: set[int], key: typing.Callable[[int], typing.Any], keep: typing.Callable[[int], bool]):
+    # All changed games come out before any go back in, the binary search needs the rest in order
+    moved = set()
+    while changed:
+        moved.add(changed.pop())
+    ids[:] = [id for id in ids if id not in moved]
+    for id in moved:
+        if keep(id):
+            bisect.insort(ids, id, key=key)
+
+
+def counts(name: str):
+    values = column(name)
+    if values.counts is None:
+        values.counts = collections.Counter()
+        for value in values.values():
+            values.count(value, 1)
+    return values.counts
@@ -8,7 +8,9 @@ import weakref
 import hashlib
 import typing
 import queue
+import time
 import enum
+import sys
 import os
 
 
@@ -45,6 +47,132 @@ class CounterContext:
         self.__exit__(exc_type, exc_val, exc_tb)
 
 
+class CheckRequest:
+    def __init__(self, task: asyncio.Future, full=False):
+        self.task = task
+        self.full = full
+        self.waiters = 0
+
+    async def wait(self):
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        finally:
+            self.waiters -= 1
+            if not self.waiters and not self.task.done():
+                # Everyone waiting on this check was cancelled
+                self.task.cancel()
+
+
+class RefreshProgress:
+    # Stage: (label, seconds per item until learned from previous runs)
+    # Parsing, images and saving happen within full checks, their time is learned as part of the full stage
+    stages = {
+        "login":  ("Logging in",      1.0),
+        "probe":  ("Latest updates",  5.0),
+        "games":  ("Games checked",   0.05),
+        "full":   ("Full checks",     0.5),  # On top of the games stage
+        "parse":  ("Parsed",          0.0),
+        "image":  ("Images",          0.0),
+        "save":   ("Saved",           0.0),
+        "notifs": ("Notifications",   1.0),
+        "pages":  ("Pages",           1.0),
+    }
+    history_runs = 20  # Recent runs used to learn the check times
+    default_full_rate = 0.1  # Share of games needing a full check in a normal refresh, until learned
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = dict.fromkeys(self.stages, 0)
+        self.done = dict.fromkeys(self.stages, 0)
+        self.seconds = {stage: seconds for stage, (_, seconds) in self.stages.items()}
+        self.full_rate = self.default_full_rate
+        self.expected_full = 0.0  # Full checks guessed for queued games, until their check finds out
+
+    def track(self, stage: str, added=0, done=0):
+        self.total[stage] += added
+        self.done[stage] += done
+
+    def expect_full(self, known: int, guessed: int):
+        # Games sure to get a full check count right away, the rest by the share seen in previous runs
+        self.total["full"] += known
+        self.expected_full += guessed * self.full_rate
+
+    def checked(self, guessed: bool, full: bool):
+        # A finished check replaces its share of the guess, a full one was added when it was found to be needed
+        self.done["games"] += 1
+        self.done["full"] += full
+        if guessed:
+            self.expected_full = max(self.expected_full - self.full_rate, 0.0)
+
+    def learn(self, runs: list["RefreshRun"], workers: int):
+        # Fit run duration = games * game seconds + full checks * full seconds, over finished runs
+        runs = [run for run in runs if not run.result and run.checked and run.ended > run.started]
+        if len([run for run in runs if run.workers == workers]) >= 3:
+            runs = [run for run in runs if run.workers == workers]
+        runs = runs[-self.history_runs:]
+        if not runs:
+            return
+        if checked := sum(run.checked for run in runs if not run.full):
+            self.full_rate = sum(run.full_checks for run in runs if not run.full) / checked
+        gg = gf = ff = gd = fd = 0.0
+        for run in runs:
+            duration = run.ended - run.started
+            gg += run.checked * run.checked
+            gf += run.checked * run.full_checks
+            ff += run.full_checks * run.full_checks
+            gd += run.checked * duration
+            fd += run.full_checks * duration
+        det = gg * ff - gf * gf
+        if det > 1e-9 and (games := (gd * ff - fd * gf) / det) > 0 and (full := (fd * gg - gd * gf) / det) > 0:
+            self.seconds["games"], self.seconds["full"] = games, full
+            return
+        # Not enough variety in the runs, keep the default proportions and scale them to match
+        predicted = sum(run.checked * self.seconds["games"] + run.full_checks * self.seconds["full"] for run in runs)
+        scale = sum(run.ended - run.started for run in runs) / predicted
+        self.seconds["games"] *= scale
+        self.seconds["full"] *= scale
+
+    def work(self, counts: dict[str, int]):
+        return sum(count * self.seconds[stage] for stage, count in counts.items())
+
+    def total_work(self):
+        return self.work(self.total) + self.expected_full * self.seconds["full"]
+
+    @property
+    def ratio(self):
+        if not (total := self.total_work()):
+            return 0.0
+        return min(self.work(self.done) / total, 1.0)
+
+    def eta(self):
+        # History predicts the work left, the pace of this run so far corrects it as more gets done
+        done = self.work(self.done)
+        remaining = max(self.total_work() - done, 0.0)
+        if done > 0:
+            pace = (time.perf_counter() - self.started) / done
+            trust = min(self.ratio * 4, 1.0)
+            remaining *= 1.0 - trust + trust * pace
+        return remaining
+
+    def eta_text(self):
+        minutes, seconds = divmod(round(self.eta()), 60)
+        if minutes:
+            return f"about {minutes}m {seconds:02}s left"
+        return f"about {seconds}s left" if seconds else "almost done"
+
+    def breakdown(self):
+        # Stages with work, as "label: done/total", full checks still partly guessed as "done/~total"
+        lines = []
+        for stage, (label, _) in self.stages.items():
+            total = self.total[stage]
+            if stage == "full" and self.expected_full >= 0.5:
+                lines.append(f"{label}: {self.done[stage]}/~{total + round(self.expected_full)}")
+            elif total:
+                lines.append(f"{label}: {self.done[stage]}/{total}")
+        return lines
+
+
 class Popup(functools.partial):
     next_uuid = 0
     def __init__(self, *_, **__):
@@ -113,16 +241,20 @@ class ProcessPipe(multiprocessing.queues.Queue):
 
 
 class Timestamp:
-    instances = []
+    __slots__ = ("value", "_display", "_generation")
+    generation = 0  # Bumped when the format changes, displays from older generations are rebuilt
     def __init__(self, unix_time: int | float):
         self.update(unix_time)
-        type(self).instances.append(self)
 
     def update(self, unix_time: int | float = None):
         if unix_time is not None:
             self.value = int(unix_time)
         self._display = None
 
+    @classmethod
+    def reformat(cls):
+        cls.generation += 1
+
     @property
     def format(self):
         from modules import globals
@@ -130,7 +262,8 @@ class Timestamp:
 
     @property
     def display(self):
-        if self._display is None:
+        if self._display is None or self._generation != type(self).generation:
+            self._generation = type(self).generation
             if self.value == 0:
                 self._display = ""
             else:
@@ -142,10 +275,8 @@ class Timestamp:
 
 
 class Datestamp(Timestamp):
-    instances = []
-    def __init__(self, unix_time: int | float):
-        self.update(unix_time)
-        type(self).instances.append(self)
+    __slots__ = ()
+    generation = 0
 
     @property
     def format(self):
@@ -410,6 +541,13 @@ ExeState = IntEnumHack("ExeState", [
 ])
 
 
+CheckOutcome = IntEnumHack("CheckOutcome", [
+    ("Unchanged", (1, {"icon": "check"})),
+    ("Full",      (2, {"icon": "download_outline"})),
+    ("Error",     (3, {"icon": "alert_circle_outline"})),
+])
+
+
 MsgBox = IntEnumHack("MsgBox", [
     ("info",  (1, {"color": (0.10, 0.69, 0.95), "icon": "information"})),
     ("warn",  (2, {"color": (0.95, 0.69, 0.10), "icon": "alert_rhombus"})),
@@ -455,6 +593,7 @@ class Label:
     name: str
     color: tuple[float]
     instances: typing.ClassVar = []
+    ids: typing.ClassVar = {}
 
     @property
     def short_name(self):
@@ -469,17 +608,18 @@ class Label:
         if self in cls.instances:
             return
         cls.instances.append(self)
+        cls.ids[self.id] = self
 
     @classmethod
     def get(cls, id: int):
-        for label in cls.instances:
-            if label.id == id:
-                return label
+        return cls.ids.get(id)
 
     @classmethod
     def remove(cls, self):
         while self in cls.instances:
             cls.instances.remove(self)
+        if cls.ids.get(self.id) is self:
+            del cls.ids[self.id]
 
 
 @dataclasses.dataclass
@@ -557,6 +697,7 @@ class Settings:
     datestamp_format            : str
     default_exe_dir             : str
     display_mode                : DisplayMode
+    filter_views                : dict[str, str]
     fit_images                  : bool
     grid_columns                : int
     ignore_semaphore_timeouts   : bool
@@ -567,6 +708,7 @@ class Settings:
     max_retries                 : int
     quick_filters               : bool
     refresh_completed_games     : bool
+    refresh_probe_feed          : bool
     refresh_workers             : int
     render_when_unfocused       : bool
     request_timeout             : int
@@ -636,7 +778,7 @@ Type = IntEnumHack("Type", [
 ])
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Game:
     id                   : int
     name                 : str
@@ -649,6 +791,7 @@ class Game:
     last_updated         : Datestamp
     last_full_refresh    : int
     last_refresh_version : str
+    thread_hash          : str
     last_played          : Datestamp
     score                : float
     rating               : int
@@ -656,18 +799,24 @@ class Game:
     installed            : str
     updated              : bool | None
     executables          : list[str]
-    description          : str
-    changelog            : str
     tags                 : list[Tag]
     labels               : list[Label.get]
     notes                : str
     image_url            : str
-    downloads            : list[tuple[str, list[tuple[str, str]]]]
+    # None until loaded on demand, see db.load_lazy_game_columns()
+    description          : str = None
+    changelog            : str = None
+    downloads            : list[tuple[str, list[tuple[str, str]]]] = None
     image                : imagehelper.ImageHelper = None
     executables_valids   : list[bool] = None
     executables_valid    : bool = None
 
     def __post_init__(self):
+        # Shared between many games, keep a single copy of each
+        self.version = sys.intern(self.version)
+        self.developer = sys.intern(self.developer)
+        self.installed = sys.intern(self.installed)
+        self.last_refresh_version = sys.intern(self.last_refresh_version)
         if self.updated is None:
             self.updated = bool(self.installed) and self.installed != self.version
             from modules import async_thread, db
@@ -677,11 +826,10 @@ class Game:
         self.validate_executables()
 
     def validate_executables(self):
-        from modules import globals
+        from modules import sortindex
         self.executables_valids = [os.path.isfile(executable) for executable in self.executables]
         self.executables_valid = all(self.executables_valids)
-        if globals.gui:
-            globals.gui.require_sort = True
+        sortindex.invalidate(self.id)
 
     def add_executable(self, executable: str):
         if executable in self.executables:
@@ -704,3 +852,51 @@ class OldGame:
     name                 : str
     version              : str
     status               : Status
+
+
+@dataclasses.dataclass
+class CatalogThread:
+    id                   : int
+    title                : str
+    version              : str
+    developer            : str
+    type                 : Type
+    status               : Status
+    tags                 : list[Tag]
+    image_url            : str
+    last_seen            : int
+
+
+@dataclasses.dataclass(slots=True)
+class CheckStats:
+    bytes                : int = 0
+    errors               : int = 0
+    full                 : bool = False
+
+
+@dataclasses.dataclass
+class RefreshRun:
+    id                   : int
+    started              : float
+    ended                : float
+    full                 : bool
+    workers              : int
+    timeout              : int
+    retries              : int
+    queued               : int
+    checked              : int
+    full_checks          : int
+    unchanged            : int
+    skipped              : int
+    requests             : int
+    bytes                : int
+    errors               : int
+    result               : str
+
+
+@dataclasses.dataclass
+class RefreshCheck:
+    game                 : int
+    outcome              : CheckOutcome
+    ms                   : int
+    bytes                : int
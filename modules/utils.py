@@ -1,5 +1,4 @@
-from PyQt6.QtWidgets import QSystemTrayIcon
-import OpenGL.GL as gl
+import collections
 import concurrent
 import functools
 import asyncio
@@ -8,12 +7,13 @@ import random
 import imgui
 import time
 import math
-import glfw
 import sys
 import re
 
 from modules.structs import (
+    RefreshProgress,
     Popup,
+    Game,
 )
 from modules import (
     globals,
@@ -45,21 +45,30 @@ def is_refreshing():
     return False
 
 
+def request_redraw():
+    # Safe from any thread, wakes the main loop if it is waiting for events
+    if globals.gui:
+        import glfw
+        globals.gui.redraw_requested = True
+        glfw.post_empty_event()
+
+
 def start_refresh_task(coro: typing.Coroutine, reset_bg_timers=True):
     if is_refreshing():
         return
     if reset_bg_timers:
         globals.gui.bg_mode_timer = None
         globals.gui.bg_mode_notifs_timer = None
-    globals.refresh_progress = 0
-    globals.refresh_total = 1
+    globals.refresh_progress = RefreshProgress()
     globals.gui.refresh_ratio_smooth = 0.0
     globals.refresh_task = async_thread.run(coro)
     globals.gui.tray.update_status()
     def done_callback(future: asyncio.Future):
+        from PyQt6.QtWidgets import QSystemTrayIcon
         globals.refresh_task = None
         globals.gui.tray.update_status()
         globals.gui.require_sort = True
+        request_redraw()
         if (globals.gui.hidden or not globals.gui.focused) and (count := len(globals.updated_games)) > 0:
             globals.gui.tray.push_msg(
                 title="Updates",
@@ -83,8 +92,19 @@ def start_refresh_task(coro: typing.Coroutine, reset_bg_timers=True):
     globals.refresh_task.add_done_callback(done_callback)
 
 
+def start_recheck_task(game: Game, full=True):
+    if is_refreshing():
+        # Jump ahead of the running refresh, if a worker reaches this game it will share this check
+        async_thread.run(api.check(game, full=full))
+        return
+    start_refresh_task(api.check(game, full=full, login=True))
+
+
 # https://github.com/pyimgui/pyimgui/blob/24219a8d4338b6e197fa22af97f5f06d3b1fe9f7/doc/examples/integrations_glfw3.py
 def impl_glfw_init(width: int, height: int, window_name: str):
+    # Window libraries are imported where used so headless mode never loads them
+    import OpenGL.GL as gl
+    import glfw
     # FIXME: takes quite a while to initialize on my arch linux machine
     if not glfw.init():
         print("Could not initialize OpenGL context")
@@ -109,6 +129,7 @@ def impl_glfw_init(width: int, height: int, window_name: str):
 
 
 def validate_geometry(x, y, width, height):
+    import glfw
     window_pos = (x, y)
     window_size = (width, height)
     valid = True
@@ -143,6 +164,7 @@ def constrain_next_window():
 
 
 def close_weak_popup():
+    import glfw
     if imgui.is_topmost():
         # This is the topmost popup
         if imgui.io.keys_down[glfw.KEY_ESCAPE]:
@@ -162,13 +184,71 @@ def close_weak_popup():
     return False
 
 
+# Fonts pushed with push_font(), imgui has no getter for the current one
+font_stack: list[imgui.core._Font] = []
+
+
+def push_font(font: imgui.core._Font):
+    imgui.push_font(font)
+    font_stack.append(font)
+
+
+def pop_font():
+    imgui.pop_font()
+    font_stack.pop()
+
+
+def current_font():
+    return font_stack[-1] if font_stack else imgui.fonts.default
+
+
+# Measured text widths and wrapped lines per font, least recently used dropped first, cleared when fonts are rebuilt
+text_widths: collections.OrderedDict[tuple[str, imgui.core._Font], float] = collections.OrderedDict()
+wrapped_texts: collections.OrderedDict[tuple[str, int, int, imgui.core._Font], list[str | None]] = collections.OrderedDict()
+text_cache_max = 10000
+
+
+def clear_text_caches():
+    text_widths.clear()
+    wrapped_texts.clear()
+
+
+def text_width(text: str):
+    key = (text, current_font())
+    if (width := text_widths.get(key)) is None:
+        if len(text_widths) >= text_cache_max:
+            text_widths.popitem(last=False)
+        width = text_widths[key] = imgui.calc_text_size(text).x
+    else:
+        text_widths.move_to_end(key)
+    return width
+
+
 def wrap_text(text: str, width: float, offset=0, func: typing.Callable = imgui.text_unformatted):
+    # Whole pixels, so resizing the window reuses entries instead of filling the cache
+    width, offset = int(width), int(offset)
+    key = (text, width, offset, current_font())
+    if (lines := wrapped_texts.get(key)) is None:
+        if len(wrapped_texts) >= text_cache_max:
+            wrapped_texts.popitem(last=False)
+        lines = wrapped_texts[key] = list(_wrap_text(text, width, offset))
+    else:
+        wrapped_texts.move_to_end(key)
+    for line in lines:
+        if line is None:
+            imgui.dummy(0, 0)
+        else:
+            func(line)
+
+
+def _wrap_text(text: str, width: float, offset=0):
+    # Yields the lines to draw, None where a new line is needed before the first one
     for line in text.split("\n"):
         while line := line.strip():
             if offset is not None:
                 avail = width - offset
             if avail < 0:
-                imgui.dummy(0, 0)
+                yield None
                 if offset is not None:
                     offset = None
                     avail = width
@@ -183,7 +263,7 @@ def wrap_text(text: str, width: float, offset=0, func: typing.Callable = imgui.t
                     cut -= 1
             else:
                 cut = len(line)
-            func(line[:cut])
+            yield line[:cut]
             line = line[cut:]
             if offset is not None:
                 offset = None
@@ -299,6 +379,7 @@ def push_popup(*args, bottom=False, **kwargs):
         if (globals.gui.hidden or not globals.gui.focused) and (len(args) > 3) and (args[0] is msgbox.msgbox) and (args[3] in (MsgBox.warn, MsgBox.error)):
             if globals.gui.hidden and args[1] == "Daily backups":
                 return
+            from PyQt6.QtWidgets import QSystemTrayIcon
             globals.gui.tray.push_msg(
                 title="Oops",
                 msg="Something went wrong, click here to view the error.",
@@ -308,4 +389,5 @@ def push_popup(*args, bottom=False, **kwargs):
         globals.popup_stack.insert(0, popup)
     else:
         globals.popup_stack.append(popup)
+    request_redraw()
     return popup
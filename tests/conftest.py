@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# Tests import the app modules the same way main.py does
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
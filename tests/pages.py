@@ -0,0 +1,129 @@
+import random
+import json
+
+from modules.structs import (
+    Tag,
+)
+
+# Thread pages shaped like F95Zone's, only the parts the parser reads
+
+prefixes = ("Ren'Py", "Unity", "RPGM", "HTML", "Others", "Completed", "Onhold", "Abandoned", "Mod", "VN")
+
+
+def thread_page(
+    name="Some Game",
+    version="v0.5",
+    developer="Some Dev",
+    prefixes=("Ren'Py",),
+    tags=("3dcg", "male-protagonist"),
+    overview="A game about things.",
+    changelog="v0.5\nAdded stuff\nFixed bugs",
+    downloads=(("Win/Linux", ("MEGA", "PIXELDRAIN")), ("Mac", ("GOFILE",))),
+    rating=4.25,
+    updated="2024-03-01",
+    filler="",
+    image_url=None,
+):
+    image_url = image_url or f"https://attachments.f95zone.to/{name}.png"
+    spans = "".join(f'<span class="label">[{prefix}]</span><span class="label-append">&nbsp;</span>' for prefix in prefixes)
+    taglist = "".join(f'<a href="/tags/{tag}/" class="tagItem">{tag}</a>' for tag in tags)
+    mirrors = "".join(
+        f'<b>{platform}</b>: ' + " - ".join(f'<a href="https://example.com/{platform}/{host}" class="link link--external">{host}</a>' for host in hosts) + "<br>\n"
+        for platform, hosts in downloads
+    )
+    return f"""<!DOCTYPE html>
+<html><head><title>{" - ".join(f"[{prefix}]" for prefix in prefixes)} - {name} [{version}] [{developer}] | F95zone</title></head>
+<body>
+<div class="p-body-header">
+<h1 class="p-title-value">{spans}{name} [{version}] [{developer}]</h1>
+<select name="rating" data-initial-rating="{rating}"></select>
+<div class="js-tagList">{taglist}</div>
+</div>
+<div class="message-threadStarterPost">
+<article class="message-body"><div class="bbWrapper">
+<div style="text-align: center"><img src="{image_url}" data-src="{image_url}" class="bbImage" alt="cover"></div>
+<b>Overview</b>:<br>
+{overview.replace(chr(10), "<br>" + chr(10))}<br>
+<br>
+<b>Thread Updated</b>: {updated}<br>
+<b>Release Date</b>: {updated}<br>
+<b>Developer</b>: {developer} <a href="https://example.com/patreon" class="link link--external">Patreon</a><br>
+<b>Censored</b>: No<br>
+<b>Version</b>: {version}<br>
+<b>OS</b>: Windows, Linux<br>
+<b>Language</b>: English<br>
+{filler}
+<b>Changelog</b>:<br>
+<div class="bbCodeSpoiler"><button class="bbCodeSpoiler-button"><span><span>Spoiler</span></span></button>
+<div class="bbCodeBlock-content">{changelog.replace(chr(10), "<br>" + chr(10))}</div></div>
+<br>
+<b>DOWNLOAD</b><br>
+{mirrors}
+</div></article>
+<div class="message-lastEdit">Last edited: <time data-time="1709251200">Mar 1, 2024</time></div>
+</div>
+</body></html>""".encode()
+
+
+def random_page(rng: random.Random):
+    words = ("lorem", "ipsum", "dolor", "sit", "amet", "Version", "Download", "Notes:", "v1.0", "&amp;", "ü", "\u200b", "  ")
+    text = lambda count: " ".join(rng.choice(words) for _ in range(count))
+    lines = lambda count: "\n".join(text(rng.randrange(1, 12)) for _ in range(count))
+    return thread_page(
+        name=text(rng.randrange(1, 5)).strip() or "Name",
+        version=f"v{rng.randrange(10)}.{rng.randrange(100)}",
+        developer=text(rng.randrange(1, 3)).strip() or "Dev",
+        prefixes=tuple(rng.sample(prefixes, rng.randrange(1, 4))),
+        tags=tuple(tag.name for tag in rng.sample(list(Tag), rng.randrange(0, 15))),
+        overview=lines(rng.randrange(1, 30)),
+        changelog=lines(rng.randrange(0, 60)),
+        downloads=tuple((text(1), tuple(text(1) for _ in range(rng.randrange(1, 5)))) for _ in range(rng.randrange(0, 6))),
+        rating=round(rng.uniform(0, 5), 2),
+        filler="<br>\n" * rng.randrange(0, 10),
+    )
+
+
+# Names of the parse_thread results, in order
+parsed_fields = (
+    "name", "version", "developer", "type", "status", "last_updated", "score",
+    "description", "changelog", "tags", "image_url", "downloads", "cut_short",
+)
+
+
+def parsed_json(ret: tuple):
+    # parse_thread results as stored next to each corpus page, enums by name
+    fields = dict(zip(parsed_fields, ret))
+    fields["type"] = fields["type"].name
+    fields["status"] = fields["status"].name
+    fields["tags"] = [tag.name for tag in fields["tags"]]
+    return json.loads(json.dumps(fields))
+
+
+def corpus_pages():
+    # Written to tests/corpus by running this module, the committed files stay the same if the generator changes
+    yield "basic", thread_page()
+    yield "completed_mod", thread_page(prefixes=("Mod", "Ren'Py", "Completed"), tags=())
+    yield "no_downloads", thread_page(downloads=())
+    yield "long_changelog", thread_page(changelog="\n".join(f"v0.{i}\n- Fixed bug {i}\n- Added scene {i}" for i in range(600, 0, -1)))
+    yield "blank_lines", thread_page(overview="First part\n" + "\n" * 9 + "Cut after the blank lines")
+    yield "few_blank_lines", thread_page(overview="First part\n" + "\n" * 5 + "Kept after fewer blank lines")
+    yield "labels", thread_page(overview="Story goes here\nNotes: read this\nMore notes\nOther: stuff\nEnd")
+    yield "unicode", thread_page(name="Gämé \u200bNäme", developer="Dév 🙂", overview="Ünïcode\u200b text\r\nwith\tmixed  whitespace")
+    yield "many_mirrors", thread_page(downloads=tuple((f"Part {i}", ("MEGA", "GOFILE", "PIXELDRAIN", "WORKUPLOAD")) for i in range(40)))
+    rng = random.Random(95)
+    for i in range(8):
+        yield f"random_{i}", random_page(rng)
+
+
+if __name__ == "__main__":
+    # --expected records what the parser returns now for each page, review the diff before committing it
+    import pathlib
+    import sys
+    from modules import parser
+    corpus = pathlib.Path(__file__).parent / "corpus"
+    corpus.mkdir(exist_ok=True)
+    for name, page in corpus_pages():
+        (corpus / f"{name}.html").write_bytes(page)
+        if "--expected" in sys.argv:
+            expected = parsed_json(parser.parse_thread(1, page, parser.LxmlEngine))
+            (corpus / f"{name}.json").write_text(json.dumps(expected, indent=4) + "\n", encoding="utf-8")
@@ -0,0 +1,39 @@
+import asyncio
+import socket
+import types
+
+import aiohttp
+import pytest
+
+from modules.structs import (
+    CheckStats,
+)
+from modules import (
+    globals,
+    api,
+)
+
+
+def test_failures_count_on_the_check_that_made_them(monkeypatch):
+    # Refresh history takes its errors from the checks, requests failing elsewhere at the same time are not counted
+    monkeypatch.setattr(globals, "cookies", {})
+    monkeypatch.setattr(globals, "settings", types.SimpleNamespace(request_timeout=5, max_retries=1, ignore_semaphore_timeouts=False))
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}/"  # Nothing listening once closed
+    stats = CheckStats()
+    async def in_check():
+        api.check_stats.set(stats)
+        with pytest.raises(aiohttp.ClientError):
+            await api.fetch("GET", url)
+    async def elsewhere():
+        with pytest.raises(aiohttp.ClientError):
+            await api.fetch("GET", url)
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            monkeypatch.setattr(api, "session", session)
+            await asyncio.gather(in_check(), elsewhere())
+    failed = api.failed_requests
+    asyncio.run(run())
+    assert stats.errors == 2  # First try and one retry
+    assert api.failed_requests - failed == 4
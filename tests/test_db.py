@@ -0,0 +1,35 @@
+import types
+
+from modules.structs import (
+    Popup,
+)
+from modules import (
+    globals,
+    db,
+)
+
+
+class FakeGUI:
+    def draw_game_info_popup(self, game, carousel_ids=None, popup_uuid=""):
+        return 1, False
+
+
+def lazy_game(id: int):
+    return types.SimpleNamespace(id=id, description="description", changelog="changelog", downloads=())
+
+
+def test_lazy_cache_keeps_open_info_popup(monkeypatch):
+    gui = FakeGUI()
+    monkeypatch.setattr(globals, "gui", gui)
+    monkeypatch.setattr(globals, "popup_stack", [])
+    monkeypatch.setattr(db, "lazy_games", type(db.lazy_games)())
+    shown = lazy_game(0)
+    db.cache_lazy_game_columns(shown)
+    globals.popup_stack.append(Popup(gui.draw_game_info_popup, shown, None))
+    games = [lazy_game(id) for id in range(1, db.lazy_games_max * 3)]
+    for game in games:
+        db.cache_lazy_game_columns(game)
+    assert len(db.lazy_games) == db.lazy_games_max
+    assert 0 in db.lazy_games and shown.description == "description"
+    assert games[0].description is None
+    assert games[-1].id in db.lazy_games
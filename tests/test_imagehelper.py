@@ -0,0 +1,17 @@
+from PIL import Image
+
+from modules import (
+    imagehelper,
+    utils,
+)
+
+
+def test_reload_requests_redraw(monkeypatch, tmp_path):
+    # Loaded on the sync thread, the main loop may be waiting for events and has to be woken
+    redraws = []
+    monkeypatch.setattr(utils, "request_redraw", lambda: redraws.append(True))
+    Image.new("RGB", (4, 2)).save(tmp_path / "1.png")
+    image = imagehelper.ImageHelper(tmp_path, glob="1.*")
+    image.reload()
+    assert image.loaded and not image.loading and (image.width, image.height) == (4, 2)
+    assert redraws == [True]
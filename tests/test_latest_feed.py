@@ -0,0 +1,67 @@
+import asyncio
+import types
+import time
+
+import aiohttp
+from aiohttp import test_utils
+import pytest
+
+from modules import (
+    globals,
+    msgbox,
+    api,
+    db,
+)
+from benchmarks import fixture_server
+
+now = int(time.time())
+last_refresh = now - 3600 * 24
+
+
+def probe(monkeypatch, tracked: set[int], **options):
+    # Runs probe_latest_updates against the fixture server, returns its result and the server's request counts
+    catalog = {}
+    async def update_catalog(id: int, overwrite=True, **values):
+        catalog[id] = values
+    monkeypatch.setattr(db, "update_catalog", update_catalog)
+    monkeypatch.setattr(globals, "games", dict.fromkeys(tracked))
+    monkeypatch.setattr(globals, "cookies", {})
+    monkeypatch.setattr(globals, "settings", types.SimpleNamespace(request_timeout=10, max_retries=0, ignore_semaphore_timeouts=False))
+    app = fixture_server.make_app(**options)
+    async def run():
+        async with test_utils.TestServer(app) as server, aiohttp.ClientSession() as session:
+            monkeypatch.setattr(api, "session", session)
+            monkeypatch.setattr(api.latest_feed, "endpoint", str(server.make_url("/")) + api.latest_endpoint.removeprefix(api.host + "/"))
+            return await api.probe_latest_updates(last_refresh)
+    return asyncio.run(run()), app[fixture_server.stats_key], catalog
+
+
+def test_nothing_new_stops_after_first_page(monkeypatch):
+    older = [(id, last_refresh - api.latest_margin - id) for id in range(1, 200)]
+    updated, stats, _ = probe(monkeypatch, tracked={1, 2, 3}, latest=older)
+    assert updated == set()
+    assert stats["latest"] == 1
+
+
+def test_one_page_of_updates(monkeypatch):
+    bumped = [(1, now - 10), (2, now - 20), (50, now - 30)]  # 50 is not tracked
+    older = [(id, last_refresh - api.latest_margin - id) for id in range(100, 150)]
+    updated, stats, catalog = probe(monkeypatch, tracked={1, 2, 3}, latest=bumped + older)
+    assert updated == {1, 2}
+    assert stats["latest"] == 1
+    assert catalog[50]["title"] == "Game 50"  # Untracked threads still fill the catalog
+
+
+def test_broken_feed_falls_back(monkeypatch):
+    updated, stats, _ = probe(monkeypatch, tracked={1, 2, 3}, latest_broken=True)
+    assert updated is None
+    assert stats["latest"] == 1
+
+
+def test_login_page_is_raised(monkeypatch):
+    # Not a fallback, the user has to log in again
+    async def login_page(*_, **__):
+        return b"<html><head><title>Log in | F95zone</title></head></html>"
+    monkeypatch.setattr(api, "fetch", login_page)
+    with pytest.raises(msgbox.Exc):
+        asyncio.run(api.probe_latest_updates(last_refresh))
@@ -0,0 +1,74 @@
+import random
+import re
+
+from modules import parser
+from tests import pages
+
+# The regexes these replaced, kept as the reference they must agree with
+old_sanitize_whitespace = lambda text: re.sub(r" *(?:\r\n?|\n)", r"\n", re.sub(r"(?:[^\S\r\n]|\u200b)", " ", text))
+old_fixed_newlines = lambda text: re.sub(r"(?: *\n){2}(?: *\n)+", r"\n\n", text).strip()
+
+
+def old_cut_long_attr(value: str):
+    return re.sub(
+        r"(?:(?: *\n){7}|(?:\n *[A-Z a-z]+:(?:.|\n)+?){2}|\n *(?:DOWNLOAD|Download) *(?:\n|:))(?:.|\n)*", r"", value,
+        flags=re.RegexFlag.MULTILINE
+    )
+
+
+def old_is_text(text: str, value: str):
+    val = old_sanitize_whitespace(value.lower())
+    return val == text or val.startswith(text + ":")
+
+
+pieces = ("\n", "\n", " ", "  ", "\r\n", "\r", "\t", "\u200b", "a", "Ab", "x y", ":", "Notes:", "Download", "DOWNLOAD", "Version: 1")
+
+
+def random_text(rng: random.Random, length: int):
+    return "".join(rng.choice(pieces) for _ in range(rng.randrange(length)))
+
+
+def test_cut_long_attr_matches_old_regex():
+    rng = random.Random(0)
+    for _ in range(3000):
+        value = random_text(rng, 40)
+        assert parser.cut_long_attr(value) == old_cut_long_attr(value), repr(value)
+
+
+def test_whitespace_regexes_match_old():
+    rng = random.Random(1)
+    for _ in range(3000):
+        value = random_text(rng, 40)
+        assert parser.sanitize_whitespace(value) == old_sanitize_whitespace(value), repr(value)
+        value = parser.sanitize_whitespace(value)
+        assert parser.fixed_newlines(value) == old_fixed_newlines(value), repr(value)
+
+
+def test_text_matches_old_is_text():
+    rng = random.Random(2)
+    names = ("overview", "change log", "downloads", "version")
+    for _ in range(3000):
+        name = rng.choice(names)
+        value = rng.choice((name, name.title(), " " + name, "")) + random_text(rng, 6)
+        # Element text comes in as several strings, split it at random places
+        cuts = sorted(rng.sample(range(len(value) + 1), min(3, len(value) + 1)))
+        strings = [value[a:b] for a, b in zip([0, *cuts], [*cuts, len(value)])]
+        assert parser.text_matches(strings, name) == old_is_text(name, value), (strings, name)
+
+
+def test_long_inputs_stay_linear():
+    # Inputs that made the old regexes backtrack for minutes
+    for value in (" " * 50000 + "x", "\n a:" * 20000, "\n" + " \n" * 5 + " " * 50000 + "x"):
+        parser.cut_long_attr(value)
+        parser.fixed_newlines(parser.sanitize_whitespace(value))
+
+
+def test_over_budget_is_reported(monkeypatch):
+    page = pages.thread_page()
+    for engine in parser.engines:
+        assert parser.parse_thread(1, page, engine)[-1] is False
+    monkeypatch.setattr(parser, "parse_budget", -1.0)
+    for engine in parser.engines:
+        ret = parser.parse_thread(1, page, engine)
+        assert not isinstance(ret, parser.ParserException)
+        assert ret[-1] is True
@@ -0,0 +1,49 @@
+import tracemalloc
+import pathlib
+import random
+import json
+
+import pytest
+
+from modules import parser
+from tests import pages
+
+corpus = sorted((pathlib.Path(__file__).parent / "corpus").glob("*.html"))
+
+
+@pytest.mark.parametrize("path", corpus, ids=lambda path: path.stem)
+def test_engines_agree_on_corpus(path: pathlib.Path):
+    res = path.read_bytes()
+    lxml, bs4 = (parser.parse_thread(1, res, engine) for engine in (parser.LxmlEngine, parser.Bs4Engine))
+    assert not isinstance(lxml, parser.ParserException)
+    assert lxml == bs4
+
+
+@pytest.mark.parametrize("engine", parser.engines, ids=lambda engine: engine.__name__)
+@pytest.mark.parametrize("path", corpus, ids=lambda path: path.stem)
+def test_corpus_matches_expected(path: pathlib.Path, engine):
+    # Catches changes in the shared extraction that both engines would agree on, rerecord with: python -m tests.pages --expected
+    expected = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+    parsed = pages.parsed_json(parser.parse_thread(1, path.read_bytes(), engine))
+    for field in pages.parsed_fields:
+        assert parsed[field] == expected[field], field
+
+
+def test_engines_agree_on_random_pages():
+    rng = random.Random(31)
+    for _ in range(150):
+        res = pages.random_page(rng)
+        assert parser.parse_thread(1, res, parser.LxmlEngine) == parser.parse_thread(1, res, parser.Bs4Engine)
+
+
+def test_lxml_allocates_less():
+    # Python heap only, libxml2 allocates outside of tracemalloc for both engines
+    def peak(engine):
+        tracemalloc.start()
+        try:
+            for path in corpus:
+                parser.parse_thread(1, path.read_bytes(), engine)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    assert peak(parser.LxmlEngine) < peak(parser.Bs4Engine)
@@ -0,0 +1,48 @@
+from modules.structs import (
+    RefreshProgress,
+    RefreshRun,
+)
+
+
+def run(checked: int, full_checks: int, duration: float, full=False):
+    return RefreshRun(
+        id=None, started=0.0, ended=duration, full=full, workers=20, timeout=30, retries=2,
+        queued=checked, checked=checked, full_checks=full_checks, unchanged=checked - full_checks,
+        skipped=0, requests=0, bytes=0, errors=0, result="",
+    )
+
+
+def test_full_refresh_counts_every_full_check_up_front():
+    progress = RefreshProgress()
+    progress.track("games", added=100)
+    progress.expect_full(known=100, guessed=0)
+    assert progress.total["full"] == 100
+    for _ in range(50):
+        progress.checked(guessed=False, full=True)
+    assert abs(progress.ratio - 0.5) < 1e-9
+
+
+def test_full_share_is_learned_from_normal_runs():
+    progress = RefreshProgress()
+    progress.learn([run(1000, 100, 60), run(1000, 300, 120), run(500, 500, 200, full=True)], workers=20)
+    assert abs(progress.full_rate - 0.2) < 1e-9
+    progress.track("games", added=1000)
+    progress.expect_full(known=0, guessed=1000)
+    assert abs(progress.expected_full - 200) < 1e-9
+
+
+def test_guess_is_replaced_as_checks_finish():
+    progress = RefreshProgress()
+    progress.full_rate = 0.5
+    progress.track("games", added=4)
+    progress.expect_full(known=0, guessed=4)
+    ratios = []
+    for full in (True, False, False, True):
+        if full:
+            progress.track("full", added=1)
+        progress.checked(guessed=True, full=full)
+        ratios.append(progress.ratio)
+    assert progress.expected_full == 0.0
+    assert progress.total["full"] == progress.done["full"] == 2
+    assert ratios == sorted(ratios) and ratios[-1] == 1.0
+    assert "Full checks: 2/2" in progress.breakdown()
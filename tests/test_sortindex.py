@@ -0,0 +1,40 @@
+import random
+
+from modules import sortindex
+
+
+def sorted_ids(values: dict[int, int], keep=lambda id: True):
+    return sorted((id for id in values if keep(id)), key=lambda id: (values[id], id))
+
+
+def test_reposition_many_changes_in_one_frame():
+    rng = random.Random(0)
+    for _ in range(200):
+        values = {id: rng.randrange(20) for id in range(50)}
+        ids = sorted_ids(values)
+        changed = set(rng.sample(sorted(values), rng.randrange(2, 20)))
+        for id in changed:
+            values[id] = rng.randrange(20)
+        sortindex.reposition(ids, changed, key=lambda id: (values[id], id), keep=lambda id: True)
+        assert ids == sorted_ids(values)
+        assert not changed
+
+
+def test_reposition_crossing_games():
+    # Game 2 moving down must not be placed against game 4 still sitting where it was before moving up
+    values = {1: 1, 2: 2, 3: 3, 4: 4, 5: 5}
+    ids = sorted_ids(values)
+    values[2], values[4] = 3, 1
+    sortindex.reposition(ids, {2, 4}, key=lambda id: (values[id], id), keep=lambda id: True)
+    assert ids == [1, 4, 2, 3, 5]
+
+
+def test_reposition_drops_filtered_and_removed_games():
+    values = {id: id % 7 for id in range(30)}
+    ids = sorted_ids(values)
+    for id in (3, 10, 17):
+        values[id] = 6 - values[id]
+    del values[5]
+    keep = lambda id: id in values and id != 10
+    sortindex.reposition(ids, {3, 5, 10, 17}, key=lambda id: (values[id], id), keep=keep)
+    assert ids == sorted_ids(values, keep)